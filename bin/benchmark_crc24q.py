@@ -0,0 +1,62 @@
+#!/usr/bin/env python3
+
+import logging
+import os
+import sys
+import timeit
+
+# Add the parent directory to the search path to enable p1_runner package imports when not installed in Python.
+repo_root = os.path.normpath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.append(repo_root)
+
+from p1_runner.argument_parser import ArgumentParser
+from p1_runner import crc24q
+
+
+def main():
+    # Parse arguments.
+    parser = ArgumentParser(usage='%(prog)s [OPTIONS]...',
+                            description="Compare the performance of the available CRC-24Q implementations.")
+
+    parser.add_argument('-n', '--num-frames', type=int, default=2000,
+                        help="The number of frames to process with each implementation.")
+    parser.add_argument('-s', '--frame-size', type=int, default=1024,
+                        help="The size of each frame (in bytes).")
+
+    options = parser.parse_args()
+
+    # Configure logging.
+    logging.basicConfig(level=logging.INFO, format='%(message)s', stream=sys.stdout)
+    logger = logging.getLogger('point_one.benchmark_crc24q')
+
+    implementations = [
+        ('bytewise', crc24q.calculate_crc24q_bytewise),
+        ('slicing_by_4', crc24q.calculate_crc24q_slicing_by_4),
+        ('slicing_by_8', crc24q.calculate_crc24q_slicing_by_8),
+    ]
+    if crc24q.calculate_crc24q_compiled is not None:
+        implementations.append(('compiled', crc24q.calculate_crc24q_compiled))
+    else:
+        logger.info('Compiled implementation not available (install crcmod with its C extension to enable).')
+
+    frame = os.urandom(options.frame_size)
+    expected_crc = crc24q.calculate_crc24q_bytewise(frame)
+
+    logger.info('Processing %d %d B frames. [default=%s]' %
+                (options.num_frames, options.frame_size, crc24q.CRC24Q_IMPLEMENTATION))
+    baseline_sec = None
+    for name, func in implementations:
+        if func(frame) != expected_crc:
+            logger.error('%s: CRC mismatch.' % name)
+            continue
+
+        elapsed_sec = timeit.timeit(lambda: func(frame), number=options.num_frames)
+        if baseline_sec is None:
+            baseline_sec = elapsed_sec
+        logger.info('  %-12s %8.1f us/frame  %8.2f MB/s  (%.1fx)' %
+                    (name + ':', elapsed_sec / options.num_frames * 1e6,
+                     options.num_frames * options.frame_size / elapsed_sec / 1e6, baseline_sec / elapsed_sec))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+
+import logging
+import os
+import sys
+import time
+
+# Add the parent directory to the search path to enable p1_runner package imports when not installed in Python.
+repo_root = os.path.normpath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.append(repo_root)
+
+from p1_runner.argument_parser import ArgumentParser
+from p1_runner.ntrip_caster import NTRIPCaster
+from p1_runner.rtcm_framer import RTCMFramer
+from p1_runner import trace
+
+
+def main():
+    # Parse arguments.
+    parser = ArgumentParser(usage='%(prog)s [OPTIONS]... MOUNTPOINT=FILE...',
+                            description="Run a local NTRIP caster serving recorded RTCM 3 corrections data. This may "
+                                        "be used as a stand-in for a corrections service when testing NTRIP clients, "
+                                        "e.g.:\n"
+                                        "  %(prog)s BASE=corrections.rtcm\n"
+                                        "  python3 -m p1_runner --ntrip localhost:2101,BASE")
+
+    parser.add_argument('--address', default='',
+                        help="The address on which to listen for NTRIP connections. By default, listen on all "
+                             "interfaces.")
+    parser.add_argument('-p', '--port', type=int, default=2101,
+                        help="The port on which to listen for NTRIP connections.")
+    parser.add_argument('--auth', metavar='USERNAME,PASSWORD',
+                        help="If specified, require clients to authenticate with the specified username and password.")
+    parser.add_argument('--interval', metavar='SEC', type=float, default=1.0,
+                        help="The interval at which to send data to clients (in seconds).")
+    parser.add_argument('-r', '--rate', metavar='BYTES_PER_SEC', type=int, default=1000,
+                        help="The data rate for each mountpoint. Complete RTCM messages are read from the input file "
+                             "until the requested amount of data has been sent for each interval.")
+    parser.add_argument('-v', '--verbose', action='count', default=0,
+                        help="Print verbose/trace debugging messages.")
+
+    parser.add_argument('mountpoints', metavar='MOUNTPOINT=FILE', nargs='+',
+                        help="A mountpoint name and the path to a file containing RTCM 3 data to be served on that "
+                             "mountpoint. When the end of the file is reached, the data is repeated.")
+
+    options = parser.parse_args()
+
+    # Configure logging.
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(name)s:%(lineno)d - %(message)s',
+                        stream=sys.stdout)
+    logger = logging.getLogger('point_one.ntrip_caster')
+    if options.verbose == 1:
+        logging.getLogger('point_one.p1_runner.ntrip_caster').setLevel(logging.DEBUG)
+    elif options.verbose > 1:
+        logging.getLogger('point_one.p1_runner.ntrip_caster').setLevel(logging.TRACE)
+
+    if options.auth is not None:
+        parts = options.auth.split(',')
+        if len(parts) != 2:
+            logger.error('You must specify a valid username and password.')
+            sys.exit(1)
+        username, password = parts
+    else:
+        username = None
+        password = None
+
+    # Read the RTCM messages for each mountpoint.
+    messages = {}
+    for spec in options.mountpoints:
+        mountpoint, sep, path = spec.partition('=')
+        if not sep or mountpoint == '' or path == '':
+            logger.error("Invalid mountpoint specifier '%s'." % spec)
+            sys.exit(1)
+
+        with open(path, 'rb') as f:
+            messages[mountpoint] = [m.data for m in RTCMFramer().on_data(f.read())]
+        if len(messages[mountpoint]) == 0:
+            logger.error('No RTCM messages found in %s.' % path)
+            sys.exit(1)
+
+        logger.info('Serving %d RTCM messages from %s on mountpoint %s.' %
+                    (len(messages[mountpoint]), path, mountpoint))
+
+    caster = NTRIPCaster((options.address, options.port), username=username, password=password)
+    for mountpoint in messages:
+        caster.add_mountpoint(mountpoint)
+    caster.start()
+    logger.info('Listening for NTRIP connections on port %d.' % options.port)
+
+    # Send data for each mountpoint until the user hits Ctrl-C.
+    bytes_per_interval = max(int(options.rate * options.interval), 1)
+    next_index = {mountpoint: 0 for mountpoint in messages}
+    try:
+        while True:
+            time.sleep(options.interval)
+            for mountpoint, mountpoint_messages in messages.items():
+                chunks = []
+                size = 0
+                while size < bytes_per_interval:
+                    data = mountpoint_messages[next_index[mountpoint]]
+                    next_index[mountpoint] = (next_index[mountpoint] + 1) % len(mountpoint_messages)
+                    chunks.append(data)
+                    size += len(data)
+                caster.send(mountpoint, b''.join(chunks))
+    except KeyboardInterrupt:
+        pass
+
+    logger.info('Shutting down.')
+    caster.stop()
+    caster.join()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,136 @@
+import asyncio
+import logging
+import sys
+import time
+import traceback
+
+import serial
+
+from .output_server import AsyncOutputServer
+from .runner import P1Runner
+
+
+class AsyncP1Runner(P1Runner):
+    """!
+    @brief Device runner that performs all device and network I/O in a single asyncio event loop.
+
+    Incoming device data is read directly from the serial port file descriptor when it becomes readable
+    (`loop.add_reader()`) and processed immediately. The NTRIP client, TCP/websocket output servers, and reference
+    TCP client all run as tasks in the same loop, so data is passed between them without any cross-thread handoff.
+
+    The event loop runs on the runner thread, so the @ref start(), @ref stop(), and @ref join() interface is the same
+    as @ref P1Runner. Components that perform blocking disk or device I/O (log manager, RTT capture, external serial
+    recorder) still run on their own threads.
+
+    @note
+    Requires a serial port that supports `fileno()`, and is therefore not supported on Windows.
+    """
+    logger = logging.getLogger('point_one.p1_runner.runner')
+
+    # The maximum amount of time to wait for network tasks to finish on shutdown.
+    SHUTDOWN_TIMEOUT_SEC = 2.0
+
+    def __init__(self, *args, **kwargs):
+        if sys.platform == 'win32':
+            raise RuntimeError('The event loop runner is not supported on Windows.')
+
+        # Data is read by the event loop as soon as it arrives, so a separate reader thread is not used.
+        kwargs['device_read_buffer_bytes'] = 0
+        super().__init__(*args, **kwargs)
+
+        self.last_data_time = None
+        self.timeout_handle = None
+
+        self.replay_blocks = None
+        self.replay_handle = None
+
+    def stop(self):
+        if self.is_alive():
+            super().stop()
+            # Note: Shutdown requests issued by super().stop() above are queued before the stop request, so they will
+            # be processed before run_forever() returns.
+            self.event_loop.call_soon_threadsafe(self.event_loop.stop)
+
+    def run(self):
+        asyncio.set_event_loop(self.event_loop)
+
+        if self.device_replay is not None:
+            # Process one block of replay data per loop iteration so network tasks continue to run during replay.
+            self.replay_blocks = self.device_replay.iter_blocks()
+            self.replay_handle = self.event_loop.call_soon(self._replay_next)
+        else:
+            self.last_data_time = time.monotonic()
+            self.event_loop.add_reader(self.device_serial.fileno(), self._on_readable)
+            self.timeout_handle = self.event_loop.call_later(self.device_serial.timeout, self._check_timeout)
+
+        try:
+            self.event_loop.run_forever()
+        finally:
+            if self.device_replay is not None:
+                self.replay_handle.cancel()
+                self.replay_blocks.close()
+                if not self.replay_complete.is_set():
+                    self.device_replay.finish()
+            else:
+                self.event_loop.remove_reader(self.device_serial.fileno())
+                self.timeout_handle.cancel()
+            self._shutdown_tasks()
+            self.event_loop.close()
+
+    def _on_readable(self):
+        try:
+            data = self.device_serial.read(self.device_serial.in_waiting or 1)
+        except serial.SerialException:
+            self.logger.error('Unexpected error reading from device:\r%s' % traceback.format_exc())
+            self.event_loop.stop()
+            return
+
+        if len(data) > 0:
+            self.last_data_time = time.monotonic()
+            self.last_data_timeout_warning_time = None
+            self._on_data(data, host_time_ns=time.monotonic_ns())
+
+    def _replay_next(self):
+        try:
+            data, send_time_sec = next(self.replay_blocks)
+        except StopIteration:
+            self.device_replay.finish()
+            self._on_replay_complete()
+            return
+
+        # Note: The event loop clock is the host monotonic clock, the same as the replay send times.
+        if send_time_sec is not None and send_time_sec > self.event_loop.time():
+            self.replay_handle = self.event_loop.call_at(send_time_sec, self._replay_block, data)
+        else:
+            self._replay_block(data)
+
+    def _replay_block(self, data):
+        self._on_data(data)
+        self.replay_handle = self.event_loop.call_soon(self._replay_next)
+
+    def _check_timeout(self):
+        if time.monotonic() - self.last_data_time >= self.device_serial.timeout:
+            self._on_read_timeout()
+        self.timeout_handle = self.event_loop.call_later(self.device_serial.timeout, self._check_timeout)
+
+    def _shutdown_tasks(self):
+        # Allow any pending network tasks (e.g., closing client connections) to finish, then cancel anything that is
+        # still running.
+        pending = asyncio.all_tasks(self.event_loop)
+        if len(pending) > 0:
+            self.logger.debug('Waiting for %d tasks to finish.' % len(pending))
+            _, pending = self.event_loop.run_until_complete(asyncio.wait(pending, timeout=self.SHUTDOWN_TIMEOUT_SEC))
+            if len(pending) > 0:
+                self.logger.debug('Cancelling %d tasks.' % len(pending))
+                for task in pending:
+                    task.cancel()
+                self.event_loop.run_until_complete(asyncio.gather(*pending, return_exceptions=True))
+
+        self.event_loop.run_until_complete(self.event_loop.shutdown_asyncgens())
+        self.event_loop.run_until_complete(self.event_loop.shutdown_default_executor())
+
+    def _create_event_loop(self):
+        return asyncio.new_event_loop()
+
+    def _create_output_server(self, **kwargs):
+        return AsyncOutputServer(self.event_loop, **kwargs)
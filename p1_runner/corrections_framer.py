@@ -0,0 +1,117 @@
+import logging
+import time
+
+from .rtcm_framer import RTCMFramer
+
+
+class CorrectionsFramer(object):
+    """!
+    @brief Frame incoming RTCM 3 corrections data and collect statistics for each message type.
+
+    Data passed to @ref on_data() is run through an @ref RTCMFramer, and only complete, CRC-valid frames are returned.
+    Incomplete frames are held until the rest of the frame arrives. Any other data (non-RTCM content, frames that fail
+    the CRC check) is discarded and counted in @ref bytes_discarded.
+    """
+    logger = logging.getLogger('point_one.p1_runner.corrections_framer')
+
+    def __init__(self):
+        self.framer = RTCMFramer()
+
+        self.bytes_received = 0
+        self.bytes_framed = 0
+        # Statistics for each RTCM message ID: count, bytes, and the first and most recent receive times (host
+        # monotonic time).
+        self.message_stats = {}
+        self.last_message_time = None
+
+    def reset(self):
+        self.framer.reset()
+
+    @property
+    def bytes_discarded(self):
+        return self.bytes_received - self.bytes_framed - len(self.framer.buffer)
+
+    def on_data(self, data, now=None):
+        """!
+        @brief Process incoming corrections data.
+
+        @param data The received data.
+        @param now The host monotonic time (in seconds) at which the data was received. Defaults to the current time.
+
+        @return A `bytes` object containing all complete RTCM frames found in the data (or carried over from previous
+                calls), or an empty `bytes` object if no frames were completed.
+        """
+        if now is None:
+            now = time.monotonic()
+
+        self.bytes_received += len(data)
+        messages = self.framer.on_data(data)
+        if len(messages) == 0:
+            return b''
+
+        for message in messages:
+            stats = self.message_stats.get(message.message_id, None)
+            if stats is None:
+                stats = {'count': 0, 'bytes': 0, 'first_time': now, 'last_time': now}
+                self.message_stats[message.message_id] = stats
+                self.logger.debug('Received first RTCM %s message. [size=%d B]' %
+                                  (self._format_message_id(message.message_id), message.size))
+            stats['count'] += 1
+            stats['bytes'] += message.size
+            stats['last_time'] = now
+        self.last_message_time = now
+
+        data = messages[0].data if len(messages) == 1 else b''.join(m.data for m in messages)
+        self.bytes_framed += len(data)
+        return data
+
+    def get_message_stats(self, now=None):
+        """!
+        @brief Get statistics for each received RTCM message type.
+
+        @param now The current host monotonic time (in seconds). Defaults to the current time.
+
+        @return A `dict`, keyed by RTCM message ID, containing the number of messages and bytes received, the mean
+                message rate (Hz) and data rate (bytes/second), and the age of the most recent message (seconds).
+        """
+        if now is None:
+            now = time.monotonic()
+
+        result = {}
+        for message_id, stats in list(self.message_stats.items()):
+            elapsed_sec = stats['last_time'] - stats['first_time']
+            rate_hz = (stats['count'] - 1) / elapsed_sec if elapsed_sec > 0.0 else 0.0
+            result[message_id] = {
+                'count': stats['count'],
+                'bytes': stats['bytes'],
+                'rate_hz': rate_hz,
+                'bytes_per_sec': rate_hz * stats['bytes'] / stats['count'],
+                'age_sec': now - stats['last_time'],
+            }
+        return result
+
+    def get_age_sec(self, now=None):
+        """!
+        @brief Get the amount of time since the most recent RTCM frame was received.
+
+        @return The age of the most recent frame (in seconds), or `None` if no frames have been received.
+        """
+        if self.last_message_time is None:
+            return None
+        elif now is None:
+            now = time.monotonic()
+        return now - self.last_message_time
+
+    def format_message_stats(self, now=None):
+        """!
+        @brief Generate a summary string of the statistics for each message type, ordered by message ID.
+        """
+        message_stats = self.get_message_stats(now=now)
+        return ', '.join('%s: %d (%.1f Hz, %.0f B/s, age=%.1f s)' %
+                         (self._format_message_id(message_id), stats['count'], stats['rate_hz'],
+                          stats['bytes_per_sec'], stats['age_sec'])
+                         for message_id, stats in sorted(message_stats.items(), key=lambda e: e[0] or 0))
+
+    @classmethod
+    def _format_message_id(cls, message_id):
+        return '?' if message_id is None else str(message_id)
@@ -0,0 +1,91 @@
+from collections import deque
+import logging
+import threading
+import time
+import traceback
+
+from .log_index import IndexRecordType, LogIndexWriter
+
+
+class CorrectionsRecorder(threading.Thread):
+    """!
+    @brief Record incoming corrections data to disk on a separate thread.
+
+    The data is written to `path` exactly as received. The host receive time of each block of data is recorded in a
+    corresponding @ref LogIndexWriter index file (`path.index`) as an @ref IndexRecordType.DATA record, which may be
+    used to replay the data with its original timing (see @ref CorrectionsReplay).
+    """
+    logger = logging.getLogger('point_one.p1_runner.corrections_recorder')
+
+    DEFAULT_FILENAME = 'corrections.rtcm'
+    INDEX_FILENAME = DEFAULT_FILENAME + LogIndexWriter.FILE_EXTENSION
+
+    def __init__(self, path):
+        super().__init__(name='corrections_recorder')
+
+        self.path = path
+
+        # (data, host_time_ns) for each write() call.
+        self.queue = deque()
+        self.lock = threading.Lock()
+        self.data_cond = threading.Condition(self.lock)
+
+        self.bytes_written = 0
+
+        self.shutdown_pending = threading.Event()
+
+    def stop(self):
+        self.shutdown_pending.set()
+        with self.lock:
+            self.data_cond.notify_all()
+
+    def write(self, data, host_time_ns=None):
+        """!
+        @brief Queue data to be recorded.
+
+        @param data The received data.
+        @param host_time_ns The host monotonic time (in nanoseconds) at which the data was received. If `None`, use the
+               current time.
+        """
+        if host_time_ns is None:
+            host_time_ns = time.monotonic_ns()
+        with self.lock:
+            self.queue.append((bytes(data), host_time_ns))
+            self.data_cond.notify()
+
+    def run(self):
+        self.logger.debug("Recording corrections data to '%s'." % self.path)
+        try:
+            data_file = open(self.path, 'wb')
+            index_writer = LogIndexWriter(self.path + LogIndexWriter.FILE_EXTENSION)
+        except IOError:
+            self.logger.error('Unable to create corrections log:\r%s' % traceback.format_exc())
+            return
+
+        try:
+            while True:
+                with self.lock:
+                    self.data_cond.wait_for(lambda: len(self.queue) > 0 or self.shutdown_pending.is_set())
+                    entries = list(self.queue)
+                    self.queue.clear()
+
+                for data, host_time_ns in entries:
+                    index_writer.write(host_time_ns, self.bytes_written, IndexRecordType.DATA, size=len(data))
+                    data_file.write(data)
+                    self.bytes_written += len(data)
+
+                # Corrections data arrives at a low rate, so flush after each batch of writes so the log is usable
+                # even if the application is killed.
+                if len(entries) > 0:
+                    data_file.flush()
+                    index_writer.flush()
+
+                if self.shutdown_pending.is_set():
+                    break
+        except IOError:
+            self.logger.error('Error writing corrections log:\r%s' % traceback.format_exc())
+        finally:
+            data_file.close()
+            index_writer.close()
+
+        self.logger.debug('Recorded %d bytes of corrections data.' % self.bytes_written)
@@ -0,0 +1,146 @@
+from collections import deque
+import logging
+import threading
+import time
+import traceback
+
+from . import trace
+
+
+class CorrectionsWriter(threading.Thread):
+    """!
+    @brief Send corrections data to a destination (e.g., a device serial port) on a separate thread.
+
+    @ref write() queues the data and returns immediately, so the caller (e.g., the NTRIP client) is never blocked by a
+    slow or stalled destination. Queued data is combined and written by this thread as soon as the previous write
+    completes.
+
+    If the queue exceeds `max_queue_bytes`, the oldest queued data is discarded. Corrections data is only useful if it
+    is current, so newer data takes priority.
+    """
+    logger = logging.getLogger('point_one.p1_runner.corrections_writer')
+
+    DEFAULT_MAX_QUEUE_BYTES = 256 * 1024
+
+    def __init__(self, write_func, name='corrections_writer', max_queue_bytes=DEFAULT_MAX_QUEUE_BYTES):
+        """!
+        @brief Create a writer.
+
+        @param write_func A function to be called to send data to the destination. May block.
+        @param name The name of the destination, used for the thread name and log messages.
+        @param max_queue_bytes The maximum number of bytes that may be waiting to be sent.
+        """
+        super().__init__(name=name)
+
+        self.write_func = write_func
+        self.max_queue_bytes = max_queue_bytes
+
+        # (data, enqueue_time) for each pending write() call.
+        self.queue = deque()
+        self.queued_bytes = 0
+        self.lock = threading.Lock()
+        self.data_cond = threading.Condition(self.lock)
+
+        self.bytes_written = 0
+        self.bytes_dropped = 0
+        self.overflow_count = 0
+        self.max_queued_bytes = 0
+
+        # The time between a write() call and the completion of the write to the destination.
+        self.num_writes = 0
+        self.total_latency_sec = 0.0
+        self.max_latency_sec = 0.0
+
+        # Set if the thread exits due to an error writing to the destination.
+        self.error = None
+
+        self.shutdown_pending = threading.Event()
+
+    def stop(self):
+        self.shutdown_pending.set()
+        with self.lock:
+            self.data_cond.notify_all()
+
+    def write(self, data):
+        """!
+        @brief Queue data to be sent.
+
+        @param data The data to be sent.
+
+        @return `False` if queued data was discarded because the queue is full.
+        """
+        now = time.monotonic()
+        dropped = False
+        with self.lock:
+            self.queue.append((bytes(data), now))
+            self.queued_bytes += len(data)
+            while self.queued_bytes > self.max_queue_bytes:
+                discarded, _ = self.queue.popleft()
+                self.queued_bytes -= len(discarded)
+                self.bytes_dropped += len(discarded)
+                dropped = True
+
+            if dropped:
+                self.overflow_count += 1
+                overflow_count = self.overflow_count
+            if self.queued_bytes > self.max_queued_bytes:
+                self.max_queued_bytes = self.queued_bytes
+
+            self.data_cond.notify()
+
+        # Warn on the first overflow, and periodically after that.
+        if dropped and (overflow_count == 1 or overflow_count % 1000 == 0):
+            self.logger.warning('%s not keeping up. Discarding corrections data. [%d B discarded]' %
+                                (self.name, self.bytes_dropped))
+        return not dropped
+
+    def get_depth_bytes(self):
+        return self.queued_bytes
+
+    def get_stats(self):
+        """!
+        @brief Get the current queue statistics.
+
+        @return A `dict` containing the number of bytes written, dropped, and currently queued, the maximum queue depth,
+                and the mean and maximum write latency (in seconds).
+        """
+        return {
+            'name': self.name,
+            'bytes_written': self.bytes_written,
+            'bytes_dropped': self.bytes_dropped,
+            'queue_bytes': self.queued_bytes,
+            'max_queue_bytes': self.max_queued_bytes,
+            'mean_latency_sec': self.total_latency_sec / self.num_writes if self.num_writes > 0 else 0.0,
+            'max_latency_sec': self.max_latency_sec,
+        }
+
+    def run(self):
+        while True:
+            with self.lock:
+                self.data_cond.wait_for(lambda: len(self.queue) > 0 or self.shutdown_pending.is_set())
+                if self.shutdown_pending.is_set():
+                    break
+
+                # Send all pending data in a single write.
+                entries = list(self.queue)
+                self.queue.clear()
+                self.queued_bytes = 0
+
+            data = entries[0][0] if len(entries) == 1 else b''.join(e[0] for e in entries)
+            self.logger.trace('%s: Sending %d bytes.' % (self.name, len(data)))
+            try:
+                self.write_func(data)
+            except Exception as e:
+                if not self.shutdown_pending.is_set():
+                    self.logger.error('%s: Unexpected error sending corrections data:\r%s' %
+                                      (self.name, traceback.format_exc()))
+                    self.error = e
+                break
+
+            # Latency is measured from the oldest data in the write.
+            latency_sec = time.monotonic() - entries[0][1]
+            self.bytes_written += len(data)
+            self.num_writes += 1
+            self.total_latency_sec += latency_sec
+            if latency_sec > self.max_latency_sec:
+                self.max_latency_sec = latency_sec
@@ -0,0 +1,148 @@
+from collections import deque
+import logging
+import threading
+import time
+import traceback
+
+import serial
+
+
+class DeviceReader(threading.Thread):
+    """!
+    @brief Read incoming data from a serial port into a ring buffer on a dedicated thread.
+
+    The reader thread does nothing but read from the serial port, so the port is serviced promptly even if processing
+    of the incoming data is temporarily delayed (e.g., disk or network hiccups). Each block of data is timestamped
+    (host monotonic time) when it is received. The data is consumed by another thread, one block at a time, using
+    @ref read().
+
+    If the buffer is full because processing has fallen behind, incoming data is discarded and counted in
+    `overrun_bytes`.
+    """
+    logger = logging.getLogger('point_one.p1_runner.device_reader')
+
+    DEFAULT_BUFFER_SIZE_BYTES = 4 * 1024 * 1024
+
+    def __init__(self, device_serial, buffer_size_bytes=DEFAULT_BUFFER_SIZE_BYTES, name='device_reader'):
+        super().__init__(name=name)
+
+        self.device_serial = device_serial
+
+        self.buffer = bytearray(buffer_size_bytes)
+        self.buffer_size_bytes = buffer_size_bytes
+        # Total number of bytes written to/read from the buffer. The buffer index is the offset modulo the buffer size.
+        self.write_offset = 0
+        self.read_offset = 0
+        # (start_offset, receive_time_ns) for each block of data in the buffer.
+        self.receive_times = deque()
+
+        self.lock = threading.Lock()
+        self.data_cond = threading.Condition(self.lock)
+
+        self.bytes_received = 0
+        self.overrun_bytes = 0
+        self.overrun_count = 0
+        self.max_depth_bytes = 0
+
+        # Set if the reader thread exits due to an error reading from the serial port.
+        self.error = None
+
+        self.shutdown_pending = threading.Event()
+
+    def stop(self):
+        self.shutdown_pending.set()
+        with self.lock:
+            self.data_cond.notify_all()
+
+    def get_depth_bytes(self):
+        return self.write_offset - self.read_offset
+
+    def run(self):
+        while not self.shutdown_pending.is_set():
+            # Read all pending data, or block until at least 1 byte comes in.
+            try:
+                data = self.device_serial.read(self.device_serial.in_waiting or 1)
+            except serial.SerialException as e:
+                if not self.shutdown_pending.is_set():
+                    self.logger.error('Unexpected error reading from device:\r%s' % traceback.format_exc())
+                    self.error = e
+                break
+
+            if len(data) > 0:
+                self._push(data, time.monotonic_ns())
+
+        # Wake the consumer so it can detect that the reader has stopped.
+        with self.lock:
+            self.data_cond.notify_all()
+
+    def read(self, timeout=None):
+        """!
+        @brief Retrieve the oldest block of data in the buffer, waiting for new data if the buffer is empty.
+
+        Each call returns the data from a single serial port read, so that every byte is reported with the time at
+        which it was actually received, even if processing has fallen behind and multiple blocks are waiting.
+
+        @param timeout The maximum amount of time to wait for data (in seconds), or `None` to wait indefinitely.
+
+        @return A tuple containing the data (`bytes`) and the host monotonic time (in nanoseconds) at which it was
+                received. If no data arrived before the timeout, returns `(b'', None)`.
+        """
+        with self.lock:
+            if self.write_offset == self.read_offset:
+                self.data_cond.wait_for(lambda: (self.write_offset != self.read_offset or
+                                                 self.shutdown_pending.is_set() or not self.is_alive()),
+                                        timeout=timeout)
+                if self.write_offset == self.read_offset:
+                    return b'', None
+
+            read_offset = self.read_offset
+            receive_time_ns = self.receive_times[0][1]
+            # Stop at the start of the next block, if any.
+            write_offset = self.receive_times[1][0] if len(self.receive_times) > 1 else self.write_offset
+
+        # The reader thread only writes to the free portion of the buffer, so we can copy out the pending data without
+        # holding the lock. The space is released once the data has been copied.
+        start_idx = read_offset % self.buffer_size_bytes
+        end_idx = write_offset % self.buffer_size_bytes
+        with memoryview(self.buffer) as view:
+            if start_idx < end_idx:
+                data = bytes(view[start_idx:end_idx])
+            else:
+                data = b''.join((view[start_idx:], view[:end_idx]))
+
+        with self.lock:
+            self.read_offset = write_offset
+            while len(self.receive_times) > 0 and self.receive_times[0][0] < write_offset:
+                self.receive_times.popleft()
+
+        return data, receive_time_ns
+
+    def _push(self, data, receive_time_ns):
+        with self.lock:
+            self.bytes_received += len(data)
+
+            available = self.buffer_size_bytes - (self.write_offset - self.read_offset)
+            if len(data) > available:
+                self.overrun_bytes += len(data) - available
+                self.overrun_count += 1
+                if self.overrun_count == 1 or self.overrun_count % 1000 == 0:
+                    self.logger.warning('Device data processing is not keeping up. Discarding incoming data. '
+                                        '[%d B discarded]' % self.overrun_bytes)
+                data = data[:available]
+                if len(data) == 0:
+                    return
+
+            start_idx = self.write_offset % self.buffer_size_bytes
+            first_len = min(len(data), self.buffer_size_bytes - start_idx)
+            self.buffer[start_idx:start_idx + first_len] = data[:first_len]
+            if first_len < len(data):
+                self.buffer[:len(data) - first_len] = data[first_len:]
+
+            self.receive_times.append((self.write_offset, receive_time_ns))
+            self.write_offset += len(data)
+
+            depth = self.write_offset - self.read_offset
+            if depth > self.max_depth_bytes:
+                self.max_depth_bytes = depth
+
+            self.data_cond.notify()
@@ -0,0 +1,164 @@
+"""!
+@brief Binary index mapping host time, GPS time, and message type to byte offsets within a data log.
+
+An index file consists of a fixed-size header followed by a sequence of fixed-size records:
+
+```
+Header:  magic (4B, 'P1IX'), version (uint16), reserved (uint16), start_monotonic_ns (int64),
+         start_posix_ns (int64)
+Record:  host_time_ns (int64, monotonic), offset (uint64), gps_time_sec (float64, NaN if unknown),
+         record_type (uint8), reserved (uint8), message_id (uint16), size (uint32)
+```
+
+All values are little-endian. Offsets are measured in bytes from the start of the data log, across all log segments.
+Host times are monotonic nanosecond timestamps; `start_monotonic_ns` and `start_posix_ns` may be used to convert them
+to wall clock time.
+"""
+
+from bisect import bisect_right
+from collections import namedtuple
+from enum import IntEnum
+import math
+import struct
+import time
+
+
+class IndexRecordType(IntEnum):
+    ## A block of data written to the log, in the order it was received.
+    DATA = 0
+    FUSION_ENGINE = 1
+    RTCM = 2
+    NMEA = 3
+
+
+IndexRecord = namedtuple('IndexRecord', ('host_time_ns', 'offset', 'gps_time_sec', 'record_type', 'message_id',
+                                         'size'))
+
+## A message to be indexed by @ref LogManager.write(). `offset` is relative to the start of the written data, and may
+## be negative if the message started in a previous write.
+IndexedMessage = namedtuple('IndexedMessage', ('offset', 'record_type', 'message_id', 'size', 'gps_time_sec'),
+                            defaults=(0, 0, math.nan))
+
+
+class LogIndexWriter(object):
+    MAGIC = b'P1IX'
+    VERSION = 1
+
+    _HEADER_FORMAT = '<4sHHqq'
+    _HEADER_SIZE = struct.calcsize(_HEADER_FORMAT)
+    _RECORD_FORMAT = '<qQdBBHI'
+    _RECORD_SIZE = struct.calcsize(_RECORD_FORMAT)
+
+    FILE_EXTENSION = '.index'
+
+    def __init__(self, path):
+        self.path = path
+        self.file = open(path, 'wb')
+        self.num_records = 0
+
+        self.start_monotonic_ns = time.monotonic_ns()
+        self.start_posix_ns = time.time_ns()
+        self.file.write(struct.pack(self._HEADER_FORMAT, self.MAGIC, self.VERSION, 0, self.start_monotonic_ns,
+                                    self.start_posix_ns))
+
+    def write(self, host_time_ns, offset, record_type=IndexRecordType.DATA, message_id=0, size=0,
+              gps_time_sec=math.nan):
+        self.file.write(struct.pack(self._RECORD_FORMAT, host_time_ns, offset, gps_time_sec, record_type, 0,
+                                    message_id, size))
+        self.num_records += 1
+
+    def flush(self):
+        self.file.flush()
+
+    def close(self):
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+
+class LogIndex(object):
+    """!
+    @brief Read an index file generated by @ref LogIndexWriter and locate data by host or GPS time.
+    """
+
+    def __init__(self, records, start_monotonic_ns=0, start_posix_ns=0):
+        self.records = records
+        self.start_monotonic_ns = start_monotonic_ns
+        self.start_posix_ns = start_posix_ns
+
+        # Sorted search keys, computed on first use for each record type.
+        self._host_time_tables = {}
+        self._gps_time_table = None
+
+    @classmethod
+    def from_file(cls, path):
+        with open(path, 'rb') as f:
+            contents = f.read()
+
+        if len(contents) < LogIndexWriter._HEADER_SIZE:
+            raise IOError("Index file '%s' is empty." % path)
+
+        magic, version, _, start_monotonic_ns, start_posix_ns = \
+            struct.unpack_from(LogIndexWriter._HEADER_FORMAT, contents)
+        if magic != LogIndexWriter.MAGIC:
+            raise IOError("File '%s' is not a log index file." % path)
+        elif version != LogIndexWriter.VERSION:
+            raise IOError("Unsupported log index version %d." % version)
+
+        # Ignore a partial record at the end of the file (e.g., if the application was killed while writing).
+        data_len = len(contents) - LogIndexWriter._HEADER_SIZE
+        data_len -= data_len % LogIndexWriter._RECORD_SIZE
+        records = [IndexRecord(host_time_ns, offset, gps_time_sec, IndexRecordType(record_type), message_id, size)
+                   for host_time_ns, offset, gps_time_sec, record_type, _, message_id, size in
+                   struct.iter_unpack(LogIndexWriter._RECORD_FORMAT,
+                                      memoryview(contents)[LogIndexWriter._HEADER_SIZE:
+                                                           LogIndexWriter._HEADER_SIZE + data_len])]
+        return cls(records, start_monotonic_ns=start_monotonic_ns, start_posix_ns=start_posix_ns)
+
+    def __len__(self):
+        return len(self.records)
+
+    def to_posix_time(self, host_time_ns):
+        return (host_time_ns - self.start_monotonic_ns + self.start_posix_ns) * 1e-9
+
+    def find_by_host_time(self, posix_time_sec, record_type=IndexRecordType.DATA):
+        """!
+        @brief Find the last record received at or before the specified host time.
+
+        @param posix_time_sec The host (wall clock) time, in POSIX seconds.
+        @param record_type The type of record to search for, or `None` to search all records. By default, only records
+               for data blocks are searched since message records share the host time of the block containing them.
+
+        @return The @ref IndexRecord, or `None` if the time precedes the first record.
+        """
+        if record_type not in self._host_time_tables:
+            records = self.get_records(record_type=record_type)
+            self._host_time_tables[record_type] = (records, [r.host_time_ns for r in records])
+        records, host_times = self._host_time_tables[record_type]
+
+        host_time_ns = int(round(posix_time_sec * 1e9)) - self.start_posix_ns + self.start_monotonic_ns
+        idx = bisect_right(host_times, host_time_ns) - 1
+        return records[idx] if idx >= 0 else None
+
+    def find_by_gps_time(self, gps_time_sec):
+        """!
+        @brief Find the last record with a GPS timestamp at or before the specified GPS time.
+
+        Only records with a valid GPS time (e.g., FusionEngine pose messages) are searched.
+
+        @param gps_time_sec The GPS time, in seconds since the GPS epoch.
+
+        @return The @ref IndexRecord, or `None` if the time precedes the first record with a valid GPS time.
+        """
+        if self._gps_time_table is None:
+            records = [r for r in self.records if not math.isnan(r.gps_time_sec)]
+            self._gps_time_table = (records, [r.gps_time_sec for r in records])
+        records, gps_times = self._gps_time_table
+
+        idx = bisect_right(gps_times, gps_time_sec) - 1
+        return records[idx] if idx >= 0 else None
+
+    def get_records(self, record_type=None, message_id=None):
+        return [r for r in self.records
+                if (record_type is None or r.record_type == record_type) and
+                (message_id is None or r.message_id == message_id)]
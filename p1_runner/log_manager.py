@@ -1,14 +1,17 @@
+from collections import deque
 from datetime import datetime, timezone
 import logging
 import os
-import queue
+import shutil
 import struct
 import subprocess
 import sys
+import tempfile
 import threading
 import time
 import uuid
 
+from .log_index import IndexRecordType, LogIndexWriter
 from .log_manifest import DeviceType, LogManifest
 from . import trace
 
@@ -19,9 +22,23 @@ class LogManager(threading.Thread):
     PREV_GUID_PATTERN = 'prev_guid_%s.txt'
     SEQUENCE_NUMBER_FILE = 'sequence_num.txt'
 
+    DEFAULT_FLUSH_SIZE_BYTES = 64 * 1024
+    DEFAULT_FLUSH_INTERVAL_SEC = 0.1
+
+    DEFAULT_MAX_QUEUE_BYTES = 64 * 1024 * 1024
+    QUEUE_FULL_POLICIES = ('block', 'drop_oldest', 'spill')
+
+    # Segments are rolled over at the start of a FusionEngine message, as identified by the message offsets passed to
+    # write(). If no message start is found within this many bytes of the requested rollover (e.g., the device is not
+    # outputting FusionEngine data), roll over at the next write boundary instead.
+    MAX_SEGMENT_ROLLOVER_DELAY_BYTES = 1024 * 1024
+
     def __init__(
             self, device_id, logs_base_dir='/logs', files=None, log_extension='.raw', create_symlink=True,
-            log_created_cmd=None, log_timestamps=True):
+            log_created_cmd=None, log_timestamps=True, flush_size_bytes=DEFAULT_FLUSH_SIZE_BYTES,
+            flush_interval_sec=DEFAULT_FLUSH_INTERVAL_SEC, max_queue_bytes=DEFAULT_MAX_QUEUE_BYTES,
+            queue_full_policy='drop_oldest', segment_size_bytes=None, segment_duration_sec=None,
+            message_aligned_writes=False, log_index=False, index_messages=True):
         super().__init__(name='log_manager')
 
         self.device_id = device_id
@@ -35,6 +52,11 @@ class LogManager(threading.Thread):
         self.sequence_num = None
         self.log_dir = None
         self.log_timestamps = log_timestamps
+        self.log_index = log_index
+        # If False, the messages passed to write() are only used to locate segment boundaries, and the index lists only
+        # the data blocks.
+        self.index_messages = index_messages
+        self.index_writer = None
         self.start_time = time.time()
         self.last_timestamp = time.time()
 
@@ -43,7 +65,61 @@ class LogManager(threading.Thread):
         else:
             self.files = []
 
-        self.data_queue = queue.Queue()
+        # Incoming data is queued by write() and written to disk in batches by run(), either once
+        # flush_size_bytes have been queued or flush_interval_sec after the first pending write, whichever comes first.
+        self.flush_size_bytes = flush_size_bytes
+        self.flush_interval_sec = flush_interval_sec
+
+        self.data_queue = deque()
+        self.queued_bytes = 0
+        self.queue_lock = threading.Lock()
+        self.queue_cond = threading.Condition(self.queue_lock)
+        self.flush_cond = threading.Condition(self.queue_lock)
+        self.writer_idle = False
+        self.stop_requested = False
+        self.flush_requests = 0
+        self.flushes_completed = 0
+
+        # If the disk stalls and more than max_queue_bytes are waiting to be written, write() will do one of the
+        # following depending on queue_full_policy:
+        # - block - Wait for the writer thread to catch up
+        # - drop_oldest - Discard the oldest queued data to make room
+        # - spill - Store new data in a temporary file until the writer thread catches up
+        if queue_full_policy not in self.QUEUE_FULL_POLICIES:
+            raise ValueError("Unsupported queue full policy '%s'." % queue_full_policy)
+        self.max_queue_bytes = max_queue_bytes
+        self.queue_full_policy = queue_full_policy
+        self.space_cond = threading.Condition(self.queue_lock)
+        self.producers_blocked = 0
+        # Set when the writer thread exits (e.g., due to a disk error), so blocked producers do not wait forever.
+        self.writer_stopped = False
+        self.spill_file = None
+        self.spill_entries = None
+        self.spilling = False
+
+        self.bytes_dropped = 0
+        self.bytes_spilled = 0
+
+        # If segment_size_bytes and/or segment_duration_sec are set, the data will be split into multiple files
+        # (input.raw.000, input.raw.001, etc.). If message_aligned_writes is True, each call to write() is assumed to
+        # contain complete messages (e.g., .p1log format), and segments will roll over between writes. Otherwise,
+        # segments roll over at the start of the next FusionEngine message listed in the `messages` passed to write().
+        self.segment_size_bytes = segment_size_bytes
+        self.segment_duration_sec = segment_duration_sec
+        self.message_aligned_writes = message_aligned_writes
+        self.segmented = segment_size_bytes is not None or segment_duration_sec is not None
+        self.segment_index = None
+        self.segment_start_offset = 0
+        self.segment_start_time = None
+        self.rollover_pending = False
+        self.rollover_requested_offset = None
+        self.manifest_lock = threading.Lock()
+
+        self.bin_file = None
+        self.timestamp_file = None
+        self.write_buffer = None
+        self.write_fill = 0
+        self.bytes_written = 0
 
     def get_log_directory(self):
         return self.log_dir
@@ -98,59 +174,372 @@ class LogManager(threading.Thread):
     def stop(self):
         if self.is_alive():
             self.logger.debug('Stopping log manager.')
-            self.data_queue.put(None)
-
-    def write(self, data):
+            with self.queue_lock:
+                self.stop_requested = True
+                self.queue_cond.notify()
+
+    def write(self, data, messages=None, host_time_ns=None):
+        """!
+        @brief Queue data to be written to the log.
+
+        @param data The data to be written.
+        @param messages An optional list of @ref IndexedMessage entries identifying messages within the data to be
+               recorded in the log index (if enabled). Message offsets are relative to the start of `data`. For
+               segmented logs, segments roll over at the start of a listed FusionEngine message.
+        @param host_time_ns The host monotonic time (in nanoseconds) at which the data was received. If `None`, use the
+               current time.
+        """
         if not self.is_alive():
             return
 
         if isinstance(data, str):
             data = data.encode('utf-8')
 
-        self.data_queue.put(data)
+        size = len(data)
+        if host_time_ns is None:
+            entry = (data,
+                     time.time() if self.log_timestamps else None,
+                     time.monotonic_ns() if self.log_index else None,
+                     messages)
+        else:
+            entry = (data,
+                     time.time() - (time.monotonic_ns() - host_time_ns) * 1e-9 if self.log_timestamps else None,
+                     host_time_ns,
+                     messages)
+        with self.queue_lock:
+            # While a spill file is pending, all new data must go to it so data is written to disk in order. Once the
+            # writer thread has taken the spill file, it writes the file before anything else in the queue, so new
+            # data can go back into the queue.
+            if self.spill_file is not None or (self.max_queue_bytes is not None and self.queued_bytes > 0 and
+                                               self.queued_bytes + size > self.max_queue_bytes):
+                if not self._handle_queue_full(entry):
+                    return
+
+            self.data_queue.append(entry)
+            self.queued_bytes += size
+            # Only wake the writer thread if it is waiting for new data, or if we have enough data for a full write.
+            # Otherwise, it will wake up on its own when the flush interval elapses.
+            if self.writer_idle or self.queued_bytes >= self.flush_size_bytes:
+                self.queue_cond.notify()
+
+    def _handle_queue_full(self, entry):
+        # Note: Must be called with queue_lock held. Returns True if the entry should be added to the queue.
+        data = entry[0]
+        size = len(data)
+        if self.queue_full_policy == 'block':
+            self.producers_blocked += 1
+            self.queue_cond.notify()
+            self.space_cond.wait_for(lambda: (self.queued_bytes == 0 or
+                                              self.queued_bytes + size <= self.max_queue_bytes or
+                                              self.stop_requested or self.writer_stopped or not self.is_alive()))
+            self.producers_blocked -= 1
+            if self.writer_stopped or not self.is_alive():
+                self.bytes_dropped += size
+                return False
+            return True
+        elif self.queue_full_policy == 'drop_oldest':
+            dropped = 0
+            while len(self.data_queue) > 0 and self.queued_bytes + size > self.max_queue_bytes:
+                dropped_size = len(self.data_queue.popleft()[0])
+                self.queued_bytes -= dropped_size
+                dropped += dropped_size
+            if self.bytes_dropped == 0:
+                self.logger.warning('Log write queue full. Dropping data. [max_queue_size=%d B]' %
+                                    self.max_queue_bytes)
+            self.bytes_dropped += dropped
+            return True
+        else:
+            # Once we start spilling, all new data goes to the spill file until the writer thread takes it so that data
+            # is written to disk in order.
+            if self.spill_file is None:
+                if not self.spilling:
+                    self.logger.warning('Log write queue full. Spilling data to a temporary file. '
+                                        '[max_queue_size=%d B]' % self.max_queue_bytes)
+                self.spill_file = tempfile.TemporaryFile(prefix='p1_log_spill_')
+                self.spill_entries = []
+                self.spilling = True
+            self.spill_file.write(data)
+            self.spill_entries.append((size, *entry[1:]))
+            self.bytes_spilled += size
+            self.queue_cond.notify()
+            return False
+
+    def flush(self, timeout=None):
+        """!
+        @brief Write all pending data to disk, blocking until complete.
+
+        @param timeout The maximum amount of time to wait (in seconds), or `None` to wait indefinitely.
+
+        @return `True` if all data queued before this call was written.
+        """
+        if not self.is_alive():
+            return False
+
+        with self.queue_lock:
+            self.flush_requests += 1
+            request = self.flush_requests
+            self.queue_cond.notify()
+            return self.flush_cond.wait_for(lambda: self.flushes_completed >= request or not self.is_alive(),
+                                            timeout=timeout)
 
     def run(self):
-        path = os.path.join(self.log_dir, self.data_filename)
+        if self.log_created_cmd is not None:
+            try:
+                subprocess.Popen(self.log_created_cmd, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+                                 shell=True)
+            except Exception as e:
+                self.logger.warning("Error running log created command: %s" % repr(e))
+
+        self.write_buffer = bytearray(self.flush_size_bytes)
+        self.write_fill = 0
+        self.bytes_written = 0
+        if self.log_index:
+            index_path = os.path.join(self.log_dir, self.data_filename + LogIndexWriter.FILE_EXTENSION)
+            self.logger.debug("Opening index file '%s'." % index_path)
+            self.index_writer = LogIndexWriter(index_path)
+        self._open_segment()
+        try:
+            while True:
+                entries, spill_file, spill_entries, stop_requested, flush_request = self._wait_for_data()
+
+                if self.segment_duration_sec is not None and not self.rollover_pending and \
+                   time.time() - self.segment_start_time >= self.segment_duration_sec:
+                    self._request_rollover()
+
+                self._write_entries(entries)
+                if spill_file is not None:
+                    self._write_spilled_entries(spill_file, spill_entries)
+                    # If nothing was spilled while we were writing, the writer has caught up.
+                    with self.queue_lock:
+                        if self.spill_file is None:
+                            self.spilling = False
+                self._flush_write_buffer()
+
+                if flush_request > self.flushes_completed:
+                    self.bin_file.flush()
+                    if self.timestamp_file is not None:
+                        self.timestamp_file.flush()
+                    if self.index_writer is not None:
+                        self.index_writer.flush()
+                    with self.queue_lock:
+                        self.flushes_completed = flush_request
+                        self.flush_cond.notify_all()
+
+                if stop_requested:
+                    break
+        finally:
+            self._close_segment()
+            if self.index_writer is not None:
+                self.index_writer.close()
+
+            with self.queue_lock:
+                self.writer_stopped = True
+                self.space_cond.notify_all()
+                self.flushes_completed = self.flush_requests
+                self.flush_cond.notify_all()
+
+        if self.bytes_dropped > 0 or self.bytes_spilled > 0:
+            self.logger.warning('Log writes fell behind. [dropped=%d B, spilled=%d B]' %
+                                (self.bytes_dropped, self.bytes_spilled))
+            self.update_manifest([
+                ('log_bytes_dropped', self.bytes_dropped),
+                ('log_bytes_spilled', self.bytes_spilled),
+            ])
+
+        self.logger.info("Log data stored in '%s'." % self.log_dir)
+
+    def _get_segment_filename(self, index):
+        if self.segmented:
+            return '%s.%03d' % (self.data_filename, index)
+        else:
+            return self.data_filename
+
+    def _open_segment(self):
+        if self.segment_index is None:
+            self.segment_index = 0
+        else:
+            self.segment_index += 1
+
+        filename = self._get_segment_filename(self.segment_index)
+        path = os.path.join(self.log_dir, filename)
         self.logger.debug("Opening bin file '%s'." % path)
-        timestamp_file = None
+        self.bin_file = open(path, 'wb')
         if self.log_timestamps:
-            timestamp_path = os.path.join(self.log_dir, self.data_filename + '.timestamps')
+            timestamp_path = path + '.timestamps'
             self.logger.debug("Opening timestamp file '%s'." % timestamp_path)
-            timestamp_file = open(timestamp_path, 'wb')
-        with open(path, 'wb') as bin_file:
-            if self.log_created_cmd is not None:
-                try:
-                    subprocess.Popen(self.log_created_cmd, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
-                                     shell=True)
-                except Exception as e:
-                    self.logger.warning("Error running log created command: %s" % repr(e))
-
-            while True:
-                data = self.data_queue.get()
-                if data is None:
+            self.timestamp_file = open(timestamp_path, 'wb')
+
+        self.segment_start_offset = self.bytes_written
+        self.segment_start_time = time.time()
+        self.rollover_pending = False
+
+        # The first segment is listed in the manifest when it is created.
+        if self.segmented:
+            with self.manifest_lock:
+                path = os.path.join(self.log_dir, LogManifest.MANIFEST_FILENAME)
+                manifest = LogManifest.from_file(path)
+                if filename not in manifest.channels:
+                    manifest.channels.append(filename)
+                    manifest.channels.sort()
+                manifest.segments.append({
+                    'filename': filename,
+                    'start_offset': self.segment_start_offset,
+                    'start_time': self.segment_start_time,
+                })
+                manifest.to_file(path)
+
+    def _close_segment(self):
+        if self.bin_file is not None:
+            self.bin_file.close()
+            self.bin_file = None
+        if self.timestamp_file is not None:
+            self.timestamp_file.close()
+            self.timestamp_file = None
+
+    def _request_rollover(self):
+        self.rollover_pending = True
+        self.rollover_requested_offset = self.bytes_written
+
+    def _rollover(self):
+        self._flush_write_buffer()
+        self._close_segment()
+        self._open_segment()
+        self.logger.debug('Started log segment %d. [offset=%d B]' % (self.segment_index, self.segment_start_offset))
+
+    def _wait_for_data(self):
+        # Wait until we have enough data to fill the write buffer, the flush interval has elapsed since data first
+        # arrived, or a flush/stop was requested. Then take all pending data from the queue at once.
+        with self.queue_lock:
+            deadline = None
+            while not (self.stop_requested or self.flush_requests > self.flushes_completed or
+                       self.queued_bytes >= self.flush_size_bytes or self.producers_blocked > 0 or
+                       self.spill_file is not None):
+                if len(self.data_queue) == 0:
+                    self.writer_idle = True
+                    self.queue_cond.wait()
+                    self.writer_idle = False
+                    continue
+
+                now = time.monotonic()
+                if deadline is None:
+                    deadline = now + self.flush_interval_sec
+                elif now >= deadline:
                     break
-                else:
-                    size = len(data)
-                    self.logger.trace('Writing %d bytes.' % size)
-                    bin_file.write(data)
-                    timestamp = time.time()
-                    if timestamp_file and timestamp - self.last_timestamp > 0.001:
-                        # This will rollover after about about 50 days.
-                        milliseconds = int(round((timestamp - self.start_time) * 1000.))  % 2**32
-                        # This will rollover after about about 26 hours of full rate 460800 baud data.
-                        offset = bin_file.tell() % 2**32
-                        data = struct.pack('II', milliseconds, offset)
-                        timestamp_file.write(data)
-                        self.last_timestamp = timestamp
-
-        if timestamp_file is not None:
-            timestamp_file.close()
 
-        self.logger.info("Log data stored in '%s'." % self.log_dir)
+                self.queue_cond.wait(deadline - now)
+
+            entries = self.data_queue
+            self.data_queue = deque()
+            self.queued_bytes = 0
+
+            spill_file = self.spill_file
+            spill_entries = self.spill_entries
+            self.spill_file = None
+            self.spill_entries = None
+
+            self.space_cond.notify_all()
+            return entries, spill_file, spill_entries, self.stop_requested, self.flush_requests
+
+    def _write_entries(self, entries):
+        for data, timestamp, host_time_ns, messages in entries:
+            offset = self.bytes_written
+            if self.rollover_pending:
+                data = self._write_until_rollover(data, messages)
+
+            self._append(data)
+            if self.segment_size_bytes is not None and not self.rollover_pending and \
+               self.bytes_written - self.segment_start_offset >= self.segment_size_bytes:
+                self._request_rollover()
+
+            self._log_timestamp(timestamp)
+            if self.index_writer is not None:
+                self._log_index(host_time_ns, offset, self.bytes_written - offset, messages)
+
+    def _write_until_rollover(self, data, messages):
+        # Find the start of the next FusionEngine message in the data, write everything before it to the current
+        # segment, then start a new segment. Returns the data to be written to the new segment.
+        if self.message_aligned_writes:
+            split_offset = 0
+        else:
+            split_offset = None
+            if messages is not None:
+                split_offset = min((m.offset for m in messages
+                                    if m.record_type == IndexRecordType.FUSION_ENGINE and 0 <= m.offset < len(data)),
+                                   default=None)
+
+            if split_offset is None:
+                if self.bytes_written - self.rollover_requested_offset >= self.MAX_SEGMENT_ROLLOVER_DELAY_BYTES:
+                    split_offset = 0
+                else:
+                    return data
+
+        if split_offset > 0:
+            self._append(data[:split_offset])
+            data = data[split_offset:]
+        self._rollover()
+        return data
+
+    def _append(self, data):
+        # Combine pending data into as few write() calls as possible. Anything larger than the write buffer is written
+        # directly.
+        size = len(data)
+        if self.write_fill + size > len(self.write_buffer):
+            self._flush_write_buffer()
+            if size >= len(self.write_buffer):
+                self.bin_file.write(data)
+                self.bytes_written += size
+                return
+
+        self.write_buffer[self.write_fill:self.write_fill + size] = data
+        self.write_fill += size
+        self.bytes_written += size
+
+    def _flush_write_buffer(self):
+        if self.write_fill > 0:
+            self.logger.trace('Writing %d bytes.' % self.write_fill)
+            with memoryview(self.write_buffer) as write_view:
+                self.bin_file.write(write_view[:self.write_fill])
+            self.write_fill = 0
+
+    def _write_spilled_entries(self, spill_file, spill_entries):
+        self.logger.debug('Writing %d spilled bytes.' % spill_file.tell())
+        spill_file.seek(0)
+        if self.segmented:
+            self._write_entries((spill_file.read(size), *details) for size, *details in spill_entries)
+        else:
+            self._flush_write_buffer()
+            shutil.copyfileobj(spill_file, self.bin_file, 1024 * 1024)
+            for size, timestamp, host_time_ns, messages in spill_entries:
+                offset = self.bytes_written
+                self.bytes_written += size
+                self._log_timestamp(timestamp)
+                if self.index_writer is not None:
+                    self._log_index(host_time_ns, offset, size, messages)
+        spill_file.close()
+
+    def _log_timestamp(self, timestamp):
+        if self.timestamp_file is not None and timestamp - self.last_timestamp > 0.001:
+            # This will rollover after about about 50 days.
+            milliseconds = int(round((timestamp - self.start_time) * 1000.)) % 2**32
+            # This will rollover after about about 26 hours of full rate 460800 baud data.
+            offset = (self.bytes_written - self.segment_start_offset) % 2**32
+            self.timestamp_file.write(struct.pack('II', milliseconds, offset))
+            self.last_timestamp = timestamp
+
+    def _log_index(self, host_time_ns, offset, size, messages):
+        self.index_writer.write(host_time_ns, offset, IndexRecordType.DATA, size=size)
+        if messages is not None and self.index_messages:
+            for message in messages:
+                # Messages that started before the beginning of the log are not indexed.
+                message_offset = offset + message.offset
+                if message_offset >= 0:
+                    self.index_writer.write(host_time_ns, message_offset, message.record_type, message.message_id,
+                                            message.size, message.gps_time_sec)
 
     def update_manifest(self, items):
         path = os.path.join(self.log_dir, LogManifest.MANIFEST_FILENAME)
-        LogManifest.update_items_in_file(path, items)
+        with self.manifest_lock:
+            LogManifest.update_items_in_file(path, items)
 
     def _create_manifest(self):
         manifest = LogManifest()
@@ -161,7 +550,10 @@ class LogManager(threading.Thread):
         manifest.device_id = self.device_id
         manifest.device_type = 'lg69t'
 
-        manifest.channels.append(self.data_filename)
+        if not self.segmented:
+            manifest.channels.append(self.data_filename)
+        if self.log_index:
+            manifest.channels.append(self.data_filename + LogIndexWriter.FILE_EXTENSION)
         manifest.channels.extend(self.files)
         manifest.channels.sort()
 
@@ -28,6 +28,12 @@ class LogManifest(object):
         self.sw_version = None
 
         self.channels = []
+        # If the data log is split into multiple segments, a list of dictionaries containing the `filename`, starting
+        # byte `start_offset` (across all segments), and host `start_time` (POSIX seconds) of each segment.
+        self.segments = []
+
+        self.log_bytes_dropped = None
+        self.log_bytes_spilled = None
 
     def to_json(self, pretty=True):
         data = copy.deepcopy(self.__dict__)
@@ -82,6 +88,10 @@ class LogManifest(object):
         result.sw_version = data.get('sw_version', None)
 
         result.channels = data.get('channels', [])
+        result.segments = data.get('segments', [])
+
+        result.log_bytes_dropped = data.get('log_bytes_dropped', None)
+        result.log_bytes_spilled = data.get('log_bytes_spilled', None)
 
         return result
 
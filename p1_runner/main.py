@@ -1,3 +1,5 @@
+import inspect
+import json
 import logging
 import os
 import signal
@@ -9,9 +11,75 @@ from fusion_engine_client.utils.log import DEFAULT_LOG_BASE_DIR
 
 from . import trace
 from .argument_parser import ArgumentParser, ExtendedBooleanAction
+from .async_runner import AsyncP1Runner
+from .corrections_writer import CorrectionsWriter
+from .device_reader import DeviceReader
+from .log_manager import LogManager
+from .multi_runner import MultiDeviceRunner
+from .output_server import OutputServer
+from .replay import parse_replay_speed
 from .runner import P1Runner
 
 
+def parse_output_address(spec):
+    """!
+    @brief Parse an `[ADDRESS:]PORT[:TYPE]` output specification.
+
+    @return An `(address, port, output_type)` tuple. `output_type` is `None` if not specified.
+    """
+    parts = spec.split(':')
+    if len(parts) > 1 and not parts[-1].isdigit():
+        output_type = parts.pop()
+        if output_type not in P1Runner.OUTPUT_TYPES:
+            raise ValueError("Unrecognized output type '%s'." % output_type)
+    else:
+        output_type = None
+
+    if len(parts) == 2:
+        return parts[0], int(parts[1]), output_type
+    elif len(parts) == 1:
+        return '', int(parts[0]), output_type
+    else:
+        raise ValueError("Invalid output address '%s'." % spec)
+
+
+def load_device_configs(options):
+    """!
+    @brief Get the settings for each device in multi-device mode (`--device-config` and `--device`).
+
+    @return A list of `dict`, each containing @ref P1Runner arguments that override the command-line settings for a
+            single device, or `None` if multi-device mode is not enabled.
+    """
+    device_configs = []
+    if options.device_config is not None:
+        with open(options.device_config, 'r') as f:
+            contents = json.load(f)
+        if isinstance(contents, dict):
+            contents = contents.get('devices', [])
+
+        runner_args = inspect.signature(P1Runner.__init__).parameters
+        for entry in contents:
+            config = {}
+            for key, value in entry.items():
+                # Output addresses may be specified as [ADDRESS:]PORT[:TYPE] strings, similar to --tcp/--websocket.
+                if key in ('tcp', 'websocket'):
+                    config['output_%s_address' % key] = [parse_output_address(str(a)) for a in value]
+                elif key in runner_args and key != 'self':
+                    config[key] = value
+                else:
+                    raise ValueError("Unrecognized device setting '%s' in '%s'." % (key, options.device_config))
+            device_configs.append(config)
+
+    for spec in (options.device or []):
+        parts = spec.split(',')
+        config = {'device_port': parts[0]}
+        if len(parts) > 1:
+            config['device_id'] = parts[1]
+        device_configs.append(config)
+
+    return device_configs if len(device_configs) > 0 else None
+
+
 def main():
     # Parse command line arguments.
     if getattr(sys, 'frozen', False):
@@ -47,6 +115,10 @@ Note: When generating Point One data logs, you are strongly encouraged to
 specify the --device-id argument and assign the device a unique name. This ID
 is used by Point One to identify your device when looking at a data log.
 
+Incoming corrections may also be re-served to other vehicles on the same site
+using a local NTRIP caster (--ntrip-caster), so only one connection to the
+corrections service is required.
+
 TCP/WEBSOCKET OUTPUT
 
 Lastly, this tool can be configured to relay incoming sensor data and NMEA
@@ -67,9 +139,53 @@ Connect to an NTRIP corrections service:
   python3 -m p1_runner \
       --ntrip example-service.com:2101,CORRECTIONS,USERNAME,PASSWORD
 
+Connect to Polaris, and re-serve the corrections to other vehicles from a local
+NTRIP caster on port 2101 (mountpoint POLARIS):
+
+  python3 -m p1_runner --polaris PASSWORD --ntrip-caster 2101
+
 Forward NMEA output from the receiver to an application on TCP port 1234:
 
   python3 -m p1_runner --tcp 1234
+
+Forward all incoming data to a recorder on TCP port 30200, and NMEA output to
+a display on TCP port 30201:
+
+  python3 -m p1_runner --tcp 30200:all --tcp 30201:nmea
+
+Regenerate a .p1log file from an existing log, processing the data as fast as
+possible and reporting the throughput:
+
+  python3 -m p1_runner --replay path/to/log/input.raw --replay-speed max \
+      --log-format p1log
+
+Log data from 3 devices, sharing a single Polaris connection. Device output is
+available on TCP ports 30200, 30201, and 30202 respectively:
+
+  python3 -m p1_runner --polaris PASSWORD --tcp 30200 \
+      --device /dev/ttyUSB0,rig-1 --device /dev/ttyUSB3,rig-2 \
+      --device /dev/ttyUSB6,rig-3
+
+MULTIPLE DEVICES
+
+Multiple devices may be run within a single process using --device or
+--device-config. Each device is recorded in its own log, but all devices share
+a single NTRIP corrections connection. Device settings not specified in the
+configuration file are taken from the command line. Output ports specified on
+the command line are offset by the device index.
+
+A configuration file contains a list of devices. Each entry may contain any of
+the following settings: device_id, device_port, device_baudrate,
+corrections_port, corrections_baudrate, reset_type, tcp, websocket,
+output_type, external_port, external_output_path, external_corrections, etc.
+For example:
+
+  {
+    "devices": [
+      {"device_id": "rig-1", "device_port": "/dev/ttyUSB0", "tcp": ["30200"]},
+      {"device_id": "rig-2", "device_port": "/dev/ttyUSB3", "tcp": ["30210"]}
+    ]
+  }
     """)
 
     parser.add_argument('-v', '--verbose', action='count', default=0,
@@ -89,9 +205,41 @@ Forward NMEA output from the receiver to an application on TCP port 1234:
         help="The serial port on which sensor data and solution output is being sent from the device to the host "
              "computer. If 'auto', the serial port will be located automatically by searching for a connected device.")
 
+    device_group.add_argument(
+        '--device', metavar="PORT[,DEVICE_ID]", action='append',
+        help="Run multiple devices within a single process. Specify once for each device. If DEVICE_ID is omitted, "
+             "it will be set to '<--device-id>-<N>'. Overrides --device-port. See MULTIPLE DEVICES below.")
+    device_group.add_argument(
+        '--device-config', metavar="PATH",
+        help="A JSON file containing settings for multiple devices to be run within a single process. See MULTIPLE "
+             "DEVICES below.")
+    device_group.add_argument(
+        '--replay', metavar="PATH",
+        help="Process data from a recorded log file (e.g., input.raw) instead of a connected device, and exit when "
+             "done. The data is logged and sent to output clients exactly as if it was received from a device, which "
+             "may be used to regenerate outputs from an existing log or to benchmark data processing. The replay "
+             "throughput is reported on completion. See --replay-speed.")
+    device_group.add_argument(
+        '--replay-speed', metavar='SPEED', type=parse_replay_speed, default='realtime',
+        help="The speed at which to replay data (--replay). Data is paced using the original receive times stored in "
+             "the log index (--log-index) or timestamp file (--log-timestamps), if present:\n"
+             "- realtime - Replay data at the rate it was originally received (default)\n"
+             "- N or Nx - Replay data at N times real time (e.g., 4x)\n"
+             "- max - Replay data as fast as possible")
+
     device_group.add_argument(
         '--device-baud', type=int, default=460800,
         help="The baud rate used by the device serial port (--device-port).")
+    device_group.add_argument(
+        '--device-read-buffer-size', metavar="BYTES", type=int, default=DeviceReader.DEFAULT_BUFFER_SIZE_BYTES,
+        help="The size of the buffer used to store incoming device data while it is waiting to be processed. Data is "
+             "read from the device on a separate thread. Set to 0 to read and process data on the same thread.")
+    device_group.add_argument(
+        '--event-loop', action=ExtendedBooleanAction,
+        help="If true, read data from the device and run all network I/O (NTRIP, TCP/websocket output, reference "
+             "device) in a single asyncio event loop instead of separate threads, reducing the latency between "
+             "receiving data from the device and forwarding it to output clients. Not supported on Windows. "
+             "--device-read-buffer-size is ignored when enabled.")
 
     device_group.add_argument(
         '--corrections-port', default=None,
@@ -101,6 +249,15 @@ Forward NMEA output from the receiver to an application on TCP port 1234:
     device_group.add_argument(
         '--corrections-baud', type=int, default=460800,
         help="The baud rate used by the corrections serial port (--corrections-port).")
+    device_group.add_argument(
+        '--corrections-max-queue-size', metavar="BYTES", type=int, default=CorrectionsWriter.DEFAULT_MAX_QUEUE_BYTES,
+        help="The maximum amount of corrections data that may be waiting to be sent to the device. If the serial "
+             "port cannot keep up, the oldest pending data will be discarded.")
+    device_group.add_argument(
+        '--frame-corrections', action=ExtendedBooleanAction,
+        help="If true, parse incoming corrections data as RTCM 3 and only send complete, CRC-valid messages to the "
+             "device. Statistics for each RTCM message type (count, rate, age) will be printed with the status "
+             "updates when verbose output is enabled. Non-RTCM corrections data will be discarded.")
 
     device_group.add_argument(
         '--reset-type', choices=('hot', 'warm', 'cold', 'none'), default='hot',
@@ -137,6 +294,18 @@ Forward NMEA output from the receiver to an application on TCP port 1234:
              "--ntrip and --ntrip-tls will be ignored if --polaris is specified. If username is omitted, it will be "
              "set to the device ID (--device-id).")
 
+    corr_sel_group.add_argument(
+        '--corrections-replay', metavar='PATH',
+        help="Replay corrections data from the specified file instead of connecting to an NTRIP server. Corrections "
+             "recorded using --log-corrections will be replayed using their original receive times "
+             "(see --corrections-replay-speed).")
+    corr_group.add_argument(
+        '--corrections-replay-speed', metavar='SPEED', type=parse_replay_speed, default='realtime',
+        help="The speed at which to replay corrections data (--corrections-replay):\n"
+             "- realtime - Replay data at the rate it was originally received (default)\n"
+             "- N or Nx - Replay data at N times real time (e.g., 4x)\n"
+             "- max - Replay data as fast as possible")
+
     corr_group.add_argument(
         '--polaris-tls', action='store_true', default=True,
         help="Use TLS when connecting to the Polaris NTRIP service (default).")
@@ -144,6 +313,23 @@ Forward NMEA output from the receiver to an application on TCP port 1234:
         '--no-polaris-tls', action='store_false', dest='polaris_tls',
         help="Do not use TLS (i.e., use an unsecure connection) when connecting to the Polaris NTRIP service.")
 
+    corr_group.add_argument(
+        '--ntrip-caster', metavar='[ADDRESS:]PORT',
+        help="If specified, run a local NTRIP caster (v1 and v2) on the specified port, and re-serve incoming "
+             "corrections data (--ntrip/--polaris) to other NTRIP clients, e.g., other vehicles on the same site. In "
+             "multi-device mode, the caster is only enabled for the first device.")
+    corr_group.add_argument(
+        '--ntrip-caster-mountpoint', metavar='NAME',
+        help="The NTRIP caster mountpoint on which corrections data will be served. Defaults to the name of the "
+             "upstream mountpoint.")
+    corr_group.add_argument(
+        '--ntrip-caster-device-mountpoint', metavar='NAME',
+        help="If specified, serve RTCM messages output by the device (e.g., a base station) on the specified NTRIP "
+             "caster mountpoint.")
+    corr_group.add_argument(
+        '--ntrip-caster-auth', metavar='USERNAME,PASSWORD',
+        help="If specified, require NTRIP caster clients to authenticate with the specified username and password.")
+
     logging_group = parser.add_argument_group('Logging/Output')
 
     logging_group.add_argument(
@@ -187,21 +373,41 @@ Forward NMEA output from the receiver to an application on TCP port 1234:
         help='If true and JLinkGDBServer is running, close it when establishing a JLink RTT connection.')
 
     logging_group.add_argument(
-        '--output-type', metavar="MODE", choices=('all', 'fusion_engine', 'nmea', 'legacy_nmea'),
+        '--output-type', metavar="MODE", choices=P1Runner.OUTPUT_TYPES,
         default='fusion_engine',
-        help="The type of output to send to connected TCP/websocket clients:\n"
+        help="The type of output to send to connected TCP/websocket clients by default. Clients may request specific "
+             "message types instead when they connect, either by sending a request line over TCP (e.g., "
+             "'subscribe fusion_engine=PoseMessage nmea=GGA rate=10'), or in the websocket URL (e.g., "
+             "'ws://HOST:PORT/?fusion_engine=PoseMessage&rate=10'):\n"
              "- all - Interleaved FusionEngine, RTCM, and NMEA messages\n"
              "- fusion_engine - Point One FusionEngine messages\n"
              "- nmea - NMEA-0183 messages"
              "- legacy_nmea - NMEA-0183 messages preceded by a legacy websocket header\n")
     logging_group.add_argument(
-        '--tcp', metavar="[ADDRESS:]PORT",
-        help="Listen for TCP connections on the specified address and port, and forward all incoming sensor data and "
-             "NMEA output from the device to all clients.")
+        '--tcp', metavar="[ADDRESS:]PORT[:TYPE]", action='append',
+        help="Listen for TCP connections on the specified address and port, and forward output from the device to all "
+             "clients. If TYPE is specified, it overrides --output-type for this port. May be specified multiple "
+             "times, e.g., '--tcp 30200:all --tcp 30201:nmea'.")
+    logging_group.add_argument(
+        '--websocket', '--ws', metavar="[ADDRESS:]PORT[:TYPE]", action='append',
+        help="Listen for websocket connections on the specified address and port, and forward output from the device "
+             "to all clients. If TYPE is specified, it overrides --output-type for this port. May be specified "
+             "multiple times.")
+    logging_group.add_argument(
+        '--output-batch-interval', metavar="SEC", type=float,
+        help="If set, combine FusionEngine or NMEA messages into a single TCP write and websocket frame rather than "
+             "sending each message individually. Messages are sent at most once per interval. Set to 0 to combine all "
+             "messages received in each read from the device.")
     logging_group.add_argument(
-        '--websocket', '--ws', metavar="[ADDRESS:]PORT",
-        help="Listen for websocket connections on the specified address and port, and forward all incoming sensor data "
-             "and NMEA output from the device to all clients.")
+        '--output-max-queue-size', metavar="BYTES", type=int, default=OutputServer.DEFAULT_MAX_CLIENT_QUEUE_BYTES,
+        help="The maximum amount of data that may be waiting to be sent to each TCP or websocket client.")
+    logging_group.add_argument(
+        '--output-slow-client-policy', metavar="POLICY", choices=OutputServer.SLOW_CLIENT_POLICIES,
+        default='drop_oldest',
+        help="The action to take if a TCP or websocket client cannot keep up and exceeds --output-max-queue-size:\n"
+             "- drop_oldest - Discard the oldest pending data\n"
+             "- disconnect - Close the connection to the client\n"
+             "- coalesce - Discard all pending data and continue from the most recent data")
 
     logging_group.add_argument(
         '--log-created-cmd', metavar="CMD",
@@ -210,6 +416,43 @@ Forward NMEA output from the receiver to an application on TCP port 1234:
     logging_group.add_argument(
         '--log-timestamps', action='store_true',
         help="Generate an \"input.timestamps\" file with a mapping of the run time to a byte offsets in the data log.")
+    logging_group.add_argument(
+        '--log-index', metavar="MODE", choices=('none', 'data', 'messages'), default='none',
+        help="Generate an \"input.*.index\" file mapping host time (64-bit monotonic nanoseconds) to 64-bit byte "
+             "offsets in the data log, which may be used to seek within the log by host or GPS time:\n"
+             "- none - Do not generate an index file\n"
+             "- data - Record the host time and offset of each block of data received from the device\n"
+             "- messages - Also record the offset and type of each FusionEngine, RTCM, and NMEA message")
+    logging_group.add_argument(
+        '--log-corrections', action=ExtendedBooleanAction,
+        help="Record incoming corrections data (--ntrip/--polaris) in a \"corrections.rtcm\" file in the log "
+             "directory, along with the time at which each block of data was received. The recorded data may be "
+             "replayed later using --corrections-replay.")
+    logging_group.add_argument(
+        '--log-flush-size', metavar="BYTES", type=int, default=LogManager.DEFAULT_FLUSH_SIZE_BYTES,
+        help="Buffer incoming data and write it to the log file in blocks of up to the specified size.")
+    logging_group.add_argument(
+        '--log-flush-interval', metavar="SEC", type=float, default=LogManager.DEFAULT_FLUSH_INTERVAL_SEC,
+        help="The maximum amount of time incoming data may be buffered before it is written to the log file.")
+    logging_group.add_argument(
+        '--log-max-queue-size', metavar="BYTES", type=int, default=LogManager.DEFAULT_MAX_QUEUE_BYTES,
+        help="The maximum amount of data that may be waiting to be written to disk if disk writes fall behind. Set to "
+             "0 to disable the limit.")
+    logging_group.add_argument(
+        '--log-queue-full-policy', metavar="POLICY", choices=LogManager.QUEUE_FULL_POLICIES, default='drop_oldest',
+        help="The action to take if the log write queue exceeds --log-max-queue-size:\n"
+             "- block - Stop reading from the device until the log catches up\n"
+             "- drop_oldest - Discard the oldest pending data\n"
+             "- spill - Store new data in a temporary file until the log catches up")
+    logging_group.add_argument(
+        '--log-segment-size', metavar="BYTES", type=int,
+        help="If set, split the recorded data into multiple files (input.raw.000, input.raw.001, etc.), starting a new "
+             "file after the specified number of bytes. New files are started at the next FusionEngine message "
+             "boundary, or after at most 1 MB if no FusionEngine data is received.")
+    logging_group.add_argument(
+        '--log-segment-duration', metavar="SEC", type=float,
+        help="If set, split the recorded data into multiple files, starting a new file after the specified amount of "
+             "time. May be combined with --log-segment-size.")
 
     ref_group = parser.add_argument_group('Reference FusionEngine Device')
     ref_group.add_argument(
@@ -295,23 +538,8 @@ Forward NMEA output from the receiver to an application on TCP port 1234:
         logging.getLogger('point_one.fusion_engine').setLevel(logging.TRACE)
 
     # Configure TCP/websocket output.
-    if options.tcp is not None:
-        parts = options.tcp.split(':')
-        if len(parts) == 2:
-            output_tcp_address = (parts[0], int(parts[1]))
-        else:
-            output_tcp_address = ('', int(parts[0]))
-    else:
-        output_tcp_address = None
-
-    if options.websocket is not None:
-        parts = options.websocket.split(':')
-        if len(parts) == 2:
-            output_websocket_address = (parts[0], int(parts[1]))
-        else:
-            output_websocket_address = ('', int(parts[0]))
-    else:
-        output_websocket_address = None
+    output_tcp_address = [parse_output_address(a) for a in (options.tcp or [])]
+    output_websocket_address = [parse_output_address(a) for a in (options.websocket or [])]
 
     # Configure reference input.
     if options.reference is not None:
@@ -336,19 +564,84 @@ Forward NMEA output from the receiver to an application on TCP port 1234:
 
     logger = logging.getLogger('point_one.p1_runner.__main__')
 
-    runner = P1Runner(device_id=device_id, reset_type=options.reset_type,
-                      device_port=options.device_port, device_baudrate=options.device_baud,
-                      corrections_port=options.corrections_port, corrections_baudrate=options.corrections_baud,
-                      external_port=options.external_port, external_baudrate=options.external_baud,
-                      external_output_path=options.external_output_path,
-                      external_corrections=options.external_corrections,
-                      logs_base_dir=options.logs_base_dir, log_format=options.log_format,
-                      log_created_cmd=options.log_created_cmd, log_timestamps=options.log_timestamps,
-                      output_tcp_address=output_tcp_address, output_websocket_address=output_websocket_address,
-                      output_type=options.output_type,
-                      reference_tcp_address=reference_tcp_address, reference_format=options.reference_format,
-                      rtt_mode=options.rtt_mode, rtt_port=options.rtt_port,
-                      rtt_kill_gdbserver=options.rtt_kill_gdbserver)
+    # Configure the local NTRIP caster.
+    if options.ntrip_caster is not None:
+        ntrip_caster_address = parse_output_address(options.ntrip_caster)[:2]
+        if options.ntrip_caster_auth is not None:
+            parts = options.ntrip_caster_auth.split(',')
+            if len(parts) != 2:
+                logger.error('You must specify a valid username and password for the NTRIP caster.')
+                sys.exit(1)
+            ntrip_caster_username, ntrip_caster_password = parts
+        else:
+            ntrip_caster_username = None
+            ntrip_caster_password = None
+    else:
+        ntrip_caster_address = None
+        ntrip_caster_username = None
+        ntrip_caster_password = None
+
+    runner_kwargs = dict(device_id=device_id, reset_type=options.reset_type,
+                         device_port=options.device_port, device_baudrate=options.device_baud,
+                         device_read_buffer_bytes=options.device_read_buffer_size,
+                         replay_path=options.replay, replay_speed=options.replay_speed,
+                         corrections_port=options.corrections_port, corrections_baudrate=options.corrections_baud,
+                         corrections_max_queue_bytes=options.corrections_max_queue_size,
+                         frame_corrections=options.frame_corrections,
+                         external_port=options.external_port, external_baudrate=options.external_baud,
+                         external_output_path=options.external_output_path,
+                         external_corrections=options.external_corrections,
+                         logs_base_dir=options.logs_base_dir, log_format=options.log_format,
+                         log_created_cmd=options.log_created_cmd, log_timestamps=options.log_timestamps,
+                         log_flush_size_bytes=options.log_flush_size, log_flush_interval_sec=options.log_flush_interval,
+                         log_max_queue_bytes=options.log_max_queue_size if options.log_max_queue_size > 0 else None,
+                         log_queue_full_policy=options.log_queue_full_policy,
+                         log_segment_size_bytes=options.log_segment_size,
+                         log_segment_duration_sec=options.log_segment_duration,
+                         log_index=options.log_index, log_corrections=options.log_corrections,
+                         output_tcp_address=output_tcp_address, output_websocket_address=output_websocket_address,
+                         output_type=options.output_type,
+                         output_max_client_queue_bytes=options.output_max_queue_size,
+                         output_slow_client_policy=options.output_slow_client_policy,
+                         output_batch_interval_sec=options.output_batch_interval,
+                         ntrip_caster_address=ntrip_caster_address,
+                         ntrip_caster_mountpoint=options.ntrip_caster_mountpoint,
+                         ntrip_caster_device_mountpoint=options.ntrip_caster_device_mountpoint,
+                         ntrip_caster_username=ntrip_caster_username, ntrip_caster_password=ntrip_caster_password,
+                         reference_tcp_address=reference_tcp_address, reference_format=options.reference_format,
+                         rtt_mode=options.rtt_mode, rtt_port=options.rtt_port,
+                         rtt_kill_gdbserver=options.rtt_kill_gdbserver)
+
+    runner_cls = AsyncP1Runner if options.event_loop else P1Runner
+    device_configs = load_device_configs(options)
+    if device_configs is None:
+        runner = runner_cls(**runner_kwargs)
+    elif options.replay is not None:
+        logger.error('--replay cannot be used with multiple devices.')
+        sys.exit(1)
+    else:
+        # These options refer to a single physical device/connection, and cannot be shared by multiple devices.
+        if len(device_configs) > 1 and (options.external_port is not None or options.rtt_mode != 'none' or
+                                        reference_tcp_address is not None):
+            logger.error('--external-port, --rtt, and --reference cannot be used with multiple devices. Specify them '
+                         'for individual devices in --device-config instead.')
+            sys.exit(1)
+
+        # Create a separate runner for each device. Settings from the command line apply to all devices unless
+        # overridden by the device configuration.
+        runners = []
+        for i, device_config in enumerate(device_configs):
+            kwargs = dict(runner_kwargs)
+            kwargs['device_id'] = '%s-%d' % (device_id, i + 1)
+            kwargs['output_tcp_address'] = [(a[0], a[1] + i if a[1] != 0 else 0, a[2]) for a in output_tcp_address]
+            kwargs['output_websocket_address'] = [(a[0], a[1] + i if a[1] != 0 else 0, a[2])
+                                                  for a in output_websocket_address]
+            # All devices share the same corrections stream, so it only needs to be served once.
+            if i > 0:
+                kwargs['ntrip_caster_address'] = None
+            kwargs.update(device_config)
+            runners.append(runner_cls(**kwargs))
+        runner = MultiDeviceRunner(runners)
 
     # Configure GNSS corrections (Polaris over NTRIP, or custom NTRIP server).
     if options.ntrip_position is not None:
@@ -414,6 +707,8 @@ Forward NMEA output from the receiver to an application on TCP port 1234:
             url = '%s://%s' % (scheme, url)
         runner.connect_to_ntrip(url=url, mountpoint=mountpoint, username=username, password=password,
                                 version=ntrip_version)
+    elif options.corrections_replay is not None:
+        runner.replay_corrections(options.corrections_replay, speed=options.corrections_replay_speed)
 
     # Start the runner.
     logger.debug('Starting runner...')
@@ -429,7 +724,11 @@ Forward NMEA output from the receiver to an application on TCP port 1234:
     signal.signal(signal.SIGINT, signal_handler)
     signal.signal(signal.SIGTERM, signal_handler)
 
-    if os.name == 'nt':
+    if options.replay is not None:
+        # When replaying data, shut down automatically once all of the data has been processed.
+        while not shutdown.wait(0.1) and not runner.replay_complete.is_set():
+            pass
+    elif os.name == 'nt':
         # Normally, the signal handler gets called as soon as the user sends a SIGINT (hits Ctrl-C) and notifies the
         # shutdown event to wake up its wait() call. In Python 3 in Windows though, the signal handler will only get
         # called _after_ wait() returns, whether or not it's a blocking call. To get around this, we simply use a short
@@ -0,0 +1,178 @@
+import logging
+import threading
+
+from .corrections_framer import CorrectionsFramer
+from .ntrip_client import NTRIPClient
+from .replay import CorrectionsReplay
+
+
+class MultiDeviceRunner(object):
+    """!
+    @brief Run multiple devices in a single process, sharing a single NTRIP corrections stream.
+
+    Each device is handled by its own @ref P1Runner, with its own serial port, log, and output servers. Incoming
+    corrections data from the NTRIP server is sent to all devices. Only the first device forwards its position to the
+    NTRIP server. If corrections framing is enabled, the data is framed once and the framed data is sent to each
+    device that requested it.
+
+    Instead of each device printing its own status, a combined status update is printed periodically.
+    """
+    logger = logging.getLogger('point_one.p1_runner.multi_runner')
+
+    STATUS_INTERVAL_SEC = 5.0
+
+    def __init__(self, runners):
+        """!
+        @brief Create a multi-device runner.
+
+        @param runners A list of @ref P1Runner instances, one per device. Each runner should use a unique device ID.
+        """
+        if len(runners) == 0:
+            raise ValueError('No devices specified.')
+
+        device_ids = [r.device_id for r in runners]
+        if len(set(device_ids)) != len(device_ids):
+            raise ValueError('Device IDs must be unique. [ids=%s]' % ', '.join(device_ids))
+
+        self.runners = runners
+        for runner in self.runners:
+            # Label log messages from each runner with its device ID, and disable the individual status updates.
+            runner.logger = runner.logger.getChild(runner.device_id)
+            runner.status_interval_sec = None
+
+        self.ntrip_client = None
+
+        # All devices receive the same corrections data, so frame it once for all devices that request framing.
+        if any(runner.corrections_framer is not None for runner in self.runners):
+            self.corrections_framer = CorrectionsFramer()
+            for runner in self.runners:
+                runner.set_shared_corrections_framer(self.corrections_framer)
+        else:
+            self.corrections_framer = None
+
+        self.status_thread = None
+        self.shutdown_pending = threading.Event()
+
+    def connect_to_ntrip(self, url=None, mountpoint=None, username=None, password=None, version=2):
+        self.logger.debug('Configuring shared NTRIP corrections stream for %d devices. [url=%s, ntrip_version=%d, '
+                          'mountpoint=%s]' % (len(self.runners), url, version, mountpoint))
+        self._set_ntrip_client(NTRIPClient(url=url, mountpoint=mountpoint, username=username, password=password,
+                                           data_callback=self._on_corrections, version=version))
+
+    def replay_corrections(self, path, speed=1.0):
+        """!
+        @brief Send recorded corrections data to all devices instead of connecting to an NTRIP server.
+
+        See @ref P1Runner.replay_corrections().
+        """
+        self.logger.debug("Configuring shared corrections replay for %d devices. [path='%s', speed=%s]" %
+                          (len(self.runners), path, speed))
+        self._set_ntrip_client(CorrectionsReplay(path, data_callback=self._on_corrections, speed=speed))
+
+    def _set_ntrip_client(self, ntrip_client):
+        if self.ntrip_client is not None:
+            self.ntrip_client.stop()
+            self.ntrip_client.join()
+
+        self.ntrip_client = ntrip_client
+        for i, runner in enumerate(self.runners):
+            runner.set_shared_ntrip_client(self.ntrip_client, forward_position=(i == 0))
+
+        if self.status_thread is not None:
+            self.ntrip_client.start()
+
+    def set_ntrip_position_override(self, lla_deg):
+        self.runners[0].set_ntrip_position_override(lla_deg)
+
+    def start(self):
+        self.logger.info('Starting %d devices.' % len(self.runners))
+        if self.corrections_framer is not None:
+            self.corrections_framer.reset()
+        for runner in self.runners:
+            runner.start()
+
+        if self.ntrip_client is not None:
+            self.logger.debug('Starting shared NTRIP corrections stream.')
+            self.ntrip_client.start()
+
+        self.shutdown_pending.clear()
+        self.status_thread = threading.Thread(name='multi_device_status', target=self._run_status)
+        self.status_thread.start()
+
+    def stop(self):
+        self.logger.debug('Shutting down %d devices.' % len(self.runners))
+        self.shutdown_pending.set()
+
+        # Stop the corrections stream first so we do not send data to devices that are shutting down.
+        if self.ntrip_client is not None:
+            self.ntrip_client.stop()
+
+        for runner in self.runners:
+            runner.stop()
+
+    def join(self, timeout=None):
+        if self.ntrip_client is not None:
+            self.ntrip_client.join(timeout)
+        for runner in self.runners:
+            runner.join(timeout)
+        if self.status_thread is not None:
+            self.status_thread.join(timeout)
+
+    def get_stats(self):
+        """!
+        @brief Get the combined statistics for all devices.
+
+        @return A tuple containing a `dict` with the totals across all devices (or the maximum value for latency
+                statistics), and a list containing the statistics for each device (see @ref P1Runner.get_stats()).
+        """
+        device_stats = [runner.get_stats() for runner in self.runners]
+        totals = {}
+        for stats in device_stats:
+            for key, value in stats.items():
+                if key == 'device_id':
+                    continue
+                elif key.endswith('_sec'):
+                    totals[key] = max(totals.get(key, 0.0), value)
+                else:
+                    totals[key] = totals.get(key, 0) + value
+
+        # Invalid corrections data is discarded once by the shared framer, not once per device.
+        if self.corrections_framer is not None:
+            totals['corrections_discarded_bytes'] = self.corrections_framer.bytes_discarded
+        return totals, device_stats
+
+    def _on_corrections(self, data):
+        framed_data = self.corrections_framer.on_data(data) if self.corrections_framer is not None else None
+        for runner in self.runners:
+            runner.send_corrections(data, framed_data=framed_data)
+
+    def _run_status(self):
+        prev_bytes_received = {}
+        while not self.shutdown_pending.wait(self.STATUS_INTERVAL_SEC):
+            totals, device_stats = self.get_stats()
+
+            # Note: A device is considered active if it received data since the last update.
+            inactive = [s['device_id'] for s in device_stats
+                        if s['bytes_received'] == prev_bytes_received.get(s['device_id'], 0)]
+            prev_bytes_received = {s['device_id']: s['bytes_received'] for s in device_stats}
+
+            status_str = ('%d/%d devices active. [total=%d B, # epochs=%d, fusion_engine=%d B, nmea=%d B, '
+                          'corrections=%d B' %
+                          (len(device_stats) - len(inactive), len(device_stats), totals['bytes_received'],
+                           totals['epochs'], totals['fe_bytes'], totals['nmea_bytes'], totals['corrections_bytes']))
+            for key in ('log_dropped_bytes', 'rx_overrun_bytes', 'output_dropped_bytes', 'corrections_dropped_bytes',
+                        'corrections_discarded_bytes'):
+                if totals[key] > 0:
+                    status_str += ', %s=%d B' % (key[:-len('_bytes')], totals[key])
+            self.logger.info(status_str + ']')
+
+            if len(inactive) > 0:
+                self.logger.warning('No data received from: %s' % ', '.join(inactive))
+
+            for stats in device_stats:
+                self.logger.debug('  %s: %d B received, %d epochs, %d B corrections' %
+                                  (stats['device_id'], stats['bytes_received'], stats['epochs'],
+                                   stats['corrections_bytes']))
+
+            if self.corrections_framer is not None:
+                self.logger.debug('RTCM corrections: %s' % self.corrections_framer.format_message_stats())
@@ -1,6 +1,4 @@
-from enum import IntEnum
 import logging
-import re
 
 from . import trace
 
@@ -9,129 +7,221 @@ class NMEAFramer(object):
     # A NMEA payload may contain any displayable ASCII character except $ and *, which are used to denote the start
     # and end of a message, respectively. This corresponds with all ASCII characters from 0x20-0x7E, excluding 0x24
     # and 0x2A.
-    VALID_NMEA_CONTENTS = re.compile(r'^[\x20-\x23\x25-\x29\x2B-\x7E]+$')
+    #
+    # Candidate contents are validated using bytes.translate(): deleting all valid characters from a valid payload
+    # leaves an empty string.
+    VALID_NMEA_CONTENTS = bytes(c for c in range(0x20, 0x7F) if c not in b'$*')
+
+    # NMEA-0183 limits sentences to 82 characters, including the leading $ and trailing \r\n. We allow additional
+    # headroom for proprietary sentences, which may exceed the standard limit.
+    DEFAULT_MAX_LINE_LENGTH = 256
 
     logger = logging.getLogger('point_one.nmea_framer')
 
-    def __init__(self, return_offset=False):
-        self.buffer = ''
+    def __init__(self, return_offset=False, max_line_length=DEFAULT_MAX_LINE_LENGTH):
+        # Incomplete data carried over between on_data() calls. When not empty, the first byte is always a $.
+        self.buffer = bytearray()
+        # The absolute stream offset of buffer[0].
+        self.buffer_offset = 0
         self.callback = None
         self.return_offset = return_offset
-        self.next_msg_start_offset = 0
+
+        # The maximum allowed length of a sentence, from $ through \n. Longer candidates are discarded, and an
+        # incomplete candidate exceeding this length is dropped from the buffer without waiting for a \n, so the
+        # buffer size is bounded regardless of how much non-NMEA data is received. Set to None to disable.
+        self.max_line_length = max_line_length
+
+        # The number of bytes discarded because they were not part of a valid NMEA sentence: any data between
+        # sentences (including non-NMEA data such as binary messages in a mixed stream), and invalid, corrupted, or
+        # overlong candidates. Data still in the buffer, or discarded by reset(), is not counted.
+        self.bytes_dropped = 0
 
     def set_callback(self, callback):
         self.callback = callback
 
     def reset(self):
-        self.buffer = ''
+        self.buffer_offset += len(self.buffer)
+        self.buffer = bytearray()
 
     def on_data(self, data):
-        if isinstance(data, bytes):
-            data = data.decode('latin-1')
-
-        self.logger.trace('Received %d bytes. [%s]' % (len(data), str(data.encode('latin-1'))))
+        if isinstance(data, str):
+            data = data.encode('latin-1')
 
-        buffer = self.buffer + data
-        candidates = buffer.split('\n')
-        self.buffer = candidates[-1]
-        candidates = candidates[:-1]
+        debug_enabled = self.logger.isEnabledFor(logging.DEBUG)
+        if self.logger.isEnabledFor(logging.TRACE):
+            self.logger.trace('Received %d bytes. [%s]' % (len(data), str(data)))
 
-        if len(candidates) > 0:
-            self.logger.debug('Processing %d candidate messages.' % len(candidates))
+        buffer = self.buffer
+        # The existing buffer contents never contain a \n, so we only need to search the new data.
+        search_start = len(buffer)
+        buffer += data
 
         messages = []
-        for i, candidate in enumerate(candidates):
+        message_bytes = 0
+        line_start = 0
+        i = 0
+        while True:
+            line_end = buffer.find(b'\n', search_start)
+            if line_end < 0:
+                break
+            search_start = line_end + 1
+
             # Search for the start of a NMEA string, ignoring any content before it. Since we know each candidate string
             # begin after a \n, any characters before the $ can't possibly be a valid NMEA string:
             #   $bogus$GPGGA...*XX\r\n
             #         ^-- Try to find this
-            start_idx = candidate.rfind('$')
-            msg_start_offset = self.next_msg_start_offset + start_idx
-            self.next_msg_start_offset += len(candidate) + 1
+            start_idx = buffer.rfind(b'$', line_start, line_end)
+            candidate_start = line_start
+            line_start = line_end + 1
             if start_idx < 0:
-                self.logger.debug('Sync byte not found. Discarding candidate %d. [size=%d B]' % (i, len(candidate)))
-                self.logger.trace(candidate.encode('latin-1'))
+                if debug_enabled:
+                    self.logger.debug('Sync byte not found. Discarding candidate %d. [size=%d B]' %
+                                      (i, line_end - candidate_start))
+                i += 1
                 continue
 
-            nmea_string = candidate[start_idx:] + '\n'
-            candidate = candidate[start_idx + 1:]
-
-            self.logger.trace('Testing candidate %d: %s' % (i, nmea_string.encode('latin-1')))
+            if self.max_line_length is not None and line_end + 1 - start_idx > self.max_line_length:
+                if debug_enabled:
+                    self.logger.debug('Candidate exceeds maximum length. Discarding candidate %d. [size=%d B]' %
+                                      (i, line_end + 1 - start_idx))
+                i += 1
+                continue
 
-            # Strip off any trailing \r characters. Normally, a NMEA string should end in \r\n (\n already removed by
-            # split() above), but we have seen some cases (RTKLIB) where there are multiple consecutive \r characters so
-            # we ignore them all.
-            candidate = candidate.rstrip('\r')
+            message = self._validate_candidate(i, buffer[start_idx:line_end + 1], debug_enabled)
+            if message is not None:
+                message_bytes += len(message)
+                if self.return_offset:
+                    message = (message, self.buffer_offset + start_idx)
+                messages.append(message)
+                if self.callback is not None:
+                    self.callback(message)
+            i += 1
+
+        # Discard all processed data, as well as any incomplete data preceding the last $ since it cannot be part of a
+        # valid message.
+        keep_start = buffer.rfind(b'$', line_start)
+        if keep_start < 0:
+            keep_start = len(buffer)
+        elif self.max_line_length is not None and len(buffer) - keep_start >= self.max_line_length:
+            # The remaining candidate is already too long to be a valid sentence. Drop it and resync on the next $.
+            if debug_enabled:
+                self.logger.debug('Incomplete candidate exceeds maximum length. Dropping %d bytes.' %
+                                  (len(buffer) - keep_start))
+            keep_start = len(buffer)
+
+        # Everything removed from the buffer that was not returned as a valid sentence was discarded.
+        self.bytes_dropped += keep_start - message_bytes
+        if keep_start > 0:
+            del buffer[:keep_start]
+            self.buffer_offset += keep_start
+
+        if debug_enabled:
+            if i > 0:
+                self.logger.debug('Processed %d candidate messages.' % i)
+            self.logger.debug('%d bytes remaining in the buffer.' % len(buffer))
 
-            # The string must contain a talker ID + message ID (typically 5+ chars, but we'll allow as small as 1 char),
-            # plus a checksum (3 chars).
-            if len(candidate) < (1 + 3):
-                self.logger.debug('Candidate string too short. Discarding candidate %d. [size=%d B]' %
-                                  (i, len(nmea_string)))
-                continue
+        return messages
 
-            # Now that we've stripped off \r\n, the last 3 characters should be a checksum (*XX).
-            if candidate[-3] != '*':
-                self.logger.debug('Checksum not found. Discarding candidate %d. [size=%d B]' % (i, len(nmea_string)))
-                continue
+    def _validate_candidate(self, index, nmea_bytes, debug_enabled):
+        if debug_enabled:
+            self.logger.trace('Testing candidate %d: %s' % (index, bytes(nmea_bytes)))
 
-            # Pull out the NMEA message ID for the prints below.
-            id_end_idx = candidate.find(',')
-            if id_end_idx < 0:
-                id_end_idx = len(candidate) - 3
-            message_id = candidate[:id_end_idx]
+        # Strip off the leading $ and any trailing \r\n characters. Normally, a NMEA string should end in \r\n, but we
+        # have seen some cases (RTKLIB) where there are multiple consecutive \r characters so we ignore them all.
+        candidate = nmea_bytes[1:-1].rstrip(b'\r')
 
-            # Extract the checksum and convert to an integer.
-            try:
-                expected_checksum = int(candidate[-2:], 16)
-            except:
+        # The string must contain a talker ID + message ID (typically 5+ chars, but we'll allow as small as 1 char),
+        # plus a checksum (3 chars).
+        if len(candidate) < (1 + 3):
+            if debug_enabled:
+                self.logger.debug('Candidate string too short. Discarding candidate %d. [size=%d B]' %
+                                  (index, len(nmea_bytes)))
+            return None
+
+        # Now that we've stripped off \r\n, the last 3 characters should be a checksum (*XX).
+        if candidate[-3] != 0x2A:  # *
+            if debug_enabled:
+                self.logger.debug('Checksum not found. Discarding candidate %d. [size=%d B]' % (index, len(nmea_bytes)))
+            return None
+
+        # Extract the checksum and convert to an integer.
+        try:
+            expected_checksum = int(candidate[-2:], 16)
+        except ValueError:
+            if debug_enabled:
                 self.logger.debug('Checksum bytes not valid. Discarding candidate %d. [message=%s, size=%d B]' %
-                                  (i, message_id, len(nmea_string)))
-                continue
+                                  (index, self._get_message_id(candidate), len(nmea_bytes)))
+            return None
 
-            candidate = candidate[:-3]
+        contents = candidate[:-3]
 
-            # Next, if there are any non-ASCII characters in the string, it can't be a NMEA string.
-            if not re.match(self.VALID_NMEA_CONTENTS, candidate):
+        # Next, if there are any non-ASCII characters in the string, it can't be a NMEA string.
+        if len(contents) == 0 or len(contents.translate(None, self.VALID_NMEA_CONTENTS)) != 0:
+            if debug_enabled:
                 self.logger.debug('Found non-ASCII contents. Discarding candidate %d. [message=%s, size=%d B]' %
-                                  (i, message_id, len(nmea_string)))
-                continue
-
-            # Finally, validate the checksum.
-            calculated_checksum = self._calculate_checksum(candidate, is_stripped=True)
+                                  (index, self._get_message_id(candidate), len(nmea_bytes)))
+            return None
 
-            if expected_checksum == calculated_checksum:
+        # Finally, validate the checksum.
+        calculated_checksum = self._xor_bytes(contents)
+        if expected_checksum == calculated_checksum:
+            if debug_enabled:
                 self.logger.debug(
                     'Checksum passed. Dispatching message %d. [message=%s, size=%d B, checksum=0x%02X]' %
-                    (i, message_id, len(nmea_string), calculated_checksum))
-
-                if self.return_offset:
-                    nmea_msg = (nmea_string, msg_start_offset)
-                else:
-                    nmea_msg = nmea_string
-                messages.append(nmea_msg)
-                if self.callback is not None:
-                    self.callback(nmea_msg)
-            else:
+                    (index, self._get_message_id(candidate), len(nmea_bytes), calculated_checksum))
+            return nmea_bytes.decode('latin-1')
+        else:
+            if debug_enabled:
                 self.logger.debug('Checksum mismatch. Discarding candidate %d. [message=%s, size=%d B, '
                                   'checksum=0x%02X, expected_checksum=0x%02X]' %
-                                  (i, message_id, len(nmea_string), calculated_checksum, expected_checksum))
+                                  (index, self._get_message_id(candidate), len(nmea_bytes), calculated_checksum,
+                                   expected_checksum))
+            return None
 
-        self.logger.debug('%d bytes remaining in the buffer.' % len(self.buffer))
+    @classmethod
+    def get_sentence_id(cls, message):
+        """!
+        @brief Get the sentence ID of a NMEA message (e.g., `GGA` for `$GPGGA,...`).
+
+        For proprietary messages (`$P...`), the full address field is returned (e.g., `PQTMVER`).
+        """
+        id_end_idx = message.find(',')
+        if id_end_idx < 0:
+            id_end_idx = message.find('*')
+        address = message[1:id_end_idx]
+        return address if address.startswith('P') else address[2:]
 
-        return messages
+    @classmethod
+    def _get_message_id(cls, candidate):
+        # Pull out the NMEA message ID for debug prints.
+        id_end_idx = candidate.find(b',')
+        if id_end_idx < 0:
+            id_end_idx = len(candidate) - 3
+        return candidate[:id_end_idx].decode('latin-1')
+
+    @classmethod
+    def _xor_bytes(cls, data):
+        # XOR all bytes together by repeatedly folding the upper half of the data onto the lower half as a single
+        # integer, rather than iterating over the bytes one at a time.
+        value = int.from_bytes(data, 'little')
+        width_bytes = 1 << max(len(data) - 1, 0).bit_length()
+        while width_bytes > 1:
+            width_bytes >>= 1
+            shift = width_bytes * 8
+            value = (value >> shift) ^ (value & ((1 << shift) - 1))
+        return value
 
     @classmethod
     def _calculate_checksum(cls, data, is_stripped=False):
+        if isinstance(data, str):
+            data = data.encode('latin-1')
+
         if not is_stripped:
-            if data[0] == '$':
+            if data[:1] == b'$':
                 data = data[1:]
 
-            checksum_idx = data.rfind('*')
+            checksum_idx = data.rfind(b'*')
             if checksum_idx >= 0:
                 data = data[:checksum_idx]
 
-        checksum = 0
-        for c in data:
-            checksum ^= ord(c)
-        return checksum
+        return cls._xor_bytes(data)
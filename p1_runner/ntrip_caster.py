@@ -0,0 +1,354 @@
+import asyncio
+import base64
+import logging
+import threading
+import traceback
+
+from .output_server import ClientQueue, SLOW_CLIENT_POLICIES
+from . import trace
+
+
+class NTRIPCasterClient(ClientQueue):
+    """!
+    @brief An NTRIP client connected to an @ref NTRIPCaster, and its queue of pending corrections data.
+    """
+
+    def __init__(self, reader, writer, mountpoint, ntrip_version):
+        super().__init__()
+        self.reader = reader
+        self.writer = writer
+        self.address = writer.get_extra_info('peername')
+        self.mountpoint = mountpoint
+        self.ntrip_version = ntrip_version
+        self.data_ready = asyncio.Event()
+
+    def __str__(self):
+        return 'ntrip://%s:%d/%s' % (self.address[0], self.address[1], self.mountpoint)
+
+
+class NTRIPCaster(threading.Thread):
+    """!
+    @brief A local NTRIP caster, used to re-serve corrections data (e.g., from an upstream NTRIP server) to other NTRIP
+           clients.
+
+    The caster supports NTRIP v1 and v2 clients, and may serve multiple mountpoints. Data for each mountpoint is passed
+    to @ref send(), and is queued separately for each connected client. @ref send() never blocks on network I/O, and
+    may be called from any thread. If a client cannot keep up and its queue exceeds `max_client_queue_bytes`, the data
+    is handled according to `slow_client_policy` (see @ref OutputServer).
+
+    Incoming data from clients (e.g., GGA position updates) is ignored.
+    """
+    logger = logging.getLogger('point_one.p1_runner.ntrip_caster')
+
+    DEFAULT_MAX_CLIENT_QUEUE_BYTES = 256 * 1024
+    SLOW_CLIENT_POLICIES = SLOW_CLIENT_POLICIES
+
+    # The maximum amount of queued data to combine into a single write (or NTRIP v2 chunk).
+    MAX_SEND_SIZE_BYTES = 64 * 1024
+
+    # The maximum size of an incoming request header, and the maximum amount of time to wait for it.
+    MAX_REQUEST_SIZE_BYTES = 4096
+    REQUEST_TIMEOUT_SEC = 5.0
+
+    SERVER_NAME = 'NTRIP p1_runner'
+
+    def __init__(self, address, username=None, password=None, max_client_queue_bytes=DEFAULT_MAX_CLIENT_QUEUE_BYTES,
+                 slow_client_policy='drop_oldest', event_loop=None):
+        """!
+        @brief Create a caster.
+
+        @param address The `(address, port)` on which to listen for NTRIP connections.
+        @param username If set, require clients to authenticate using the specified username and password.
+        @param password The password required to connect.
+        @param max_client_queue_bytes The maximum number of bytes to queue for each client.
+        @param slow_client_policy The action to take when a client queue is full.
+        @param event_loop If specified, run the caster in an existing event loop, owned by the caller, instead of on a
+               separate thread.
+        """
+        super().__init__(name='ntrip_caster')
+
+        if slow_client_policy not in self.SLOW_CLIENT_POLICIES:
+            raise ValueError("Unrecognized slow client policy '%s'." % slow_client_policy)
+
+        self.address = address
+        self.server = None
+        self.max_client_queue_bytes = max_client_queue_bytes
+        self.slow_client_policy = slow_client_policy
+
+        if username is not None:
+            credentials = '%s:%s' % (username, password if password is not None else '')
+            self.authorization = 'Basic ' + base64.b64encode(credentials.encode('utf-8')).decode('ascii')
+        else:
+            self.authorization = None
+
+        # Connected clients for each mountpoint.
+        self.mountpoints = {}
+
+        if event_loop is None:
+            self.event_loop = asyncio.new_event_loop()
+            self.external_event_loop = False
+        else:
+            self.event_loop = event_loop
+            self.external_event_loop = True
+
+        # Data passed to send(), waiting to be distributed to the client queues by the event loop. The loop is only
+        # woken once for each batch of pending data.
+        self.pending_lock = threading.Lock()
+        self.pending_data = []
+        self.dispatch_scheduled = False
+
+    def add_mountpoint(self, mountpoint):
+        """!
+        @brief Add a mountpoint to be served by this caster.
+
+        @param mountpoint The mountpoint name, without the leading `/`.
+        """
+        if mountpoint not in self.mountpoints:
+            self.logger.debug('Adding mountpoint %s.' % mountpoint)
+            self.mountpoints[mountpoint] = []
+
+    def has_clients(self, mountpoint=None):
+        """!
+        @brief Check if any clients are connected to the specified mountpoint, or to any mountpoint if `None`.
+        """
+        if mountpoint is None:
+            return any(len(clients) > 0 for clients in list(self.mountpoints.values()))
+        else:
+            return len(self.mountpoints.get(mountpoint, ())) > 0
+
+    def start(self):
+        # Start listening immediately so errors (e.g., port in use) are reported to the caller.
+        if self.event_loop.is_running():
+            asyncio.run_coroutine_threadsafe(self._open_server(), loop=self.event_loop).result()
+        else:
+            self.event_loop.run_until_complete(self._open_server())
+
+        if not self.external_event_loop:
+            super().start()
+
+    def stop(self):
+        # Note: When running in an external event loop, the event loop owner is responsible for running any pending
+        # shutdown tasks before closing the loop.
+        if self.server is not None:
+            self.event_loop.call_soon_threadsafe(self._close_server)
+            if not self.external_event_loop:
+                self.event_loop.call_soon_threadsafe(self.event_loop.stop)
+
+    def join(self, timeout=None):
+        if not self.external_event_loop and self.ident is not None:
+            super().join(timeout)
+
+    def run(self):
+        asyncio.set_event_loop(self.event_loop)
+        try:
+            self.event_loop.run_forever()
+
+            # Close any remaining client connections.
+            pending = asyncio.all_tasks(self.event_loop)
+            for task in pending:
+                task.cancel()
+            self.event_loop.run_until_complete(asyncio.gather(*pending, return_exceptions=True))
+        except Exception:
+            self.logger.error('Unexpected error running NTRIP caster:\r%s' % traceback.format_exc())
+        finally:
+            self.event_loop.close()
+
+    def send(self, mountpoint, data):
+        """!
+        @brief Send data to all clients connected to the specified mountpoint.
+
+        @param mountpoint The mountpoint name.
+        @param data The data to be sent.
+        """
+        if self.server is None or not self.has_clients(mountpoint):
+            return
+
+        # Copy mutable buffers since they will be sent later from the event loop thread.
+        if not isinstance(data, bytes):
+            data = bytes(data)
+
+        with self.pending_lock:
+            self.pending_data.append((mountpoint, data))
+            if self.dispatch_scheduled:
+                return
+            self.dispatch_scheduled = True
+        self.event_loop.call_soon_threadsafe(self._dispatch)
+
+    def get_client_stats(self):
+        """!
+        @brief Get the current send queue statistics for each connected client.
+        """
+        return [c.get_stats() for clients in list(self.mountpoints.values()) for c in list(clients)]
+
+    def get_source_table(self):
+        # See the NTRIP specification for a description of the STR record fields.
+        table = ''.join('STR;%s;%s;RTCM 3;;2;;;;0.00;0.00;0;0;p1_runner;none;%s;N;0;\r\n' %
+                        (mountpoint, mountpoint, 'B' if self.authorization is not None else 'N')
+                        for mountpoint in self.mountpoints)
+        return table + 'ENDSOURCETABLE\r\n'
+
+    def _dispatch(self):
+        with self.pending_lock:
+            pending_data = self.pending_data
+            self.pending_data = []
+            self.dispatch_scheduled = False
+
+        for mountpoint, data in pending_data:
+            for client in self.mountpoints.get(mountpoint, ()):
+                if client.disconnect_requested:
+                    continue
+                self.logger.trace('Queuing %d bytes for NTRIP client %s.' % (len(data), str(client)))
+                client.push((data,), self.max_client_queue_bytes, self.slow_client_policy, self.logger)
+                client.data_ready.set()
+
+    async def _open_server(self):
+        self.logger.debug('Listening for incoming NTRIP connections on ntrip://%s:%d. [mountpoints=%s]' %
+                          (self.address[0], self.address[1], ', '.join(self.mountpoints)))
+        self.server = await asyncio.start_server(self._handle_connection, host=self.address[0] or None,
+                                                 port=self.address[1])
+
+    def _close_server(self):
+        if self.server is not None:
+            self.logger.debug('Closing NTRIP caster.')
+            self.server.close()
+            self.server = None
+            for clients in self.mountpoints.values():
+                for client in clients:
+                    client.disconnect_requested = True
+                    client.data_ready.set()
+
+    async def _read_request(self, reader):
+        """!
+        @brief Read and parse an incoming request header.
+
+        @return A tuple containing the requested path, the NTRIP version (1 or 2), and a `dict` of request headers (with
+                lowercase names).
+        """
+        request = await asyncio.wait_for(reader.readuntil(b'\r\n\r\n'), timeout=self.REQUEST_TIMEOUT_SEC)
+        lines = request.decode('ISO-8859-1').split('\r\n')
+
+        parts = lines[0].split()
+        if len(parts) < 2 or parts[0] != 'GET':
+            raise ValueError('Unsupported request: %s' % repr(lines[0]))
+
+        headers = {}
+        for line in lines[1:]:
+            name, sep, value = line.partition(':')
+            if sep:
+                headers[name.strip().lower()] = value.strip()
+
+        ntrip_version = 2 if headers.get('ntrip-version', '').lower().startswith('ntrip/2') else 1
+        return parts[1].lstrip('/'), ntrip_version, headers
+
+    def _make_response(self, ntrip_version, status, headers=(), body=None):
+        if ntrip_version == 2:
+            response = 'HTTP/1.1 %s\r\nNtrip-Version: Ntrip/2.0\r\nServer: %s\r\n' % (status, self.SERVER_NAME)
+        elif status.startswith('200'):
+            response = 'ICY 200 OK\r\n' if body is None else 'SOURCETABLE 200 OK\r\nServer: %s\r\n' % self.SERVER_NAME
+        else:
+            response = 'HTTP/1.0 %s\r\n' % status
+
+        response += ''.join('%s: %s\r\n' % h for h in headers)
+        if body is not None:
+            response += 'Content-Length: %d\r\n\r\n%s' % (len(body), body)
+        else:
+            response += '\r\n'
+        return response.encode('ISO-8859-1')
+
+    async def _handle_connection(self, reader, writer):
+        address = writer.get_extra_info('peername')
+        try:
+            mountpoint, ntrip_version, headers = await self._read_request(reader)
+        except (asyncio.TimeoutError, asyncio.IncompleteReadError, asyncio.LimitOverrunError, ConnectionError,
+                ValueError) as e:
+            self.logger.debug('Invalid request from %s:%d. Closing connection. [%s]' % (address[0], address[1],
+                                                                                     repr(e)))
+            writer.close()
+            return
+
+        self.logger.debug('Received NTRIP v%d request from %s:%d. [mountpoint=%s]' %
+                          (ntrip_version, address[0], address[1], repr(mountpoint)))
+
+        # Reply with the source table if the client did not request a valid mountpoint.
+        if mountpoint not in self.mountpoints:
+            if ntrip_version == 2 and mountpoint != '':
+                response = self._make_response(ntrip_version, '404 Not Found')
+            else:
+                content_type = 'gnss/sourcetable' if ntrip_version == 2 else 'text/plain'
+                response = self._make_response(ntrip_version, '200 OK', headers=(('Content-Type', content_type),),
+                                               body=self.get_source_table())
+            writer.write(response)
+            await self._close(writer)
+            return
+        elif self.authorization is not None and headers.get('authorization', None) != self.authorization:
+            self.logger.warning('Authentication failed for client %s:%d. [mountpoint=%s]' %
+                                (address[0], address[1], mountpoint))
+            writer.write(self._make_response(ntrip_version, '401 Unauthorized',
+                                             headers=(('WWW-Authenticate', 'Basic realm="/%s"' % mountpoint),)))
+            await self._close(writer)
+            return
+
+        if ntrip_version == 2:
+            writer.write(self._make_response(ntrip_version, '200 OK', headers=(
+                ('Content-Type', 'gnss/data'), ('Cache-Control', 'no-store, no-cache, max-age=0'),
+                ('Pragma', 'no-cache'), ('Connection', 'close'), ('Transfer-Encoding', 'chunked'))))
+        else:
+            writer.write(self._make_response(ntrip_version, '200 OK'))
+
+        client = NTRIPCasterClient(reader, writer, mountpoint, ntrip_version)
+        self.logger.info('New NTRIP connection from %s.' % str(client))
+        self.mountpoints[mountpoint].append(client)
+
+        # Send data to the client until it disconnects. Incoming data from the client is read (and discarded) by a
+        # separate task.
+        receive_task = self.event_loop.create_task(self._receive_client_data(client))
+        try:
+            while not client.disconnect_requested:
+                await client.data_ready.wait()
+                client.data_ready.clear()
+                while len(client.queue) > 0 and not client.disconnect_requested:
+                    # Combine small chunks into a single write.
+                    chunks = [client.pop()]
+                    size = len(chunks[0])
+                    while len(client.queue) > 0 and size + len(client.queue[0]) <= self.MAX_SEND_SIZE_BYTES:
+                        chunks.append(client.pop())
+                        size += len(chunks[-1])
+
+                    data = b''.join(chunks) if len(chunks) > 1 else chunks[0]
+                    if client.ntrip_version == 2:
+                        # NTRIP v2 data is sent using HTTP chunked transfer encoding.
+                        data = b'%X\r\n%s\r\n' % (size, data)
+                    client.writer.write(data)
+                    await client.writer.drain()
+                    client.bytes_sent += size
+        except asyncio.CancelledError:
+            pass
+        except Exception as e:
+            self.logger.debug('NTRIP client %s closed. [%s]' % (str(client), repr(e)))
+
+        self.logger.info('NTRIP client %s disconnected.' % str(client))
+        receive_task.cancel()
+        self.mountpoints[mountpoint].remove(client)
+        client.writer.close()
+
+    async def _receive_client_data(self, client):
+        try:
+            while True:
+                data = await client.reader.read(self.MAX_REQUEST_SIZE_BYTES)
+                if len(data) == 0:
+                    # An empty read indicates the client closed the connection.
+                    break
+                self.logger.trace('Received %d bytes from NTRIP client %s.' % (len(data), str(client)))
+        except (asyncio.CancelledError, ConnectionError):
+            return
+
+        # The client closed the connection. Stop the send loop.
+        client.disconnect_requested = True
+        client.data_ready.set()
+
+    async def _close(self, writer):
+        try:
+            await writer.drain()
+        except ConnectionError:
+            pass
+        writer.close()
@@ -19,7 +19,17 @@ class NTRIPClient(threading.Thread):
     logger = logging.getLogger('point_one.ntrip_client')
     rx_logger = logger.getChild('rx')
 
-    def __init__(self, url=None, mountpoint=None, username=None, password=None, version=2, data_callback=None):
+    # The maximum number of bytes to read from the server at a time.
+    READ_SIZE_BYTES = 64 * 1024
+
+    def __init__(self, url=None, mountpoint=None, username=None, password=None, version=2, data_callback=None,
+                 event_loop=None):
+        """!
+        @brief Create an NTRIP client.
+
+        @param event_loop If specified, run the client in an existing event loop, owned by the caller, instead of on a
+               separate thread. In that case, @ref data_callback will be called from the event loop thread.
+        """
         super().__init__(name='ntrip_%s' % repr(mountpoint))
 
         self.ntrip = None
@@ -35,7 +45,17 @@ class NTRIPClient(threading.Thread):
 
         self.data_callback = data_callback
 
-        self.event_loop = asyncio.new_event_loop()
+        if event_loop is None:
+            self.event_loop = asyncio.new_event_loop()
+            self.external_event_loop = False
+        else:
+            self.event_loop = event_loop
+            self.external_event_loop = True
+
+        # Tasks scheduled by this client. When running in a shared event loop, these are the only tasks cancelled on
+        # shutdown.
+        self.futures = set()
+        self.running = False
 
     def set_server(self, url, mountpoint, username=None, password=None, version=2):
         if parse_url(url).scheme is None:
@@ -106,11 +126,35 @@ class NTRIPClient(threading.Thread):
         return self._send_async(message)
 
     def start(self):
-        self.logger.debug('Starting receive thread for mountpoint %s.' % self.mountpoint)
-        super().start()
+        if self.external_event_loop:
+            self.logger.debug('Starting receive task for mountpoint %s.' % self.mountpoint)
+            self.running = True
+            self._schedule(self.__run())
+        else:
+            self.logger.debug('Starting receive thread for mountpoint %s.' % self.mountpoint)
+            super().start()
+
+    def is_alive(self):
+        return self.running if self.external_event_loop else super().is_alive()
+
+    def join(self, timeout=None):
+        if not self.external_event_loop:
+            super().join(timeout)
 
     def stop(self):
-        if self.is_alive():
+        if self.external_event_loop:
+            if self.running:
+                self.logger.debug('Stopping receive task for mountpoint %s.' % self.mountpoint)
+                self.running = False
+                for future in list(self.futures):
+                    future.cancel()
+                self.connected = False
+                if self.ntrip is not None:
+                    # Note: We cannot wait for the connection to close since stop() may be called from the event loop
+                    # thread.
+                    self._schedule(self.ntrip.closeNtripConnection())
+                    self.ntrip = None
+        elif self.is_alive():
             self.logger.debug('Stopping receive thread for mountpoint %s.' % self.mountpoint)
             for task in asyncio.all_tasks(loop=self.event_loop):
                 task.cancel()
@@ -135,12 +179,25 @@ class NTRIPClient(threading.Thread):
         self.event_loop.stop()
 
     def run(self):
-        asyncio.run_coroutine_threadsafe(self.__connect(), loop=self.event_loop)
+        self._schedule(self.__run())
         try:
             self.event_loop.run_forever()
         finally:
             self.event_loop.close()
 
+    async def __run(self):
+        # Note: All connection and data reception is handled by this single long-lived task. The task runs until it is
+        # cancelled by stop().
+        while True:
+            await self.__connect()
+            await self.__receive_data()
+            if self.__stop_requested():
+                break
+
+            # Wait before reconnecting, in case the server is accepting connections and then closing them immediately.
+            self.logger.error('Reconnecting to server in 5 seconds.')
+            await asyncio.sleep(5.0)
+
     async def __connect(self):
         # Connect to the NTRIP server.
         self.logger.debug('Connecting to server. [url=%s, ntrip_version=%d, mountpoint=%s, username=%s]' %
@@ -151,42 +208,56 @@ class NTRIPClient(threading.Thread):
                 await self.ntrip.requestNtripStream(casterUrl=self.url, mountPoint=self.mountpoint, user=self.username,
                                                     passwd=self.password, ntripVersion=self.ntrip_version)
                 self.connected = True
-                self.logger.debug('Connected successfully. Scheduling data reception.')
+                self.logger.debug('Connected successfully. Starting data reception.')
                 if self.startup_gga_message:
                     self.logger.debug('Sending cached GGA message.')
                     self.send_nmea(self.startup_gga_message)
-                asyncio.run_coroutine_threadsafe(self.__receive_data(), loop=self.event_loop)
             except ConnectionError as e:
                 self.logger.error('Unexpected error connecting to NTRIP server: %s' % repr(e))
                 self.logger.debug(traceback.format_exc())
                 self.logger.error('Retrying in 5 seconds.')
-                await asyncio.sleep(5.0, loop=self.event_loop)
-                asyncio.run_coroutine_threadsafe(self.__connect(), loop=self.event_loop)
+                self.ntrip = None
+                await asyncio.sleep(5.0)
 
     async def __receive_data(self):
-        try:
-            self.rx_logger.trace('Waiting for data.', depth=2)
-            data = await asyncio.wait_for(self.ntrip.getRawData(1024), timeout=0.5)
-            self.rx_logger.trace('Received %d bytes from mountpoint %s.' % (len(data), self.mountpoint))
-            if self.data_callback is not None:
-                self.data_callback(data)
-            asyncio.run_coroutine_threadsafe(self.__receive_data(), loop=self.event_loop)
-        except asyncio.CancelledError as e:
-            raise e
-        except asyncio.TimeoutError:
-            self.rx_logger.trace('Read timed out with no data. Reading again.', depth=2)
-            asyncio.run_coroutine_threadsafe(self.__receive_data(), loop=self.event_loop)
-        except Exception as e:
-            self.logger.error('Unexpected error waiting for data: %s' % repr(e))
-            self.logger.debug(traceback.format_exc())
-            self.logger.error('Reconnecting to server.')
-            self.connected = False
-            # While it seems like this should be called, it hangs indefinitely
-            # On ValueError from garbage data in, and ConnectionAbortedError.
-            # Skipping it has no impact on reconnection in those cases.
-            # await self.ntrip.closeNtripConnection()
-            self.ntrip = None
-            asyncio.run_coroutine_threadsafe(self.__connect(), loop=self.event_loop)
+        # Read data as it arrives until the connection fails or is closed by the server. Each read returns everything
+        # currently buffered on the socket (up to READ_SIZE_BYTES), so high-rate streams are delivered in large blocks
+        # instead of many small ones.
+        #
+        # Note: stop() may clear self.ntrip from another thread before this task is cancelled, so we hold our own
+        # reference to the connection.
+        ntrip = self.ntrip
+        while True:
+            try:
+                self.rx_logger.trace('Waiting for data.', depth=2)
+                data = await ntrip.getRawData(self.READ_SIZE_BYTES)
+                if self.__stop_requested():
+                    break
+                elif len(data) == 0:
+                    self.logger.error('Connection closed by NTRIP server.')
+                    break
+
+                self.rx_logger.trace('Received %d bytes from mountpoint %s.' % (len(data), self.mountpoint))
+                if self.data_callback is not None:
+                    self.data_callback(data)
+            except asyncio.CancelledError as e:
+                raise e
+            except Exception as e:
+                if not self.__stop_requested():
+                    self.logger.error('Unexpected error waiting for data: %s' % repr(e))
+                    self.logger.debug(traceback.format_exc())
+                break
+
+        self.connected = False
+        # While it seems like this should be called, it hangs indefinitely
+        # On ValueError from garbage data in, and ConnectionAbortedError.
+        # Skipping it has no impact on reconnection in those cases.
+        # await self.ntrip.closeNtripConnection()
+        self.ntrip = None
+
+    def __stop_requested(self):
+        # When running in a shared event loop, stop() may close the connection before this client's task is cancelled.
+        return self.external_event_loop and not self.running
 
     def _send_async(self, data):
         if not isinstance(data, bytes):
@@ -197,9 +268,15 @@ class NTRIPClient(threading.Thread):
                 # Note: Despite the name, this function sends arbitrary data and does not require RTCM.
                 await self.ntrip.sendRtcmFrame(data)
 
-        asyncio.run_coroutine_threadsafe(_send(data), loop=self.event_loop)
+        self._schedule(_send(data))
         return True
 
+    def _schedule(self, coro):
+        future = asyncio.run_coroutine_threadsafe(coro, loop=self.event_loop)
+        self.futures.add(future)
+        future.add_done_callback(self.futures.discard)
+        return future
+
     @classmethod
     def _nmea_deg_to_ddmm(cls, angle_deg, is_longitude=False):
         if is_longitude:
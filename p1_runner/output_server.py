@@ -1,51 +1,212 @@
 import asyncio
-import errno
+from collections import deque
 import logging
-import os
+import selectors
 import socket
 import threading
 from threading import Thread, Event
+import time
 import traceback
 
 import websockets
 
 from . import trace
 from .eos_message import WebsocketHeader
+from .output_subscription import OutputSubscription
 
 
-class WebSocketServerThread(Thread):
+SLOW_CLIENT_POLICIES = ('drop_oldest', 'disconnect', 'coalesce')
+
+
+def _to_bytes(messages):
+    # Convert each message to immutable bytes, since they may be queued and sent after the caller modifies the buffer.
+    return [m if isinstance(m[0], bytes) else
+            ((m[0].encode('ISO-8859-1') if isinstance(m[0], str) else bytes(m[0])),) + tuple(m[1:])
+            for m in messages]
+
+
+class ClientQueue(object):
+    """!
+    @brief A bounded queue of output data waiting to be sent to a client.
+    """
+
+    def __init__(self):
+        self.queue = deque()
+        self.queued_bytes = 0
+
+        self.bytes_sent = 0
+        self.bytes_dropped = 0
+        self.chunks_dropped = 0
+        self.overflow_count = 0
+        self.max_queued_bytes = 0
+
+        # Set if the client should be disconnected by the thread servicing it. Any queued data is discarded.
+        self.disconnect_requested = False
+
+        # The message types requested by the client, or `None` to use the server's default output type.
+        self.subscription = None
+
+    def select(self, messages, default_message_class, now):
+        """!
+        @brief Select the messages to be sent to this client.
+
+        @param messages A list of `(data, message_class, message_id)` tuples.
+        @param default_message_class The class of messages to send if the client does not have a subscription.
+        @param now The current time (in seconds).
+
+        @return A list of data buffers.
+        """
+        if self.subscription is None:
+            return [m[0] for m in messages if m[1] == default_message_class]
+        else:
+            return [m[0] for m in messages if self.subscription.matches(m[1], m[2], now)]
+
+    def is_subscribed(self, message_class, default_message_class):
+        """!
+        @brief Check if this client wants messages of the specified class.
+
+        @param message_class The message class.
+        @param default_message_class The class of messages to send if the client does not have a subscription.
+        """
+        if self.subscription is None:
+            return message_class == default_message_class
+        else:
+            return message_class in self.subscription.message_ids
+
+    def push(self, chunks, max_queue_bytes, slow_client_policy, logger):
+        """!
+        @brief Add data to the queue, applying the slow client policy if the queue is full.
+
+        @param chunks A list of data buffers to be queued.
+        @param max_queue_bytes The maximum number of bytes to queue.
+        @param slow_client_policy The action to take if the queue is full (see @ref OutputServer).
+        @param logger The logger to use to report dropped data.
+
+        @return `False` if the client should be disconnected.
+        """
+        prev_overflow_count = self.overflow_count
+        for data in chunks:
+            if self.queued_bytes + len(data) > max_queue_bytes:
+                self.overflow_count += 1
+                if slow_client_policy == 'disconnect':
+                    logger.warning('Client %s is not keeping up. Disconnecting. [queued=%d B]' %
+                                   (str(self), self.queued_bytes))
+                    self.disconnect_requested = True
+                    self.clear()
+                    return False
+                elif slow_client_policy == 'coalesce':
+                    self.chunks_dropped += len(self.queue)
+                    self.bytes_dropped += self.queued_bytes
+                    self.clear()
+                else:
+                    while len(self.queue) > 0 and self.queued_bytes + len(data) > max_queue_bytes:
+                        dropped = self.pop()
+                        self.chunks_dropped += 1
+                        self.bytes_dropped += len(dropped)
+
+            self.queue.append(data)
+            self.queued_bytes += len(data)
+
+        if self.queued_bytes > self.max_queued_bytes:
+            self.max_queued_bytes = self.queued_bytes
+
+        # Warn on the first overflow, and periodically after that.
+        if self.overflow_count != prev_overflow_count and \
+                (prev_overflow_count == 0 or self.overflow_count // 1000 != prev_overflow_count // 1000):
+            logger.warning('Client %s is not keeping up. Dropping data. [%d B dropped]' %
+                           (str(self), self.bytes_dropped))
+        return True
+
+    def pop(self):
+        data = self.queue.popleft()
+        self.queued_bytes -= len(data)
+        return data
+
+    def clear(self):
+        self.queue.clear()
+        self.queued_bytes = 0
+
+    def get_lag_bytes(self):
+        return self.queued_bytes
+
+    def get_stats(self):
+        return {
+            'address': str(self),
+            'lag_bytes': self.get_lag_bytes(),
+            'max_lag_bytes': self.max_queued_bytes,
+            'bytes_sent': self.bytes_sent,
+            'bytes_dropped': self.bytes_dropped,
+            'chunks_dropped': self.chunks_dropped,
+            'overflow_count': self.overflow_count,
+        }
+
+
+class WebSocketClient(ClientQueue):
+    def __init__(self, path):
+        super().__init__()
+        self.path = path
+        self.data_ready = asyncio.Event()
+
+    def __str__(self):
+        return 'ws:%s' % self.path
+
+
+class WebSocketServer(object):
+    """!
+    @brief Websocket output server, run within an asyncio event loop.
+
+    All methods must be called from the event loop thread. See @ref WebSocketServerThread to run the server on a
+    separate thread.
+    """
     logger = logging.getLogger('point_one.p1_runner.websocket')
 
-    def __init__(self, websocket_address, legacy_nmea=False):
-        Thread.__init__(self)
-        self.loop = None
-        self.started = Event()
-        self.queues = []
+    def __init__(self, websocket_address, legacy_nmea=False, max_client_queue_bytes=1024 * 1024,
+                 slow_client_policy='drop_oldest', default_message_class='raw'):
+        self.clients = []
         self.exit = None
         self.websocket_address = websocket_address
         self.legacy_nmea = legacy_nmea
+        self.max_client_queue_bytes = max_client_queue_bytes
+        self.slow_client_policy = slow_client_policy
+        self.default_message_class = default_message_class
 
     async def _handle_ws_connection(self, connection):
-        queue = asyncio.Queue()
-        self.queues.append(queue)
-        path = connection.path
-        self.logger.debug('Websocket got connection from %s.' % repr(path))
-        while True:
-            data = await queue.get()
-            if self.exit.done() or data is None:
-                break
-            else:
-                if self.legacy_nmea:
-                    data = WebsocketHeader().pack(return_buffer=True) + data.strip()
+        # Note: websockets >= 14 stores the request path in connection.request.
+        request = getattr(connection, 'request', None)
+        client = WebSocketClient(request.path if request is not None else connection.path)
+        try:
+            client.subscription = OutputSubscription.from_path(client.path)
+        except ValueError as e:
+            self.logger.warning('Invalid subscription request from websocket client %s. [%s]' % (str(client), str(e)))
+            return
 
-                try:
+        self.clients.append(client)
+        self.logger.debug('Websocket got connection from %s.%s' %
+                          (repr(client.path),
+                           (' [subscription=%s]' % str(client.subscription)) if client.subscription else ''))
+        try:
+            while not self.exit.done():
+                await client.data_ready.wait()
+                client.data_ready.clear()
+                while len(client.queue) > 0 and not client.disconnect_requested:
+                    data = client.pop()
+                    if self.legacy_nmea:
+                        data = WebsocketHeader().pack(return_buffer=True) + data.strip()
                     await connection.send(data)
-                except:
+                    client.bytes_sent += len(data)
+
+                if client.disconnect_requested:
                     break
-        self.queues.remove(queue)
-        self.logger.debug('Websocket done with %s.' % repr(path))
+        except Exception:
+            pass
+        self.clients.remove(client)
+        self.logger.debug('Websocket done with %s.' % repr(client.path))
 
-    async def _run_server(self):
+    async def run_server(self):
+        """!
+        @brief Run the server until @ref shutdown() is called.
+        """
+        self.exit = asyncio.get_running_loop().create_future()
         self.logger.debug('Websocket server running.')
         async with websockets.serve(self._handle_ws_connection, host=self.websocket_address[0],
                                     port=self.websocket_address[1]):
@@ -53,39 +214,171 @@ class WebSocketServerThread(Thread):
             await self.exit
         self.logger.debug('Websocket server exited.')
 
+    def shutdown(self):
+        if self.exit is not None and not self.exit.done():
+            self.exit.set_result('exit')
+
+        self.logger.debug('Sending close request to all connections.')
+        for client in self.clients:
+            client.disconnect_requested = True
+            client.data_ready.set()
+
+    def dispatch(self, batches):
+        """!
+        @brief Queue data to be sent to all clients.
+
+        @param batches A list of message batches, each of which is a list of `(data, message_class, message_id)`
+               tuples. Each batch is sent to a client as a single websocket frame.
+        """
+        if len(self.clients) > 0:
+            self.logger.trace('Dispatching %d batches to %d clients.' % (len(batches), len(self.clients)))
+
+        now = time.monotonic()
+        for client in self.clients:
+            if client.disconnect_requested:
+                continue
+
+            # Send each batch as a single websocket frame, unless using legacy NMEA output, in which case each frame
+            # may only contain a single NMEA message.
+            chunks = []
+            for batch in batches:
+                selected = client.select(batch, self.default_message_class, now)
+                if self.legacy_nmea or len(selected) <= 1:
+                    chunks.extend(selected)
+                else:
+                    chunks.append(b''.join(selected))
+
+            if len(chunks) > 0:
+                client.push(chunks, self.max_client_queue_bytes, self.slow_client_policy, self.logger)
+                client.data_ready.set()
+
+    def is_subscribed(self, message_class):
+        return any(c.is_subscribed(message_class, self.default_message_class) for c in list(self.clients))
+
+    def get_client_stats(self):
+        return [c.get_stats() for c in list(self.clients)]
+
+
+class WebSocketServerThread(WebSocketServer, Thread):
+    """!
+    @brief Run a @ref WebSocketServer in its own event loop on a separate thread.
+    """
+
+    def __init__(self, websocket_address, **kwargs):
+        WebSocketServer.__init__(self, websocket_address, **kwargs)
+        Thread.__init__(self)
+        self.loop = None
+        self.started = Event()
+
+        # Data passed to send() from other threads, waiting to be distributed to the client queues by the event loop.
+        # The loop is only woken once for each batch of pending data.
+        self.pending_lock = threading.Lock()
+        self.pending_data = []
+        self.dispatch_scheduled = False
+
     def run(self):
         self.loop = asyncio.new_event_loop()
         asyncio.set_event_loop(self.loop)
-        self.exit = asyncio.Future()
         # Notify other threads that the loop is up and running.
         self.loop.call_soon(self.started.set)
-        self.loop.run_until_complete(self._run_server())
+        self.loop.run_until_complete(self.run_server())
 
     def stop(self):
-        # Trigger _run_server to complete.
+        # Trigger run_server() to complete, and close out any active _handle_ws_connection calls.
         self.logger.debug('Sending stop request to thread.')
-        self.loop.call_soon_threadsafe(self.exit.set_result, 'exit')
-        # Close out any active _handle_ws_connection calls.
-        self.logger.debug('Sending close request to all connections.')
-        self.send(None)
+        self.started.wait()
+        self.loop.call_soon_threadsafe(self.shutdown)
+
+    def _dispatch(self):
+        with self.pending_lock:
+            pending_batches = self.pending_data
+            self.pending_data = []
+            self.dispatch_scheduled = False
 
-    async def _send(self, data):
-        if data is not None and len(self.queues) > 0:
-            self.logger.trace('Sending %d bytes to %d clients.' %
-                              (len(data), len(self.queues)))
-        for q in self.queues:
-            q.put_nowait(data)
+        self.dispatch(pending_batches)
 
-    def send(self, data):
+    def send_batch(self, messages):
+        """!
+        @brief Queue a list of `(data, message_class, message_id)` tuples to be sent to all clients.
+        """
         # Check to make sure the loop is up and running.
         self.started.wait()
-        asyncio.run_coroutine_threadsafe(self._send(data), loop=self.loop)
+        if len(self.clients) == 0:
+            return
+
+        with self.pending_lock:
+            self.pending_data.append(messages)
+            if self.dispatch_scheduled:
+                return
+            self.dispatch_scheduled = True
+        self.loop.call_soon_threadsafe(self._dispatch)
+
+
+class TCPClient(ClientQueue):
+    """!
+    @brief A connected TCP client and its queue of pending output data.
+    """
+
+    def __init__(self, sock, address):
+        super().__init__()
+        self.socket = sock
+        self.address = address
+
+        # The remainder of a partially-sent chunk. This is never discarded by the slow client policy since doing so
+        # would send the client a truncated message.
+        self.pending = None
+
+        # Incoming data from the client, used to parse subscription requests.
+        self.rx_buffer = bytearray()
+
+    def __str__(self):
+        return 'tcp://%s:%d' % (self.address[0], self.address[1])
+
+    def get_lag_bytes(self):
+        return self.queued_bytes + (len(self.pending) if self.pending is not None else 0)
 
 
 class OutputServer(object):
     logger = logging.getLogger('point_one.p1_runner.output')
 
-    def __init__(self, tcp_address=None, websocket_address=None, legacy_nmea=False):
+    DEFAULT_MAX_CLIENT_QUEUE_BYTES = 1024 * 1024
+    SLOW_CLIENT_POLICIES = SLOW_CLIENT_POLICIES
+
+    # The maximum amount of queued data to combine into a single socket send() call.
+    MAX_SEND_SIZE_BYTES = 64 * 1024
+
+    # The maximum length of a subscription request from a TCP client.
+    MAX_REQUEST_SIZE_BYTES = 1024
+
+    def __init__(self, tcp_address=None, websocket_address=None, legacy_nmea=False,
+                 max_client_queue_bytes=DEFAULT_MAX_CLIENT_QUEUE_BYTES, slow_client_policy='drop_oldest',
+                 default_message_class='raw'):
+        """!
+        @brief Forward data to connected TCP and websocket clients.
+
+        Data is sent to TCP and websocket clients from separate threads. @ref send() only queues the data for each
+        client, and never blocks on network I/O. If a client cannot keep up and its queue exceeds
+        `max_client_queue_bytes`, the data is handled according to `slow_client_policy`:
+        - `drop_oldest` - Discard the oldest queued data until the new data fits
+        - `disconnect` - Close the connection to the client
+        - `coalesce` - Discard all queued data and resume sending from the new data, so the client skips ahead to the
+          latest output rather than staying behind
+
+        Each message passed to @ref send() is labeled with a message class (`raw`, `fusion_engine`, `nmea`, `rtcm`),
+        and optionally a message ID. By default, clients receive all messages of class `default_message_class`.
+        Clients may instead request specific message types and output rates (see @ref OutputSubscription).
+
+        @param tcp_address The `(address, port)` on which to listen for TCP connections, or `None` to disable.
+        @param websocket_address The `(address, port)` on which to listen for websocket connections, or `None` to
+               disable.
+        @param legacy_nmea If `True`, prepend a legacy header to all websocket messages.
+        @param max_client_queue_bytes The maximum number of bytes to queue for each client.
+        @param slow_client_policy The action to take when a client queue is full.
+        @param default_message_class The class of messages to be sent to clients that do not request a subscription.
+        """
+        if slow_client_policy not in self.SLOW_CLIENT_POLICIES:
+            raise ValueError("Unrecognized slow client policy '%s'." % slow_client_policy)
+
         self.is_open = False
 
         self.tcp_address = tcp_address
@@ -93,6 +386,15 @@ class OutputServer(object):
         self.tcp_thread = None
         self.tcp_lock = threading.Lock()
         self.tcp_clients = {}
+        self.max_client_queue_bytes = max_client_queue_bytes
+        self.slow_client_policy = slow_client_policy
+        self.default_message_class = default_message_class
+
+        # Used to wake the TCP thread when new data is queued for an idle client, or on shutdown.
+        self.selector = None
+        self.wakeup_recv_socket = None
+        self.wakeup_send_socket = None
+        self.wakeup_pending = False
 
         self.ws_address = websocket_address
         self.ws_server = None
@@ -103,17 +405,28 @@ class OutputServer(object):
             self.logger.debug('Listening for incoming TCP connections on tcp://%s:%d.' %
                               (self.tcp_address[0], self.tcp_address[1]))
             self.tcp_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-            self.tcp_socket.settimeout(0.5)
+            self.tcp_socket.setblocking(False)
             self.tcp_socket.bind(self.tcp_address)
             self.tcp_socket.listen()
 
+            self.wakeup_recv_socket, self.wakeup_send_socket = socket.socketpair()
+            self.wakeup_recv_socket.setblocking(False)
+            self.wakeup_send_socket.setblocking(False)
+
+            self.selector = selectors.DefaultSelector()
+            self.selector.register(self.tcp_socket, selectors.EVENT_READ)
+            self.selector.register(self.wakeup_recv_socket, selectors.EVENT_READ)
+
             self.tcp_thread = threading.Thread(
                 name='quectel_tcp', target=self._run_tcp)
 
         if self.ws_address is not None:
             self.logger.debug('Listening for incoming websocket connections on ws://%s:%d.' %
                               (self.ws_address[0], self.ws_address[1]))
-            self.ws_server = WebSocketServerThread(self.ws_address, legacy_nmea=self.legacy_nmea)
+            self.ws_server = WebSocketServerThread(self.ws_address, legacy_nmea=self.legacy_nmea,
+                                                   max_client_queue_bytes=self.max_client_queue_bytes,
+                                                   slow_client_policy=self.slow_client_policy,
+                                                   default_message_class=self.default_message_class)
             self.ws_server.start()
 
         if self.tcp_thread is not None:
@@ -124,8 +437,8 @@ class OutputServer(object):
         if self.is_open:
             self.is_open = False
             if self.tcp_socket is not None:
-                self.logger.debug('Closing TCP socket.')
-                self.tcp_socket.close()
+                self.logger.debug('Stopping TCP thread.')
+                self._wakeup(force=True)
 
         if self.ws_server is not None:
             self.logger.debug('Closing websocket server.')
@@ -140,52 +453,475 @@ class OutputServer(object):
             self.ws_server.join()
         self.logger.debug('Finished.')
 
-    def send(self, data):
-        if not isinstance(data, (bytes, bytearray)):
-            data = data.encode('ISO-8859-1')
+    def send(self, data, message_class='raw', message_id=None):
+        """!
+        @brief Send data to all clients that have requested it.
+
+        @param data The data to be sent.
+        @param message_class The class of the data (`raw`, `fusion_engine`, `nmea`, `rtcm`).
+        @param message_id The message type, if applicable (FusionEngine message type, NMEA sentence ID, or RTCM message
+               number).
+        """
+        self.send_batch(((data, message_class, message_id),))
+
+    def send_batch(self, messages):
+        """!
+        @brief Send a list of messages to all clients as a single TCP write and websocket frame.
+
+        @note
+        In legacy NMEA mode, each websocket frame may only contain a single NMEA message, so the messages are sent
+        individually.
+
+        @param messages A list of `(data, message_class, message_id)` tuples.
+        """
+        # Copy mutable buffers since they will be sent later from another thread.
+        messages = _to_bytes(messages)
 
         if self.ws_server is not None:
-            self.ws_server.send(data)
+            self.ws_server.send_batch(messages)
 
+        if self.tcp_socket is None:
+            return
+
+        # The TCP thread only needs to be woken up if a client that had nothing to send now has data pending (or must be
+        # disconnected). If a client's queue is not empty, the thread is already sending to it.
+        wakeup_needed = False
         with self.tcp_lock:
             if len(self.tcp_clients) > 0:
-                self.logger.trace('Sending %d bytes to %d TCP clients.' % (
-                    len(data), len(self.tcp_clients)))
-                closed = []
-                for addr, client in self.tcp_clients.items():
-                    try:
-                        client.sendall(data)
-                    except Exception as e:
-                        self.logger.debug(
-                            'Client socket tcp://%s:%d closed. [%s]' % (addr[0], addr[1], repr(e)))
-                        closed.append(addr)
+                now = time.monotonic()
+                default_data = None
+                # Note: If a client needs to be disconnected, the TCP thread will close the socket.
+                for client in self.tcp_clients.values():
+                    if client.disconnect_requested:
                         continue
 
-                if len(closed) > 0:
-                    self.tcp_clients = {
-                        a: c for a, c in self.tcp_clients.items() if a not in closed}
+                    if client.subscription is None:
+                        # All clients without a subscription receive the same data.
+                        if default_data is None:
+                            default_data = b''.join(client.select(messages, self.default_message_class, now))
+                        data = default_data
+                    else:
+                        data = b''.join(client.select(messages, self.default_message_class, now))
 
-    def _run_tcp(self):
+                    if len(data) > 0:
+                        self.logger.trace('Queuing %d bytes for TCP client %s.' % (len(data), str(client)))
+                        was_empty = len(client.queue) == 0
+                        if not client.push((data,), self.max_client_queue_bytes, self.slow_client_policy,
+                                           self.logger) or was_empty:
+                            wakeup_needed = True
+
+        if wakeup_needed:
+            self._wakeup()
+
+    def is_subscribed(self, message_class):
+        """!
+        @brief Check if any connected client has requested messages of the specified class.
+        """
+        with self.tcp_lock:
+            if any(c.is_subscribed(message_class, self.default_message_class) for c in self.tcp_clients.values()):
+                return True
+
+        return self.ws_server is not None and self.ws_server.is_subscribed(message_class)
+
+    def get_client_stats(self):
+        """!
+        @brief Get the current send queue statistics for each connected TCP and websocket client.
+
+        @return A list of `dict` containing the client address, the number of bytes waiting to be sent (`lag_bytes`),
+                and the number of bytes sent and dropped.
+        """
+        with self.tcp_lock:
+            stats = [c.get_stats() for c in self.tcp_clients.values()]
+        if self.ws_server is not None:
+            stats += self.ws_server.get_client_stats()
+        return stats
+
+    def _wakeup(self, force=False):
+        # Only notify the TCP thread once per batch of data. The thread clears wakeup_pending before collecting the
+        # queued data.
+        with self.tcp_lock:
+            if self.wakeup_pending and not force:
+                return
+            self.wakeup_pending = True
+
+        try:
+            self.wakeup_send_socket.send(b'\x00')
+        except (BlockingIOError, OSError):
+            # The socket buffer is full, so the thread will already wake up.
+            pass
+
+    def _close_client(self, client):
+        # Note: tcp_lock must be held.
+        self.tcp_clients.pop(client.address, None)
+        try:
+            self.selector.unregister(client.socket)
+        except (KeyError, ValueError):
+            pass
+        client.socket.close()
+
+    def _accept(self):
         while True:
             try:
-                client, addr = self.tcp_socket.accept()
-                self.logger.debug(
-                    'New output connection from tcp://%s:%d.' % (addr[0], addr[1]))
+                sock, addr = self.tcp_socket.accept()
+            except BlockingIOError:
+                break
+
+            sock.setblocking(False)
+            client = TCPClient(sock, addr)
+            self.logger.debug('New output connection from %s.' % str(client))
+            with self.tcp_lock:
+                self.tcp_clients[addr] = client
+                self.selector.register(sock, selectors.EVENT_READ, client)
+
+    def _handle_client_request(self, client, data):
+        # Parse subscription requests from the client, one per line. Any other incoming data is ignored.
+        client.rx_buffer += data
+        while True:
+            end_idx = client.rx_buffer.find(b'\n')
+            if end_idx < 0:
+                if len(client.rx_buffer) > self.MAX_REQUEST_SIZE_BYTES:
+                    client.rx_buffer.clear()
+                break
+
+            line = client.rx_buffer[:end_idx].decode('ISO-8859-1', errors='replace')
+            del client.rx_buffer[:end_idx + 1]
+            try:
+                subscription = OutputSubscription.from_handshake(line)
+            except ValueError as e:
+                self.logger.warning('Invalid subscription request from client %s. [%s]' % (str(client), str(e)))
+                continue
+
+            if subscription is not None:
+                self.logger.debug('Client %s subscribed to: %s' % (str(client), str(subscription)))
                 with self.tcp_lock:
-                    self.tcp_clients[addr] = client
-            except socket.timeout:
-                if self.is_open:
+                    client.subscription = subscription
+
+    def _send_to_client(self, client):
+        """!
+        @brief Send as much queued data as possible to the client without blocking.
+
+        @return `True` if data is still pending.
+        """
+        while True:
+            if client.pending is None:
+                with self.tcp_lock:
+                    if len(client.queue) == 0:
+                        return False
+
+                    # Combine small chunks into a single send() call.
+                    chunk = client.pop()
+                    if len(client.queue) > 0 and len(chunk) < self.MAX_SEND_SIZE_BYTES:
+                        chunks = [chunk]
+                        size = len(chunk)
+                        while len(client.queue) > 0 and size + len(client.queue[0]) <= self.MAX_SEND_SIZE_BYTES:
+                            chunk = client.pop()
+                            chunks.append(chunk)
+                            size += len(chunk)
+                        chunk = b''.join(chunks)
+                client.pending = memoryview(chunk)
+
+            try:
+                sent = client.socket.send(client.pending)
+            except BlockingIOError:
+                return True
+
+            client.bytes_sent += sent
+            if sent == len(client.pending):
+                client.pending = None
+            else:
+                client.pending = client.pending[sent:]
+                return True
+
+    def _run_tcp(self):
+        try:
+            while self.is_open:
+                for key, events in self.selector.select(timeout=1.0):
+                    if key.fileobj is self.tcp_socket:
+                        self._accept()
+                    elif key.fileobj is self.wakeup_recv_socket:
+                        try:
+                            while self.wakeup_recv_socket.recv(4096):
+                                pass
+                        except BlockingIOError:
+                            pass
+                    else:
+                        client = key.data
+                        try:
+                            if events & selectors.EVENT_READ:
+                                # An empty read indicates the client closed the connection.
+                                data = client.socket.recv(4096)
+                                if len(data) == 0:
+                                    raise ConnectionResetError('Connection closed by client.')
+                                self._handle_client_request(client, data)
+                            if events & selectors.EVENT_WRITE:
+                                self._send_to_client(client)
+                        except BlockingIOError:
+                            pass
+                        except Exception as e:
+                            self.logger.debug('Client socket %s closed. [%s]' % (str(client), repr(e)))
+                            with self.tcp_lock:
+                                self._close_client(client)
+
+                # Send any newly queued data, and only wait for the socket to become writable if the client could not
+                # accept all of it.
+                with self.tcp_lock:
+                    self.wakeup_pending = False
+                    clients = list(self.tcp_clients.values())
+
+                for client in clients:
+                    if client.disconnect_requested:
+                        with self.tcp_lock:
+                            self._close_client(client)
+                        continue
+
+                    try:
+                        pending = self._send_to_client(client)
+                    except Exception as e:
+                        self.logger.debug('Client socket %s closed. [%s]' % (str(client), repr(e)))
+                        with self.tcp_lock:
+                            self._close_client(client)
+                        continue
+
+                    with self.tcp_lock:
+                        if client.address in self.tcp_clients:
+                            self.selector.modify(client.socket,
+                                                 selectors.EVENT_READ | (selectors.EVENT_WRITE if pending else 0),
+                                                 client)
+        except Exception:
+            self.logger.error('Unexpected error from TCP socket:\r%s' % traceback.format_exc())
+
+        self.logger.debug('TCP listening socket closed.')
+        with self.tcp_lock:
+            for client in list(self.tcp_clients.values()):
+                self._close_client(client)
+        self.selector.close()
+        self.tcp_socket.close()
+        self.wakeup_recv_socket.close()
+        self.wakeup_send_socket.close()
+
+        self.logger.debug('TCP thread finished.')
+
+
+class AsyncTCPClient(ClientQueue):
+    """!
+    @brief A TCP client connected to an @ref AsyncOutputServer.
+    """
+
+    def __init__(self, reader, writer):
+        super().__init__()
+        self.reader = reader
+        self.writer = writer
+        self.address = writer.get_extra_info('peername')
+        self.data_ready = asyncio.Event()
+        self.tasks = []
+
+    def __str__(self):
+        return 'tcp://%s:%d' % (self.address[0], self.address[1])
+
+
+class AsyncOutputServer(object):
+    """!
+    @brief Forward data to connected TCP and websocket clients from an existing asyncio event loop.
+
+    This class provides the same interface as @ref OutputServer, but all network I/O is performed by tasks running in
+    the specified event loop instead of separate threads. @ref send() and @ref send_batch() must be called from the
+    event loop thread, and queue data for each client directly without waking another thread.
+    """
+    logger = logging.getLogger('point_one.p1_runner.output')
+
+    DEFAULT_MAX_CLIENT_QUEUE_BYTES = OutputServer.DEFAULT_MAX_CLIENT_QUEUE_BYTES
+    SLOW_CLIENT_POLICIES = SLOW_CLIENT_POLICIES
+    MAX_SEND_SIZE_BYTES = OutputServer.MAX_SEND_SIZE_BYTES
+    MAX_REQUEST_SIZE_BYTES = OutputServer.MAX_REQUEST_SIZE_BYTES
+
+    def __init__(self, event_loop, tcp_address=None, websocket_address=None, legacy_nmea=False,
+                 max_client_queue_bytes=DEFAULT_MAX_CLIENT_QUEUE_BYTES, slow_client_policy='drop_oldest',
+                 default_message_class='raw'):
+        """!
+        @brief Create a server. See @ref OutputServer for argument details.
+
+        @param event_loop The event loop in which the server will run.
+        """
+        if slow_client_policy not in self.SLOW_CLIENT_POLICIES:
+            raise ValueError("Unrecognized slow client policy '%s'." % slow_client_policy)
+
+        self.event_loop = event_loop
+
+        self.tcp_address = tcp_address
+        self.tcp_server = None
+        self.tcp_clients = {}
+        self.max_client_queue_bytes = max_client_queue_bytes
+        self.slow_client_policy = slow_client_policy
+        self.default_message_class = default_message_class
+
+        self.ws_address = websocket_address
+        self.ws_server = None
+        self.ws_task = None
+        self.legacy_nmea = legacy_nmea
+
+    def start(self):
+        # If the loop is not running yet, start the servers immediately so errors (e.g., port in use) are reported to
+        # the caller.
+        if self.event_loop.is_running():
+            asyncio.run_coroutine_threadsafe(self._start(), loop=self.event_loop).result()
+        else:
+            self.event_loop.run_until_complete(self._start())
+
+    def stop(self):
+        # Note: The event loop owner is responsible for running any pending shutdown tasks before closing the loop.
+        self.event_loop.call_soon_threadsafe(self._stop)
+
+    def join(self):
+        pass
+
+    def send(self, data, message_class='raw', message_id=None):
+        """!
+        @brief Send data to all clients that have requested it.
+
+        @param data The data to be sent.
+        @param message_class The class of the data (`raw`, `fusion_engine`, `nmea`, `rtcm`).
+        @param message_id The message type, if applicable (FusionEngine message type, NMEA sentence ID, or RTCM message
+               number).
+        """
+        self.send_batch(((data, message_class, message_id),))
+
+    def send_batch(self, messages):
+        """!
+        @brief Send a list of messages to all clients as a single TCP write and websocket frame.
+
+        @param messages A list of `(data, message_class, message_id)` tuples.
+        """
+        if len(self.tcp_clients) == 0 and (self.ws_server is None or len(self.ws_server.clients) == 0):
+            return
+
+        messages = _to_bytes(messages)
+
+        if self.ws_server is not None:
+            self.ws_server.dispatch((messages,))
+
+        now = time.monotonic()
+        default_data = None
+        for client in self.tcp_clients.values():
+            if client.disconnect_requested:
+                continue
+
+            if client.subscription is None:
+                # All clients without a subscription receive the same data.
+                if default_data is None:
+                    default_data = b''.join(client.select(messages, self.default_message_class, now))
+                data = default_data
+            else:
+                data = b''.join(client.select(messages, self.default_message_class, now))
+
+            if len(data) > 0:
+                self.logger.trace('Queuing %d bytes for TCP client %s.' % (len(data), str(client)))
+                client.push((data,), self.max_client_queue_bytes, self.slow_client_policy, self.logger)
+                client.data_ready.set()
+
+    def is_subscribed(self, message_class):
+        """!
+        @brief Check if any connected client has requested messages of the specified class.
+        """
+        if any(c.is_subscribed(message_class, self.default_message_class) for c in self.tcp_clients.values()):
+            return True
+        else:
+            return self.ws_server is not None and self.ws_server.is_subscribed(message_class)
+
+    def get_client_stats(self):
+        """!
+        @brief Get the current send queue statistics for each connected TCP and websocket client.
+        """
+        stats = [c.get_stats() for c in list(self.tcp_clients.values())]
+        if self.ws_server is not None:
+            stats += self.ws_server.get_client_stats()
+        return stats
+
+    async def _start(self):
+        if self.tcp_address is not None:
+            self.logger.debug('Listening for incoming TCP connections on tcp://%s:%d.' %
+                              (self.tcp_address[0], self.tcp_address[1]))
+            self.tcp_server = await asyncio.start_server(self._handle_tcp_connection, host=self.tcp_address[0] or None,
+                                                         port=self.tcp_address[1])
+
+        if self.ws_address is not None:
+            self.logger.debug('Listening for incoming websocket connections on ws://%s:%d.' %
+                              (self.ws_address[0], self.ws_address[1]))
+            self.ws_server = WebSocketServer(self.ws_address, legacy_nmea=self.legacy_nmea,
+                                             max_client_queue_bytes=self.max_client_queue_bytes,
+                                             slow_client_policy=self.slow_client_policy,
+                                             default_message_class=self.default_message_class)
+            self.ws_task = self.event_loop.create_task(self.ws_server.run_server())
+
+    def _stop(self):
+        if self.tcp_server is not None:
+            self.logger.debug('Closing TCP server.')
+            self.tcp_server.close()
+            self.tcp_server = None
+            for client in list(self.tcp_clients.values()):
+                client.disconnect_requested = True
+                client.data_ready.set()
+
+        if self.ws_server is not None:
+            self.logger.debug('Closing websocket server.')
+            self.ws_server.shutdown()
+
+    async def _handle_tcp_connection(self, reader, writer):
+        client = AsyncTCPClient(reader, writer)
+        self.logger.debug('New output connection from %s.' % str(client))
+        self.tcp_clients[client.address] = client
+
+        # Send data to the client until it disconnects. Incoming subscription requests are handled by a separate task.
+        request_task = self.event_loop.create_task(self._receive_client_requests(client))
+        try:
+            while not client.disconnect_requested:
+                await client.data_ready.wait()
+                client.data_ready.clear()
+                while len(client.queue) > 0 and not client.disconnect_requested:
+                    # Combine small chunks into a single write.
+                    chunks = [client.pop()]
+                    size = len(chunks[0])
+                    while len(client.queue) > 0 and size + len(client.queue[0]) <= self.MAX_SEND_SIZE_BYTES:
+                        chunks.append(client.pop())
+                        size += len(chunks[-1])
+
+                    client.writer.write(b''.join(chunks) if len(chunks) > 1 else chunks[0])
+                    await client.writer.drain()
+                    client.bytes_sent += size
+        except Exception as e:
+            self.logger.debug('Client socket %s closed. [%s]' % (str(client), repr(e)))
+
+        request_task.cancel()
+        self.tcp_clients.pop(client.address, None)
+        client.writer.close()
+
+    async def _receive_client_requests(self, client):
+        # Parse subscription requests from the client, one per line. Any other incoming data is ignored.
+        try:
+            while True:
+                try:
+                    line = await client.reader.readuntil(b'\n')
+                except asyncio.LimitOverrunError as e:
+                    await client.reader.readexactly(e.consumed)
                     continue
-                else:
-                    self.logger.debug('TCP listening socket closed.')
+                except asyncio.IncompleteReadError:
+                    # An empty read indicates the client closed the connection.
                     break
-            except Exception as e:
-                if isinstance(e, OSError) and (e.errno == errno.EBADF or
-                                               (os.name == 'nt' and e.errno == errno.WSAENOTSOCK)):
-                    self.logger.debug('TCP listening socket closed.')
-                else:
-                    self.logger.error(
-                        'Unexpected error from TCP socket:\r%s' % traceback.format_exc())
-                break
 
-        self.logger.debug('TCP thread finished.')
+                if len(line) > self.MAX_REQUEST_SIZE_BYTES:
+                    continue
+
+                try:
+                    subscription = OutputSubscription.from_handshake(line.decode('ISO-8859-1', errors='replace'))
+                except ValueError as e:
+                    self.logger.warning('Invalid subscription request from client %s. [%s]' % (str(client), str(e)))
+                    continue
+
+                if subscription is not None:
+                    self.logger.debug('Client %s subscribed to: %s' % (str(client), str(subscription)))
+                    client.subscription = subscription
+        except (asyncio.CancelledError, ConnectionError):
+            return
+
+        # The client closed the connection. Stop the send loop.
+        client.disconnect_requested = True
+        client.data_ready.set()
@@ -0,0 +1,182 @@
+import logging
+from urllib.parse import parse_qsl, urlsplit
+
+from fusion_engine_client.messages import MessageType, message_type_to_class
+
+
+class OutputSubscription(object):
+    """!
+    @brief A set of message types requested by an output client, with an optional maximum output rate.
+
+    Clients subscribe to specific message types when they connect:
+    - TCP clients send a single line of text (may be sent again at any time to change the subscription):
+      ```
+      subscribe fusion_engine=PoseMessage,GNSSSatellite nmea=GGA rtcm=1005,1077 rate=10
+      ```
+    - Websocket clients specify the subscription in the URL query string:
+      ```
+      ws://host:port/?fusion_engine=PoseMessage&nmea=GGA,RMC&rate=10
+      ```
+      Other query parameters (e.g., added by a proxy) are ignored.
+
+    FusionEngine message types may be specified by class name (`PoseMessage`), type name (`POSE`), or numeric value.
+    NMEA messages are specified by sentence ID (`GGA`), and RTCM messages by message number. If a message class is
+    specified without a value (`fusion_engine`), or with `*`, all messages of that class will be sent.
+
+    If `rate` is specified (in Hz), each message type will be sent at most that often. Additional messages are
+    discarded.
+    """
+
+    logger = logging.getLogger('point_one.p1_runner.output_subscription')
+
+    MESSAGE_CLASSES = ('fusion_engine', 'nmea', 'rtcm')
+    PARAMETERS = MESSAGE_CLASSES + ('rate',)
+
+    def __init__(self, message_ids=None, rate_hz=None):
+        """!
+        @brief Create a subscription.
+
+        @param message_ids A `dict` mapping message class (`fusion_engine`, `nmea`, `rtcm`) to a set of accepted
+               message IDs for that class, or `None` to accept all messages of that class.
+        @param rate_hz If specified, the maximum rate at which each message type will be sent.
+        """
+        self.message_ids = message_ids if message_ids is not None else {}
+        self.min_interval_sec = 1.0 / rate_hz if rate_hz else None
+        self.next_send_time = {}
+
+    def __str__(self):
+        parts = []
+        for message_class, ids in self.message_ids.items():
+            if ids is None:
+                parts.append(message_class)
+            else:
+                parts.append('%s=%s' % (message_class, ','.join(str(i) for i in sorted(ids, key=str))))
+        if self.min_interval_sec is not None:
+            parts.append('rate=%g' % (1.0 / self.min_interval_sec))
+        return ' '.join(parts)
+
+    def matches(self, message_class, message_id, now):
+        """!
+        @brief Check if a message should be sent to this client.
+
+        @param message_class The class of the message (`fusion_engine`, `nmea`, `rtcm`).
+        @param message_id The FusionEngine message type, NMEA sentence ID, or RTCM message number.
+        @param now The current time (in seconds), used to apply the rate limit.
+
+        @return `True` if the message should be sent.
+        """
+        if message_class not in self.message_ids:
+            return False
+
+        ids = self.message_ids[message_class]
+        if ids is not None and message_id not in ids:
+            return False
+
+        if self.min_interval_sec is not None:
+            key = (message_class, message_id)
+            next_time = self.next_send_time.get(key)
+            if next_time is not None and now < next_time:
+                return False
+
+            # Schedule the next message relative to the previous one so the average rate matches the request even if
+            # the messages do not arrive at an exact multiple of the requested interval. If we fell behind, restart
+            # the schedule from now.
+            if next_time is None or now - next_time >= self.min_interval_sec:
+                self.next_send_time[key] = now + self.min_interval_sec
+            else:
+                self.next_send_time[key] = next_time + self.min_interval_sec
+
+        return True
+
+    @classmethod
+    def from_args(cls, args):
+        """!
+        @brief Construct a subscription from a list of `(key, value)` pairs.
+
+        @param args A list of `(key, value)` string tuples, where `value` is a comma-separated list of message IDs,
+               or an empty string.
+
+        @return The @ref OutputSubscription.
+        """
+        message_ids = {}
+        rate_hz = None
+        for key, value in args:
+            key = key.lower()
+            if key == 'rate':
+                rate_hz = float(value)
+                if rate_hz <= 0.0:
+                    raise ValueError('Output rate must be positive.')
+            elif key in cls.MESSAGE_CLASSES:
+                values = [v.strip() for v in value.split(',') if v.strip() != '']
+                if len(values) == 0 or '*' in values:
+                    message_ids[key] = None
+                else:
+                    ids = set(cls._parse_message_id(key, v) for v in values)
+                    if message_ids.get(key, set()) is not None:
+                        message_ids[key] = message_ids.get(key, set()) | ids
+            else:
+                raise ValueError("Unrecognized subscription parameter '%s'." % key)
+
+        if len(message_ids) == 0:
+            raise ValueError('No message types specified.')
+
+        return cls(message_ids=message_ids, rate_hz=rate_hz)
+
+    @classmethod
+    def from_handshake(cls, line):
+        """!
+        @brief Parse a TCP subscription request line (`subscribe KEY[=VALUE] ...`).
+
+        @param line The request string.
+
+        @return The @ref OutputSubscription, or `None` if the line is not a subscription request.
+        """
+        parts = line.strip().split()
+        if len(parts) == 0 or parts[0].lower() != 'subscribe':
+            return None
+
+        return cls.from_args([p.split('=', 1) if '=' in p else (p, '') for p in parts[1:]])
+
+    @classmethod
+    def from_path(cls, path):
+        """!
+        @brief Parse a subscription from the query string in a websocket request path.
+
+        @param path The request path (e.g., `/?fusion_engine=PoseMessage&rate=10`).
+
+        Unlike a TCP subscription request, query parameters that are not part of a subscription are ignored, since
+        they may be used by other applications (e.g., proxies or authentication tokens).
+
+        @return The @ref OutputSubscription, or `None` if the path does not contain any subscription parameters.
+        """
+        args = []
+        for key, value in parse_qsl(urlsplit(path).query, keep_blank_values=True):
+            if key.lower() in cls.PARAMETERS:
+                args.append((key, value))
+            else:
+                cls.logger.debug("Ignoring unrecognized websocket query parameter '%s'." % key)
+
+        if len(args) == 0:
+            return None
+
+        return cls.from_args(args)
+
+    @classmethod
+    def _parse_message_id(cls, message_class, value):
+        if message_class == 'fusion_engine':
+            if value.isdigit():
+                return MessageType(int(value))
+
+            name = value.upper()
+            if name in MessageType.__members__:
+                return MessageType[name]
+
+            for message_type, message_cls in message_type_to_class.items():
+                if message_cls.__name__.upper() == name:
+                    return message_type
+
+            raise ValueError("Unrecognized FusionEngine message type '%s'." % value)
+        elif message_class == 'rtcm':
+            return int(value)
+        else:
+            return value.upper()
@@ -1,3 +1,4 @@
+import asyncio
 from enum import IntEnum
 import logging
 import socket
@@ -59,7 +60,13 @@ class NovatelPosType(IntEnum):
 class ReferenceGenerator(threading.Thread):
     logger = logging.getLogger('point_one.p1_runner.reference_generator')
 
-    def __init__(self, hostname, port, path, format='auto'):
+    def __init__(self, hostname, port, path, format='auto', event_loop=None):
+        """!
+        @brief Record pose messages received from a reference device over TCP.
+
+        @param event_loop If specified, run in an existing event loop, owned by the caller, instead of on a separate
+               thread.
+        """
         super().__init__(name='ref_%s' % hostname)
 
         self.address = (hostname, port)
@@ -86,8 +93,85 @@ class ReferenceGenerator(threading.Thread):
 
         self.num_entries = 0
 
+        self.event_loop = event_loop
+        self.future = None
+
+    def start(self):
+        if self.event_loop is not None:
+            self.future = asyncio.run_coroutine_threadsafe(self.run_async(), loop=self.event_loop)
+        else:
+            super().start()
+
     def stop(self):
         self.shutdown_pending.set()
+        if self.future is not None:
+            self.future.cancel()
+
+    def join(self, timeout=None):
+        if self.event_loop is None:
+            super().join(timeout)
+
+    async def run_async(self):
+        """!
+        @brief Receive data using asyncio streams. This is the event loop equivalent of @ref run().
+        """
+        reader = None
+        writer = None
+        bytes_received = 0
+        try:
+            while not self.shutdown_pending.is_set():
+                # Try to connect to the device.
+                if reader is None:
+                    self.logger.debug('Connecting to tcp://%s:%d...' % self.address)
+                    try:
+                        reader, writer = await asyncio.wait_for(asyncio.open_connection(*self.address), timeout=1.0)
+                        self.logger.debug('Connected to tcp://%s:%d.' % self.address)
+                        bytes_received = 0
+                    except asyncio.TimeoutError:
+                        self.logger.debug('Connection request timed out.')
+                        continue
+                    except ConnectionRefusedError:
+                        self.logger.warning('Connection refused by tcp://%s:%d. Retrying in 5 seconds.' % self.address)
+                        await asyncio.sleep(5.0)
+                        continue
+                    except OSError as e:
+                        self.logger.warning('%s (tcp://%s:%d unreachable). Retrying in 5 seconds.' %
+                                            (str(e), self.address[0], self.address[1]))
+                        await asyncio.sleep(5.0)
+                        continue
+
+                # Read data.
+                try:
+                    received_data = await reader.read(1024)
+                    if len(received_data) == 0:
+                        self.logger.debug('Connection closed remotely.')
+                        writer.close()
+                        reader = None
+                        writer = None
+                        continue
+
+                    bytes_received += len(received_data)
+                    self.logger.trace('Received %d bytes from device. [total_bytes_received=%d]' %
+                                      (len(received_data), bytes_received),
+                                      depth=2)
+
+                    self.decoder.on_data(received_data)
+                except OSError:
+                    # _handle_pose_message() couldn't open the output file. Bail.
+                    break
+        except asyncio.CancelledError:
+            pass
+        finally:
+            # Close the socket.
+            if writer is not None:
+                self.logger.debug('Closing connection. [total_bytes_received=%d, total_entries=%d]' %
+                                  (bytes_received, self.num_entries))
+                writer.close()
+
+            # Close the output file.
+            if self.file is not None:
+                self.file.close()
+                self.file = None
 
     def run(self):
         self.sock = None
@@ -0,0 +1,285 @@
+import logging
+import os
+import struct
+import threading
+import time
+import traceback
+
+from .log_index import IndexRecordType, LogIndex, LogIndexWriter
+
+
+def parse_replay_speed(spec):
+    """!
+    @brief Parse a replay speed specification.
+
+    @param spec One of:
+           - `realtime` - Replay data at the rate it was originally received
+           - `max` - Replay data as fast as possible
+           - `N` or `Nx` - Replay data at N times real time (e.g., `4x`)
+
+    @return The speed multiplier, or `None` to replay as fast as possible.
+    """
+    spec = spec.strip().lower()
+    if spec == 'realtime':
+        return 1.0
+    elif spec == 'max':
+        return None
+
+    try:
+        speed = float(spec[:-1] if spec.endswith('x') else spec)
+    except ValueError:
+        raise ValueError("Invalid replay speed '%s'." % spec)
+
+    if speed <= 0.0:
+        raise ValueError("Invalid replay speed '%s'." % spec)
+    return speed
+
+
+class DataReplay(threading.Thread):
+    """!
+    @brief Read recorded data from a file and pass it to a callback, paced using the original receive times.
+
+    If an index file (`path.index`, see @ref LogIndexWriter) is present, the data is replayed in the same blocks in
+    which it was originally received, using the recorded host receive time of each block. Otherwise, if a timestamp
+    file (`path.timestamps`, see @ref LogManager) is present, the data is paced using the recorded write times. If
+    neither is present, the data is replayed as fast as possible.
+
+    The replay may be run on its own thread using @ref start(), on the calling thread using @ref replay(), or driven
+    externally (e.g., by an event loop) using @ref iter_blocks() and @ref finish().
+
+    When replay finishes, the replay throughput is reported, so this may also be used to benchmark the processing of
+    the data.
+    """
+    logger = logging.getLogger('point_one.p1_runner.replay')
+
+    # The block size to use when the original receive times are not known.
+    DEFAULT_BLOCK_SIZE_BYTES = 64 * 1024
+
+    TIMESTAMPS_FILE_EXTENSION = '.timestamps'
+
+    def __init__(self, path, data_callback=None, speed=1.0, name='replay'):
+        """!
+        @brief Create a replay source.
+
+        @param path The path to the recorded data file.
+        @param data_callback A function to be called with each block of data.
+        @param speed The replay speed multiplier (1.0 for real time), or `None` to replay as fast as possible.
+        @param name The name of the replay thread.
+        """
+        super().__init__(name=name)
+
+        self.path = path
+        self.data_callback = data_callback
+        self.speed = speed
+
+        self.bytes_replayed = 0
+        self.blocks_replayed = 0
+        self.start_time = None
+        self.end_time = None
+        # The amount of time spanned by the replayed data, based on the original receive times.
+        self.data_duration_sec = None
+
+        self.shutdown_pending = threading.Event()
+
+    def set_data_callback(self, callback):
+        self.data_callback = callback
+
+    def stop(self):
+        self.shutdown_pending.set()
+
+    def get_stats(self):
+        """!
+        @brief Get the replay statistics.
+
+        @return A `dict` containing the number of bytes and blocks replayed, the elapsed time, the throughput (bytes
+                per second), and the replay speed relative to real time (if known).
+        """
+        if self.start_time is None:
+            elapsed_sec = 0.0
+        else:
+            elapsed_sec = (self.end_time if self.end_time is not None else time.monotonic()) - self.start_time
+
+        return {
+            'bytes': self.bytes_replayed,
+            'blocks': self.blocks_replayed,
+            'elapsed_sec': elapsed_sec,
+            'bytes_per_sec': self.bytes_replayed / elapsed_sec if elapsed_sec > 0.0 else 0.0,
+            'speed': self.data_duration_sec / elapsed_sec if self.data_duration_sec and elapsed_sec > 0.0 else None,
+        }
+
+    def run(self):
+        self.replay()
+
+    def replay(self):
+        """!
+        @brief Replay the data on the calling thread, blocking until all data has been replayed or @ref stop() is
+               called.
+        """
+        for data, send_time_sec in self.iter_blocks():
+            # Wait until it is time to send the next block.
+            if send_time_sec is not None:
+                delay_sec = send_time_sec - time.monotonic()
+                if delay_sec > 0.0 and self.shutdown_pending.wait(delay_sec):
+                    break
+
+            if self.shutdown_pending.is_set():
+                break
+
+            if self.data_callback is not None:
+                self.data_callback(data)
+
+        self.finish()
+
+    def iter_blocks(self):
+        """!
+        @brief Read the data to be replayed, one block at a time.
+
+        The caller is responsible for waiting until the requested send time before processing each block, and for
+        calling @ref finish() when done. Blocks are counted as replayed when the next block is requested.
+
+        @return A generator yielding a `(data, send_time_sec)` tuple for each block, where `send_time_sec` is the host
+                monotonic time (in seconds) at which the block should be sent, or `None` to send it immediately.
+        """
+        try:
+            blocks = self._load_blocks()
+        except (IOError, OSError):
+            self.logger.error("Unable to read replay data from '%s':\r%s" % (self.path, traceback.format_exc()))
+            return
+
+        self.logger.info("Replaying data from '%s'. [speed=%s]" %
+                         (self.path, 'max' if self.speed is None else '%gx' % self.speed))
+
+        self.start_time = time.monotonic()
+        self.end_time = None
+        first_block_time_sec = None
+        with open(self.path, 'rb') as f:
+            for offset, size, block_time_sec in blocks:
+                send_time_sec = None
+                if block_time_sec is not None:
+                    if first_block_time_sec is None:
+                        first_block_time_sec = block_time_sec
+                    self.data_duration_sec = block_time_sec - first_block_time_sec
+
+                    if self.speed is not None:
+                        send_time_sec = self.start_time + self.data_duration_sec / self.speed
+
+                if offset is not None and f.tell() != offset:
+                    f.seek(offset)
+                data = f.read(size)
+                if len(data) == 0:
+                    break
+
+                yield data, send_time_sec
+                self.bytes_replayed += len(data)
+                self.blocks_replayed += 1
+
+    def finish(self):
+        """!
+        @brief Stop the replay timer and report the replay throughput.
+        """
+        if self.start_time is None:
+            return
+
+        self.end_time = time.monotonic()
+        stats = self.get_stats()
+        self.logger.info('Replay %s. [%d bytes, %d blocks, elapsed=%.2f sec, throughput=%.2f MB/s%s]' %
+                         ('stopped' if self.shutdown_pending.is_set() else 'complete', stats['bytes'],
+                          stats['blocks'], stats['elapsed_sec'], stats['bytes_per_sec'] / 1e6,
+                          (', speed=%.1fx' % stats['speed']) if stats['speed'] is not None else ''))
+
+    def _load_blocks(self):
+        """!
+        @brief Get the location and original receive time of each block of data to be replayed.
+
+        @return An iterable of `(offset, size, time_sec)` tuples. `offset` and `time_sec` may be `None` if not known.
+        """
+        index_path = self.path + LogIndexWriter.FILE_EXTENSION
+        timestamps_path = self.path + self.TIMESTAMPS_FILE_EXTENSION
+        if os.path.exists(index_path):
+            index = LogIndex.from_file(index_path)
+            records = index.get_records(record_type=IndexRecordType.DATA)
+            self.logger.debug('Loaded %d data blocks from %s.' % (len(records), index_path))
+            return [(r.offset, r.size, r.host_time_ns * 1e-9) for r in records]
+        elif os.path.exists(timestamps_path):
+            blocks = self._load_timestamps(timestamps_path, os.path.getsize(self.path))
+            self.logger.debug('Loaded %d data blocks from %s.' % (len(blocks), timestamps_path))
+            return blocks
+        else:
+            self.logger.warning('No receive times found for %s. Replaying as fast as possible.' % self.path)
+            file_size = os.path.getsize(self.path)
+            return ((None, min(self.DEFAULT_BLOCK_SIZE_BYTES, file_size - offset), None)
+                    for offset in range(0, file_size, self.DEFAULT_BLOCK_SIZE_BYTES))
+
+    @classmethod
+    def _load_timestamps(cls, path, file_size):
+        """!
+        @brief Read the blocks of data described by a @ref LogManager timestamp file.
+
+        The file contains a pair of 32-bit integers for each write: the time since the start of the log (in
+        milliseconds) and the byte offset of the end of the written data within the data file. Each block spans from
+        the end of the previous entry (or the start of the file) to the end offset of its own entry. Any data following
+        the last entry is sent with the last entry.
+        """
+        entry_size = struct.calcsize('II')
+        with open(path, 'rb') as f:
+            content = f.read()
+        content = content[:len(content) - len(content) % entry_size]
+
+        # Both values are stored modulo 2^32. Unwrap them so they increase monotonically.
+        entries = []
+        prev_ms = 0
+        prev_offset = 0
+        for milliseconds, offset in struct.iter_unpack('II', content):
+            if len(entries) > 0:
+                milliseconds += (prev_ms >> 32) << 32
+                if milliseconds < prev_ms:
+                    milliseconds += 2**32
+                offset += (prev_offset >> 32) << 32
+                if offset < prev_offset:
+                    offset += 2**32
+            entries.append((milliseconds, offset))
+            prev_ms, prev_offset = milliseconds, offset
+
+        blocks = []
+        start_offset = 0
+        for milliseconds, end_offset in entries:
+            end_offset = min(end_offset, file_size)
+            if end_offset > start_offset:
+                blocks.append((start_offset, end_offset - start_offset, milliseconds * 1e-3))
+                start_offset = end_offset
+
+        if file_size > start_offset:
+            time_sec = entries[-1][0] * 1e-3 if len(entries) > 0 else None
+            blocks.append((start_offset, file_size - start_offset, time_sec))
+        return blocks
+
+
+class CorrectionsReplay(DataReplay):
+    """!
+    @brief Replay a recorded corrections data stream in place of an @ref NTRIPClient.
+
+    This class provides the same interface as @ref NTRIPClient, so it may be used as the corrections source for a
+    @ref P1Runner. Corrections data is typically recorded by @ref CorrectionsRecorder. Position updates are ignored.
+    """
+
+    def __init__(self, path, data_callback=None, speed=1.0, mountpoint=None):
+        """!
+        @brief Create a replay source.
+
+        @param path The path to the recorded corrections data file.
+        @param data_callback A function to be called with each block of corrections data.
+        @param speed The replay speed multiplier (1.0 for real time), or `None` to replay as fast as possible.
+        @param mountpoint The name to report for the corrections stream. Defaults to the file name.
+        """
+        super().__init__(path, data_callback=data_callback, speed=speed, name='corrections_replay')
+        self.mountpoint = mountpoint if mountpoint is not None else \
+            os.path.splitext(os.path.basename(path))[0].upper()
+
+    def is_connected(self):
+        return False
+
+    def send_position(self, lla_deg, time=None):
+        return False
+
+    def send_nmea(self, message):
+        return False
@@ -1,9 +1,10 @@
-from datetime import datetime, timezone
+from datetime import datetime, timedelta, timezone
 from enum import IntEnum
 import logging
 import math
 import os
 import threading
+import time
 import traceback
 
 from fusion_engine_client.parsers import FusionEngineEncoder, FusionEngineDecoder
@@ -13,13 +14,20 @@ from gpstime import gpstime
 from pynmea2 import NMEASentence
 import serial
 
+from .corrections_framer import CorrectionsFramer
+from .corrections_recorder import CorrectionsRecorder
+from .corrections_writer import CorrectionsWriter
+from .device_reader import DeviceReader
 from .find_serial_device import find_serial_device, PortType
+from .log_index import IndexedMessage, IndexRecordType
 from .log_manager import LogManager
 from .log_manifest import DeviceType
 from .nmea_framer import NMEAFramer
+from .ntrip_caster import NTRIPCaster
 from .ntrip_client import NTRIPClient
 from .output_server import OutputServer
 from .reference_generator import ReferenceGenerator
+from .replay import CorrectionsReplay, DataReplay
 from .rtcm_framer import *
 from .segger_rtt import SeggerRTTCapture
 from .serial_recorder import SerialRecorder
@@ -37,12 +45,30 @@ class P1Runner(threading.Thread):
 
     DEFAULT_DEVICE_ID = 'p1-lg69t'
 
+    OUTPUT_TYPES = ('all', 'fusion_engine', 'nmea', 'legacy_nmea')
+    OUTPUT_MESSAGE_CLASSES = {
+        'all': 'raw',
+        'fusion_engine': 'fusion_engine',
+        'nmea': 'nmea',
+        'legacy_nmea': 'nmea',
+    }
+
     def __init__(self, device_id=None, reset_type='hot',
                  device_port='auto', device_baudrate=460800,
+                 device_read_buffer_bytes=DeviceReader.DEFAULT_BUFFER_SIZE_BYTES, replay_path=None, replay_speed=1.0,
                  corrections_port=None, corrections_baudrate=460800,
+                 corrections_max_queue_bytes=CorrectionsWriter.DEFAULT_MAX_QUEUE_BYTES, frame_corrections=False,
                  external_port=None, external_baudrate=4608000, external_output_path=None, external_corrections=False,
                  logs_base_dir=DEFAULT_LOG_BASE_DIR, log_format='raw', log_created_cmd=None, log_timestamps=False,
+                 log_flush_size_bytes=LogManager.DEFAULT_FLUSH_SIZE_BYTES,
+                 log_flush_interval_sec=LogManager.DEFAULT_FLUSH_INTERVAL_SEC,
+                 log_max_queue_bytes=LogManager.DEFAULT_MAX_QUEUE_BYTES, log_queue_full_policy='drop_oldest',
+                 log_segment_size_bytes=None, log_segment_duration_sec=None, log_index='none', log_corrections=False,
                  output_tcp_address=None, output_websocket_address=None, output_type='fusion_engine',
+                 output_max_client_queue_bytes=OutputServer.DEFAULT_MAX_CLIENT_QUEUE_BYTES,
+                 output_slow_client_policy='drop_oldest', output_batch_interval_sec=None,
+                 ntrip_caster_address=None, ntrip_caster_mountpoint=None, ntrip_caster_device_mountpoint=None,
+                 ntrip_caster_username=None, ntrip_caster_password=None,
                  reference_tcp_address=None, reference_format='p1log',
                  rtt_mode='none', rtt_port=None, rtt_kill_gdbserver=False):
         if device_id is None:
@@ -50,6 +76,22 @@ class P1Runner(threading.Thread):
 
         super().__init__(name='p1_%s' % device_id)
 
+        self.device_id = device_id
+
+        # If set, read device data from a recorded file instead of a serial port. The recorded data was captured after
+        # the device was reset, so no reset is issued.
+        if replay_path is not None:
+            self.device_replay = DataReplay(replay_path, speed=replay_speed, name='%s_replay' % self.name)
+            reset_type = 'none'
+        else:
+            self.device_replay = None
+        # Set when all replay data has been processed.
+        self.replay_complete = threading.Event()
+
+        # The event loop used to run network components (NTRIP, output servers, etc.), if they should share a single
+        # loop. By default, each component runs on its own thread.
+        self.event_loop = self._create_event_loop()
+
         self.reference_tcp_address = reference_tcp_address
         self.reference_generator = None
         self.reference_filename = 'reference.csv' if reference_format == 'csv' else 'reference.p1log'
@@ -60,10 +102,17 @@ class P1Runner(threading.Thread):
                 files.append(self.reference_filename)
             if external_port is not None and external_output_path is not None and external_output_path != '':
                 files.append(external_output_path)
+            if log_corrections:
+                files.extend((CorrectionsRecorder.DEFAULT_FILENAME, CorrectionsRecorder.INDEX_FILENAME))
             logs_base_dir = os.path.expanduser(logs_base_dir)
             self.log_manager = LogManager(
                 device_id=device_id, logs_base_dir=logs_base_dir, files=files, log_extension="." + log_format,
-                log_created_cmd=log_created_cmd, log_timestamps=log_timestamps)
+                log_created_cmd=log_created_cmd, log_timestamps=log_timestamps,
+                flush_size_bytes=log_flush_size_bytes, flush_interval_sec=log_flush_interval_sec,
+                max_queue_bytes=log_max_queue_bytes, queue_full_policy=log_queue_full_policy,
+                segment_size_bytes=log_segment_size_bytes, segment_duration_sec=log_segment_duration_sec,
+                message_aligned_writes=log_format in ('nmea', 'p1log'), log_index=log_index != 'none',
+                index_messages=log_index == 'messages')
 
             if log_format == 'nmea' or log_format == 'p1log':
                 self.log_format = log_format
@@ -73,6 +122,18 @@ class P1Runner(threading.Thread):
             self.log_manager = None
             self.log_format = None
 
+        # If enabled, record incoming corrections data and its receive times in the log, so it can be replayed later
+        # (see CorrectionsReplay).
+        self.log_corrections = self.log_manager is not None and log_corrections
+        self.corrections_recorder = None
+
+        # If enabled, record the location of each FusionEngine, RTCM, and NMEA message in the log index.
+        self.index_messages = self.log_manager is not None and log_index == 'messages'
+
+        # Segmented logs roll over at the start of a FusionEngine message, so we need the location of each FusionEngine
+        # message within the incoming data when splitting a raw (non-.p1log) log into segments.
+        self.locate_fe_messages = self.index_messages or (self.log_format == 'all' and self.log_manager.segmented)
+
         self.external_port = external_port
         self.external_baudrate = external_baudrate
         self.external_output_path = external_output_path
@@ -89,21 +150,49 @@ class P1Runner(threading.Thread):
         #
         # Note: We intentionally do not pass the 'port' argument to the constructor so the serial ports do not open
         # automatically. We'll open them in start() later.
-        device_port = find_serial_device(port_name=device_port, port_type=PortType.STANDARD)
-        self.device_serial = serial.Serial(baudrate=device_baudrate, timeout=1.0)
-        self.device_serial.port = device_port
-
-        if corrections_port is None or corrections_port == device_port or corrections_port == 'auto':
-            self.corrections_serial = self.device_serial
+        #
+        # When replaying recorded data, no serial ports are used, and corrections data is not sent anywhere.
+        if self.device_replay is not None:
+            self.device_serial = None
+            self.corrections_serial = None
+            device_read_buffer_bytes = 0
         else:
-            corrections_port = find_serial_device(port_name=corrections_port, port_type=PortType.ENHANCED)
-            self.corrections_serial = serial.Serial(baudrate=corrections_baudrate, timeout=1.0)
-            self.corrections_serial.port = corrections_port
+            device_port = find_serial_device(port_name=device_port, port_type=PortType.STANDARD)
+            self.device_serial = serial.Serial(baudrate=device_baudrate, timeout=1.0)
+            self.device_serial.port = device_port
+
+            if corrections_port is None or corrections_port == device_port or corrections_port == 'auto':
+                self.corrections_serial = self.device_serial
+            else:
+                corrections_port = find_serial_device(port_name=corrections_port, port_type=PortType.ENHANCED)
+                self.corrections_serial = serial.Serial(baudrate=corrections_baudrate, timeout=1.0)
+                self.corrections_serial.port = corrections_port
+
+        # If enabled, read incoming data from the device on a separate thread so the serial port is serviced even if
+        # processing is delayed.
+        self.device_read_buffer_bytes = device_read_buffer_bytes
+        self.device_reader = None
+
+        # Corrections data is sent to the device on a separate thread so the NTRIP client is never blocked by a slow
+        # serial port.
+        self.corrections_max_queue_bytes = corrections_max_queue_bytes
+        self.corrections_writer = None
+
+        # If enabled, only forward complete, CRC-valid RTCM frames to the device, and collect statistics for each
+        # incoming RTCM message type.
+        self.corrections_framer = CorrectionsFramer() if frame_corrections else None
+        # If set, the framer is shared with other runners, and incoming data is framed by its owner (see
+        # set_shared_corrections_framer()).
+        self.corrections_framer_shared = False
 
         self.ntrip_client = None
+        # If set, the NTRIP client is shared with other runners and is started/stopped by its owner. Only one runner
+        # should forward its position to the NTRIP server.
+        self.ntrip_client_shared = False
+        self.forward_ntrip_position = True
         self.ntrip_position_override = None
         self.last_ntrip_position_update = None
-        self.nmea_framer = NMEAFramer()
+        self.nmea_framer = NMEAFramer(return_offset=True)
 
         self.rtcm_framer = RTCMFramer()
 
@@ -114,18 +203,46 @@ class P1Runner(threading.Thread):
 
         self.reset_type = reset_type
         self.state = None
+        # The number of bytes passed to the FusionEngine decoder before the reset completed and data logging began.
+        self.fe_decoder_reset_bytes = 0
 
-        if output_tcp_address is not None or output_websocket_address is not None:
-            self.output_server = OutputServer(tcp_address=output_tcp_address,
-                                              websocket_address=output_websocket_address,
-                                              legacy_nmea=output_type == 'legacy_nmea')
-            if output_type == 'legacy_nmea':
-                self.output_type = 'nmea'
-            else:
-                self.output_type = output_type
+        # Create a separate output server for each requested TCP/websocket address. Each address may optionally
+        # specify its own output type. All servers are fed from a single pass through the incoming data.
+        #
+        # Note: Clients may request specific message types when they connect. Clients that do not will receive the
+        # output type for the server.
+        self.output_servers = []
+        for protocol, addresses in (('tcp', output_tcp_address), ('websocket', output_websocket_address)):
+            for address in self._get_output_addresses(addresses):
+                stream_type = address[2] if len(address) > 2 and address[2] is not None else output_type
+                address = tuple(address[:2])
+                self.output_servers.append(self._create_output_server(
+                    tcp_address=address if protocol == 'tcp' else None,
+                    websocket_address=address if protocol == 'websocket' else None,
+                    legacy_nmea=stream_type == 'legacy_nmea',
+                    max_client_queue_bytes=output_max_client_queue_bytes,
+                    slow_client_policy=output_slow_client_policy,
+                    default_message_class=self.OUTPUT_MESSAGE_CLASSES[stream_type]))
+
+        # If enabled, re-serve incoming NTRIP corrections data to other NTRIP clients (e.g., other vehicles) using a
+        # local NTRIP caster. The corrections mountpoint defaults to the name of the upstream mountpoint. RTCM output
+        # from the device may optionally be served on a separate mountpoint.
+        if ntrip_caster_address is not None:
+            self.ntrip_caster = NTRIPCaster(tuple(ntrip_caster_address[:2]), username=ntrip_caster_username,
+                                            password=ntrip_caster_password,
+                                            slow_client_policy=output_slow_client_policy, event_loop=self.event_loop)
+            if ntrip_caster_device_mountpoint is not None:
+                self.ntrip_caster.add_mountpoint(ntrip_caster_device_mountpoint)
         else:
-            self.output_server = None
-            self.output_type = None
+            self.ntrip_caster = None
+        self.ntrip_caster_mountpoint = ntrip_caster_mountpoint
+        self.ntrip_caster_device_mountpoint = ntrip_caster_device_mountpoint
+
+        # If enabled, combine individual FusionEngine/NMEA output messages into a single buffer and send them to the
+        # output clients all at once. If the interval is 0, all messages decoded from a single read are combined.
+        self.output_batch_interval_sec = output_batch_interval_sec
+        self.output_batch = []
+        self.output_batch_start_time = None
 
         self.shutdown_pending = threading.Event()
 
@@ -141,6 +258,8 @@ class P1Runner(threading.Thread):
 
         self.start_time = None
         self.last_status_time = None
+        # The interval at which to print a data status update, or `None` to disable.
+        self.status_interval_sec = 5.0
         self.last_text_ui_p1_time = None
         self.last_ntrip_position_update = None
 
@@ -151,31 +270,58 @@ class P1Runner(threading.Thread):
 
     def start(self):
         self.rtcm_framer.reset()
+        if self.corrections_framer is not None and not self.corrections_framer_shared:
+            self.corrections_framer.reset()
         self.state = State.WAITING_FOR_DATA if self.reset_type != 'none' else State.RESET_COMPLETE
 
-        self.logger.info('Connecting to device using serial port %s.' % self.device_serial.port)
-        self.logger.debug('Opening device serial port. [port=%s]' % self.device_serial.port)
-        self.device_serial.open()
-        if self.device_serial.port != self.corrections_serial.port:
-            self.logger.debug('Opening corrections serial port. [port=%s]' % self.corrections_serial.port)
-            self.corrections_serial.open()
+        if self.device_replay is not None:
+            self.logger.info("Replaying device data from '%s'." % self.device_replay.path)
+            self.replay_complete.clear()
         else:
-            self.logger.debug('Sending corrections on device serial port. [port=%s]' % self.device_serial.port)
-            self.corrections_serial = self.device_serial
+            self.logger.info('Connecting to device using serial port %s.' % self.device_serial.port)
+            self.logger.debug('Opening device serial port. [port=%s]' % self.device_serial.port)
+            self.device_serial.open()
+            if self.device_serial.port != self.corrections_serial.port:
+                self.logger.debug('Opening corrections serial port. [port=%s]' % self.corrections_serial.port)
+                self.corrections_serial.open()
+            else:
+                self.logger.debug('Sending corrections on device serial port. [port=%s]' % self.device_serial.port)
+                self.corrections_serial = self.device_serial
 
-        if self.output_server is not None:
+            self.corrections_writer = CorrectionsWriter(self.corrections_serial.write,
+                                                        name='%s_corrections' % self.name,
+                                                        max_queue_bytes=self.corrections_max_queue_bytes)
+            self.corrections_writer.start()
+
+        for output_server in self.output_servers:
             self.logger.debug('Starting output server.')
-            self.output_server.start()
+            output_server.start()
+
+        if self.ntrip_caster is not None:
+            if self.ntrip_client is not None:
+                if self.ntrip_caster_mountpoint is None:
+                    self.ntrip_caster_mountpoint = self.ntrip_client.mountpoint
+                self.ntrip_caster.add_mountpoint(self.ntrip_caster_mountpoint)
+            elif self.ntrip_caster_device_mountpoint is None:
+                self.logger.warning('NTRIP caster enabled, but no corrections source or device mountpoint specified.')
+            self.logger.debug('Starting NTRIP caster.')
+            self.ntrip_caster.start()
 
         if self.log_manager is not None:
             self.logger.debug('Starting log manager.')
             self.log_manager.start()
 
+            if self.log_corrections:
+                self.logger.debug('Starting corrections recorder.')
+                self.corrections_recorder = CorrectionsRecorder(
+                    self.log_manager.get_abs_file_path(CorrectionsRecorder.DEFAULT_FILENAME))
+                self.corrections_recorder.start()
+
             if self.reference_tcp_address is not None:
                 self.logger.debug('Starting reference file generator.')
                 self.reference_generator = ReferenceGenerator(
                     hostname=self.reference_tcp_address[0], port=self.reference_tcp_address[1],
-                    path=self.log_manager.get_abs_file_path(self.reference_filename))
+                    path=self.log_manager.get_abs_file_path(self.reference_filename), event_loop=self.event_loop)
                 self.reference_generator.start()
         else:
             self.logger.debug('Logging disabled.')
@@ -194,7 +340,7 @@ class P1Runner(threading.Thread):
                                                force_kill_gdbserver=self.rtt_kill_gdbserver)
             self.rtt_client.start()
 
-        if self.ntrip_client is not None:
+        if self.ntrip_client is not None and not self.ntrip_client_shared:
             self.logger.debug('Starting NTRIP corrections stream.')
             self.ntrip_client.start()
 
@@ -210,7 +356,9 @@ class P1Runner(threading.Thread):
         self.nmea_framer.reset()
 
         self.fe_encoder = FusionEngineEncoder()
-        self.fe_decoder = FusionEngineDecoder(max_payload_len_bytes=4096, warn_on_unrecognized=False, return_bytes=True)
+        self.fe_decoder = FusionEngineDecoder(max_payload_len_bytes=4096, warn_on_unrecognized=False, return_bytes=True,
+                                              return_offset=self.locate_fe_messages)
+        self.fe_decoder_reset_bytes = 0
         self.fe_decoder.add_callback(PoseMessage.MESSAGE_TYPE, self._handle_pose)
         self.fe_decoder.add_callback(CommandResponseMessage.MESSAGE_TYPE, self._handle_cmd_response)
         self.fe_decoder.add_callback(CalibrationStatus.MESSAGE_TYPE, self._handle_calibration_status)
@@ -226,6 +374,12 @@ class P1Runner(threading.Thread):
                                                            output_path=self.external_output_path)
             self.external_serial_recorder.start()
 
+        if self.device_read_buffer_bytes:
+            self.logger.debug('Starting device reader thread. [buffer_size=%d B]' % self.device_read_buffer_bytes)
+            self.device_reader = DeviceReader(self.device_serial, buffer_size_bytes=self.device_read_buffer_bytes,
+                                              name='%s_reader' % self.name)
+            self.device_reader.start()
+
         self.shutdown_pending.clear()
         super().start()
 
@@ -234,10 +388,22 @@ class P1Runner(threading.Thread):
             self.logger.debug('Shutting down runner.')
             self.shutdown_pending.set()
 
-            if self.output_server is not None:
-                self.output_server.stop()
+            if self.device_replay is not None:
+                self.device_replay.stop()
 
-            if self.ntrip_client is not None:
+            if self.device_reader is not None:
+                self.device_reader.stop()
+
+            if self.corrections_writer is not None:
+                self.corrections_writer.stop()
+
+            for output_server in self.output_servers:
+                output_server.stop()
+
+            if self.ntrip_caster is not None:
+                self.ntrip_caster.stop()
+
+            if self.ntrip_client is not None and not self.ntrip_client_shared:
                 self.ntrip_client.stop()
 
             if self.rtt_client is not None:
@@ -246,6 +412,9 @@ class P1Runner(threading.Thread):
             if self.log_manager is not None:
                 self.log_manager.stop()
 
+            if self.corrections_recorder is not None:
+                self.corrections_recorder.stop()
+
             if self.reference_generator is not None:
                 self.logger.debug('Stopping reference file generator.')
                 self.reference_generator.stop()
@@ -255,32 +424,113 @@ class P1Runner(threading.Thread):
 
     def join(self, timeout=None):
         super().join(timeout)
-        if self.output_server is not None:
-            self.output_server.join()
-        if self.ntrip_client is not None:
+        if self.device_reader is not None:
+            self.device_reader.join(timeout)
+        if self.corrections_writer is not None:
+            self.corrections_writer.join(timeout)
+        for output_server in self.output_servers:
+            output_server.join()
+        if self.ntrip_caster is not None:
+            self.ntrip_caster.join(timeout)
+        if self.ntrip_client is not None and not self.ntrip_client_shared:
             self.ntrip_client.join(timeout)
         if self.rtt_client is not None:
             self.rtt_client.join(timeout)
         if self.log_manager is not None:
             self.log_manager.join(timeout)
+        if self.corrections_recorder is not None:
+            self.corrections_recorder.join(timeout)
         if self.reference_generator is not None:
             self.reference_generator.join(timeout)
+        if self.external_serial_recorder is not None:
+            self.external_serial_recorder.join(timeout)
 
-        self.device_serial.close()
-        if self.corrections_serial.is_open:
+        if self.device_serial is not None:
+            self.device_serial.close()
+        if self.corrections_serial is not None and self.corrections_serial.is_open:
             self.corrections_serial.close()
 
     def connect_to_ntrip(self, url=None, mountpoint=None, username=None, password=None, version=2):
-        if self.ntrip_client is not None:
-            self.ntrip_client.stop()
-            self.ntrip_client.join()
-
         self.logger.debug('Configuring NTRIP corrections stream. [url=%s, ntrip_version=%d, mountpoint=%s]' %
                           (url, version, mountpoint))
-        self.ntrip_client = NTRIPClient(url=url, mountpoint=mountpoint, username=username, password=password,
-                                        data_callback=self._on_corrections, version=version)
-        if self.is_alive():
-            self.ntrip_client.start()
+        self._set_ntrip_client(NTRIPClient(url=url, mountpoint=mountpoint, username=username, password=password,
+                                           data_callback=self._on_corrections, version=version,
+                                           event_loop=self.event_loop))
+
+    def replay_corrections(self, path, speed=1.0):
+        """!
+        @brief Send recorded corrections data to the device instead of connecting to an NTRIP server.
+
+        @param path The path to a corrections data file, typically recorded by @ref CorrectionsRecorder.
+        @param speed The replay speed multiplier (1.0 for real time), or `None` to replay as fast as possible.
+        """
+        self.logger.debug("Configuring corrections replay. [path='%s', speed=%s]" % (path, speed))
+        self._set_ntrip_client(CorrectionsReplay(path, data_callback=self._on_corrections, speed=speed))
+
+    def set_shared_ntrip_client(self, ntrip_client, forward_position=True):
+        """!
+        @brief Use an NTRIP client owned by the caller (e.g., shared by multiple devices).
+
+        The caller is responsible for starting and stopping the client, and for passing incoming corrections data to
+        @ref send_corrections().
+
+        @param ntrip_client The @ref NTRIPClient to use.
+        @param forward_position If `True`, send the position of this device to the NTRIP server periodically.
+        """
+        self.ntrip_client = ntrip_client
+        self.ntrip_client_shared = True
+        self.forward_ntrip_position = forward_position
+
+    def set_shared_corrections_framer(self, corrections_framer):
+        """!
+        @brief Use a @ref CorrectionsFramer owned by the caller (e.g., shared by multiple devices).
+
+        Has no effect if corrections framing is not enabled for this device. Otherwise, the caller is responsible for
+        framing incoming corrections data and passing the result to @ref send_corrections(). The RTCM statistics
+        reported for this device are those of the shared framer.
+
+        @param corrections_framer The @ref CorrectionsFramer to use.
+        """
+        if self.corrections_framer is not None:
+            self.corrections_framer = corrections_framer
+            self.corrections_framer_shared = True
+
+    def send_corrections(self, data, framed_data=None):
+        """!
+        @brief Send corrections data to the device.
+
+        @param data The received corrections data.
+        @param framed_data If using a shared corrections framer (see @ref set_shared_corrections_framer()), the
+               complete RTCM frames returned by the framer for `data`.
+        """
+        self._on_corrections(data, framed_data=framed_data)
+
+    def get_stats(self):
+        """!
+        @brief Get data reception statistics for this device.
+
+        @return A `dict` containing the number of bytes received from the device, the number of FusionEngine and NMEA
+                bytes received, the number of corrections bytes sent to the device, the number of navigation epochs,
+                the number of bytes dropped by the logger, device reader, output clients, and corrections writer, the
+                number of invalid (non-RTCM) corrections bytes discarded, and the maximum corrections write latency.
+        """
+        return {
+            'device_id': self.device_id,
+            'bytes_received': self.total_bytes_received['all'],
+            'fe_bytes': self.total_bytes_received['fe'],
+            'nmea_bytes': self.total_bytes_received['nmea'],
+            'corrections_bytes': self.total_bytes_received['corrections'],
+            'epochs': self.fe_positions_received,
+            'log_dropped_bytes': self.log_manager.bytes_dropped if self.log_manager is not None else 0,
+            'rx_overrun_bytes': self.device_reader.overrun_bytes if self.device_reader is not None else 0,
+            'output_dropped_bytes': sum(stats['bytes_dropped'] for stats in self._get_output_client_stats()),
+            'corrections_dropped_bytes': self.corrections_writer.bytes_dropped
+            if self.corrections_writer is not None else 0,
+            'corrections_discarded_bytes': self.corrections_framer.bytes_discarded
+            if self.corrections_framer is not None else 0,
+            'corrections_max_latency_sec': self.corrections_writer.max_latency_sec
+            if self.corrections_writer is not None else 0.0,
+        }
 
     def set_ntrip_position_override(self, lla_deg):
         self.logger.debug('Overriding NTRIP position. [%.8f, %.8f, %.2f]' % tuple(lla_deg))
@@ -290,29 +540,60 @@ class P1Runner(threading.Thread):
                 self.last_ntrip_position_update = datetime.now(tz=timezone.utc)
 
     def run(self):
+        if self.device_replay is not None:
+            self._run_replay()
+            return
+
         while not self.shutdown_pending.is_set():
-            # Read all pending data, or block until at least 1 byte comes in.
-            try:
-                data = self.device_serial.read(self.device_serial.in_waiting or 1)
-            except serial.SerialException as e:
-                self.logger.error('Unexpected error reading from device:\r%s' % traceback.format_exc())
-                break
+            # Read the next block of data received by the reader thread, or all pending data from the serial port.
+            # Block until at least 1 byte comes in.
+            if self.device_reader is not None:
+                data, host_time_ns = self.device_reader.read(timeout=self.device_serial.timeout)
+                if len(data) == 0 and not self.device_reader.is_alive():
+                    break
+            else:
+                try:
+                    data = self.device_serial.read(self.device_serial.in_waiting or 1)
+                    host_time_ns = None
+                except serial.SerialException as e:
+                    self.logger.error('Unexpected error reading from device:\r%s' % traceback.format_exc())
+                    break
 
             if len(data) > 0:
                 self.last_data_timeout_warning_time = None
-                self._on_data(data)
+                self._on_data(data, host_time_ns=host_time_ns)
             else:
-                now = datetime.now()
-                if self.last_data_timeout_warning_time is None:
-                    self.last_data_timeout_warning_time = now - timedelta(seconds=self.device_serial.timeout)
-                elif (now - self.last_data_timeout_warning_time).total_seconds() > 5.0:
-                    self.logger.warning("Timed out waiting for data on %s." % self.device_serial.port)
-                    self.last_data_timeout_warning_time = now
-
-            if self.external_serial_recorder is not None:
-                self.external_serial_recorder.run()
-
-    def _on_data(self, data):
+                self._on_read_timeout()
+
+    def _run_replay(self):
+        # Process the replay data on this thread, exactly as if it had been read from the device.
+        self.device_replay.set_data_callback(self._on_data)
+        self.device_replay.replay()
+        if not self.shutdown_pending.is_set():
+            self._on_replay_complete()
+
+        # Wait for the user to stop the runner.
+        self.shutdown_pending.wait()
+
+    def _on_replay_complete(self):
+        if len(self.output_batch) > 0:
+            self._flush_output(force=True)
+        self.replay_complete.set()
+
+    def _on_read_timeout(self):
+        # If data stopped arriving in the middle of an output batch, send the batch now. Otherwise, warn if we have not
+        # received data in a while.
+        if len(self.output_batch) > 0:
+            self._flush_output(force=True)
+        else:
+            now = datetime.now()
+            if self.last_data_timeout_warning_time is None:
+                self.last_data_timeout_warning_time = now - timedelta(seconds=self.device_serial.timeout)
+            elif (now - self.last_data_timeout_warning_time).total_seconds() > 5.0:
+                self.logger.warning("Timed out waiting for data on %s." % self.device_serial.port)
+                self.last_data_timeout_warning_time = now
+
+    def _on_data(self, data, host_time_ns=None):
         self.logger.trace('Received %d bytes from device.' % len(data), depth=2)
 
         # If we just started and this is the first data we've gotten, we can now assume the device is connected. Issue
@@ -322,17 +603,21 @@ class P1Runner(threading.Thread):
             self.state = State.RESET_SENT
             return
         elif self.state == State.RESET_SENT:
-            while not self.state == State.RESET_COMPLETE:
-                # Pass one byte at a time into the FusionEngine decoder. This
-                # will pull out FusionEngine messages from the mixed data coming
-                # over the serial port. When a reset response message is decoded
-                # it will trigger the callback function @ref
-                # _handle_cmd_response(). This function updates the state to
-                # escape this loop with any data remaining.
-                self.fe_decoder.on_data(data[0])
-                data = data[1:]
-                if len(data) == 0:
+            # Pass one byte at a time into the FusionEngine decoder. This will pull out FusionEngine messages from the
+            # mixed data coming over the serial port. When a reset response message is decoded it will trigger the
+            # callback function @ref _handle_cmd_response(), which updates the state to escape this loop.
+            #
+            # We step through the data with an index rather than slicing off one byte at a time, so the remaining data
+            # is only copied once, after the response is found, instead of on every byte.
+            for i in range(len(data)):
+                self.fe_decoder.on_data(data[i])
+                if self.state == State.RESET_COMPLETE:
+                    # Process any data remaining after the response normally below.
+                    self.fe_decoder_reset_bytes += i + 1
+                    data = data[i + 1:]
                     break
+            else:
+                self.fe_decoder_reset_bytes += len(data)
 
             # If we are still waiting for a reset response, return and skip all data processing below.
             if not self.state == State.RESET_COMPLETE:
@@ -343,17 +628,38 @@ class P1Runner(threading.Thread):
                 return
 
         # If we get this far, the device reset is now complete and we can begin processing data.
+        data_offset = self.total_bytes_received['all']
         self.total_bytes_received['all'] += len(data)
 
         # If we are logging data and we are _not_ using .p1log format (i.e., recording only FusionEngine messages),
-        # store the data now before attempting to process it further.
+        # store the data now before attempting to process it further. If we are indexing messages in the log or
+        # splitting it into segments, we need to frame the data first, so we'll store the data at the end.
         #
         # Similarly, if we are relaying all incoming data to TCP, do so now.
-        if self.log_format == 'all':
-            self.log_manager.write(data)
+        if self.log_format == 'all' and self.locate_fe_messages:
+            index_messages = []
+        else:
+            index_messages = None
+            if self.log_format == 'all':
+                self.log_manager.write(data, host_time_ns=host_time_ns)
+
+        # Check which types of messages have been requested by output clients. Messages are only framed and sent to
+        # the output servers once, regardless of the number of servers. Each server then selects the messages
+        # requested by its clients.
+        if len(self.output_servers) > 0:
+            output_raw = any(s.is_subscribed('raw') for s in self.output_servers)
+            output_fe = any(s.is_subscribed('fusion_engine') for s in self.output_servers)
+            output_nmea = any(s.is_subscribed('nmea') for s in self.output_servers)
+            output_rtcm = any(s.is_subscribed('rtcm') for s in self.output_servers)
+        else:
+            output_raw = False
+            output_fe = False
+            output_nmea = False
+            output_rtcm = False
 
-        if self.output_type == 'all':
-            self.output_server.send(data)
+        if output_raw:
+            for output_server in self.output_servers:
+                output_server.send(data)
 
         # Run the data through the FusionEngine decoder, which will call the registered _handle_*() functions as
         # messages arrive.
@@ -368,33 +674,60 @@ class P1Runner(threading.Thread):
                               (str(entry[0].message_type), len(entry[2])))
             self.total_bytes_received['fe'] += len(entry[2])
             if self.log_format == 'p1log':
-                self.log_manager.write(entry[2])
-            if self.output_type == 'fusion_engine':
-                self.output_server.send(entry[2])
+                self.log_manager.write(entry[2], messages=[self._make_fe_index_entry(0, entry)]
+                                       if self.index_messages else None, host_time_ns=host_time_ns)
+            elif index_messages is not None:
+                # Note: The decoder's offset includes any data received before the reset completed, which was not
+                # logged.
+                offset = entry[3] - self.fe_decoder_reset_bytes - data_offset
+                index_messages.append(self._make_fe_index_entry(offset, entry))
+            if output_fe:
+                self._send_output(entry[2], 'fusion_engine', entry[0].message_type)
 
         # Run the data through the RTCM framer and print out incoming message IDs. In the future, we may handle some
         # incoming message types (e.g., Point One diagnostic messages).
-        if self.logger.isEnabledFor(logging.TRACE):
-            results = self.rtcm_framer.on_data(data, return_size=True)
+        #
+        # If enabled, send the RTCM messages to any clients connected to the device mountpoint on the NTRIP caster.
+        trace_rtcm = self.logger.isEnabledFor(logging.TRACE)
+        caster_rtcm = self.ntrip_caster is not None and self.ntrip_caster_device_mountpoint is not None and \
+            self.ntrip_caster.has_clients(self.ntrip_caster_device_mountpoint)
+        index_rtcm_nmea = index_messages is not None and self.index_messages
+        if trace_rtcm or index_rtcm_nmea or output_rtcm or caster_rtcm:
+            results = self.rtcm_framer.on_data(data, return_size=True, return_bytes=output_rtcm or caster_rtcm,
+                                               return_offset=True)
+            if caster_rtcm and len(results) > 0:
+                self.ntrip_caster.send(self.ntrip_caster_device_mountpoint, b''.join(e['bytes'] for e in results))
+
             for entry in results:
-                self.logger.trace('Received RTCM %d message. [size=%d B]' %
-                                  (entry['message'].message_id, entry['size']))
-                if isinstance(entry['message'].payload, bytes):
-                    payload_str = ''.join(''.join(['\\x%02X' % b for b in entry['message'].payload]))
-                else:
-                    payload_str = repr(entry['message'].payload)
-                self.logger.trace('Payload: %s' % payload_str, depth=2)
+                if output_rtcm:
+                    self._send_output(entry['bytes'], 'rtcm', entry['message'].message_id)
+
+                if index_rtcm_nmea:
+                    index_messages.append(IndexedMessage(entry['offset'] - data_offset, IndexRecordType.RTCM,
+                                                         entry['message'].message_id or 0, entry['size']))
+
+                if trace_rtcm:
+                    self.logger.trace('Received RTCM %s message. [size=%d B]' %
+                                      (entry['message'].message_id, entry['size']))
+                    if isinstance(entry['message'].payload, bytes):
+                        payload_str = ''.join(''.join(['\\x%02X' % b for b in entry['message'].payload]))
+                    else:
+                        payload_str = repr(entry['message'].payload)
+                    self.logger.trace('Payload: %s' % payload_str, depth=2)
 
         # Frame the NMEA data, then log/forward it if requested, and print out GGA for debugging.
-        for msg in self.nmea_framer.on_data(data):
+        for msg, offset in self.nmea_framer.on_data(data):
             self.logger.trace('Received NMEA message: %s' % msg.strip())
             self.total_bytes_received['nmea'] += len(msg)
 
             # If we are logging NMEA or forwarding incoming NMEA data to TCP, do so now.
             if self.log_format == 'nmea':
-                self.log_manager.write(msg)
-            if self.output_type == 'nmea':
-                self.output_server.send(msg)
+                self.log_manager.write(msg, messages=[IndexedMessage(0, IndexRecordType.NMEA, size=len(msg))]
+                                       if self.index_messages else None, host_time_ns=host_time_ns)
+            elif index_rtcm_nmea:
+                index_messages.append(IndexedMessage(offset - data_offset, IndexRecordType.NMEA, size=len(msg)))
+            if output_nmea:
+                self._send_output(msg, 'nmea', NMEAFramer.get_sentence_id(msg))
 
             if msg[0] == '$' and msg[3:7] == 'GGA,':
                 # Print the GGA string for debug purposes.
@@ -412,32 +745,143 @@ FusionEngine data not detected on %s.
 
 Are you using the correct UART/COM port (--device-port)?
 ////////////////////////////////////////////////////////////////////////////////
-""" % self.device_serial.port)
+""" % (self.device_serial.port if self.device_serial is not None else self.device_replay.path))
                         self.last_missing_fe_warning_time = now
 
+        if index_messages is not None:
+            self.log_manager.write(data, messages=index_messages, host_time_ns=host_time_ns)
+
+        if len(self.output_batch) > 0:
+            self._flush_output()
+
         # Print a data status update periodically.
         now = datetime.now()
-        if (now - self.last_status_time).total_seconds() > 5.0:
-            self.logger.info(
-                '%d bytes received. [# epochs=%d, elapsed=%.1f sec, fusion_engine=%d B, nmea=%d B, corrections=%d B]' %
-                (self.total_bytes_received['all'], self.fe_positions_received, (now - self.start_time).total_seconds(),
-                 self.total_bytes_received['fe'], self.total_bytes_received['nmea'],
-                 self.total_bytes_received['corrections']))
+        if self.status_interval_sec is not None and \
+           (now - self.last_status_time).total_seconds() > self.status_interval_sec:
+            status_str = ('%d bytes received. [# epochs=%d, elapsed=%.1f sec, fusion_engine=%d B, nmea=%d B, '
+                          'corrections=%d B' %
+                          (self.total_bytes_received['all'], self.fe_positions_received,
+                           (now - self.start_time).total_seconds(), self.total_bytes_received['fe'],
+                           self.total_bytes_received['nmea'], self.total_bytes_received['corrections']))
+            if self.log_manager is not None and (self.log_manager.bytes_dropped > 0 or
+                                                 self.log_manager.bytes_spilled > 0):
+                status_str += ', log_dropped=%d B, log_spilled=%d B' % (self.log_manager.bytes_dropped,
+                                                                         self.log_manager.bytes_spilled)
+            if self.device_reader is not None and (self.device_reader.overrun_bytes > 0 or
+                                                   self.device_reader.max_depth_bytes >=
+                                                   self.device_reader.buffer_size_bytes // 10):
+                status_str += ', rx_buffer=%d B (max=%d B), rx_overrun=%d B' % (
+                    self.device_reader.get_depth_bytes(), self.device_reader.max_depth_bytes,
+                    self.device_reader.overrun_bytes)
+            if self.corrections_writer is not None and (self.corrections_writer.bytes_dropped > 0 or
+                                                        self.corrections_writer.max_latency_sec >= 1.0):
+                stats = self.corrections_writer.get_stats()
+                status_str += (', corrections_queue=%d B (max=%d B), corrections_latency=%.1f ms (max=%.1f ms), '
+                               'corrections_dropped=%d B' %
+                               (stats['queue_bytes'], stats['max_queue_bytes'], stats['mean_latency_sec'] * 1e3,
+                                stats['max_latency_sec'] * 1e3, stats['bytes_dropped']))
+            if self.corrections_framer is not None:
+                age_sec = self.corrections_framer.get_age_sec()
+                status_str += ', corrections_age=%s' % ('%.1f s' % age_sec if age_sec is not None else 'n/a')
+                if self.corrections_framer.bytes_discarded > 0:
+                    status_str += ', corrections_discarded=%d B' % self.corrections_framer.bytes_discarded
+            for stats in self._get_output_client_stats():
+                if stats['bytes_dropped'] > 0:
+                    status_str += ', %s: lag=%d B, dropped=%d B' % (stats['address'], stats['lag_bytes'],
+                                                                   stats['bytes_dropped'])
+            self.logger.info(status_str + ']')
+            if self.corrections_framer is not None and self.logger.isEnabledFor(logging.DEBUG):
+                self.logger.debug('RTCM corrections: %s' % self.corrections_framer.format_message_stats())
             self.last_status_time = now
 
-    def _on_corrections(self, data):
+    def _on_corrections(self, data, framed_data=None):
         self.logger.trace('Received %d bytes from NTRIP stream.' % len(data))
 
+        self.total_bytes_received['corrections'] += len(data)
+
+        if self.corrections_recorder is not None:
+            self.corrections_recorder.write(data)
+
+        # If enabled, forward complete RTCM frames only. Frames split across incoming data blocks will be sent once
+        # the rest of the frame arrives. Each write contains whole frames, so a frame will never be split between
+        # separate writes to the device.
+        if self.corrections_framer is not None:
+            if self.corrections_framer_shared:
+                data = framed_data if framed_data is not None else b''
+            else:
+                data = self.corrections_framer.on_data(data)
+            if len(data) == 0:
+                return
+
+        if self.ntrip_caster is not None and self.ntrip_caster_mountpoint is not None:
+            self.ntrip_caster.send(self.ntrip_caster_mountpoint, data)
+
         if self.external_serial_recorder is not None and self.external_corrections:
             self.external_serial_recorder.write(data)
 
-        self.total_bytes_received['corrections'] += len(data)
-        if self.corrections_serial.is_open:
+        if self.corrections_serial is not None and self.corrections_serial.is_open:
             if self.state == State.RESET_COMPLETE:
-                self.corrections_serial.write(data)
+                self.corrections_writer.write(data)
             else:
                 self.logger.trace('Waiting for reset. Discarding corrections data.')
 
+    def _send_output(self, data, message_class, message_id):
+        if self.output_batch_interval_sec is None:
+            for output_server in self.output_servers:
+                output_server.send(data, message_class, message_id)
+        else:
+            if len(self.output_batch) == 0:
+                self.output_batch_start_time = time.monotonic()
+            self.output_batch.append((data, message_class, message_id))
+
+    def _flush_output(self, force=False):
+        if force or (time.monotonic() - self.output_batch_start_time) >= self.output_batch_interval_sec:
+            self.logger.trace('Sending batch of %d output messages.' % len(self.output_batch))
+            for output_server in self.output_servers:
+                output_server.send_batch(self.output_batch)
+            self.output_batch = []
+
+    def _set_ntrip_client(self, ntrip_client):
+        if self.ntrip_client is not None and not self.ntrip_client_shared:
+            self.ntrip_client.stop()
+            self.ntrip_client.join()
+        self.ntrip_client_shared = False
+
+        self.ntrip_client = ntrip_client
+        if self.is_alive():
+            self.ntrip_client.start()
+
+    def _get_output_client_stats(self):
+        stats = [s for output_server in self.output_servers for s in output_server.get_client_stats()]
+        if self.ntrip_caster is not None:
+            stats += self.ntrip_caster.get_client_stats()
+        return stats
+
+    def _create_event_loop(self):
+        return None
+
+    def _create_output_server(self, **kwargs):
+        return OutputServer(**kwargs)
+
+    @classmethod
+    def _get_output_addresses(cls, addresses):
+        # Accept either a single (address, port) tuple or a list of (address, port[, output_type]) tuples.
+        if addresses is None:
+            return []
+        elif len(addresses) > 0 and isinstance(addresses[0], str):
+            return [addresses]
+        else:
+            return addresses
+
+    def _make_fe_index_entry(self, offset, entry):
+        header, payload, raw_bytes = entry[:3]
+        if isinstance(payload, PoseMessage) and payload.gps_time:
+            gps_time_sec = float(payload.gps_time)
+        else:
+            gps_time_sec = math.nan
+        return IndexedMessage(offset, IndexRecordType.FUSION_ENGINE, int(header.message_type), len(raw_bytes),
+                              gps_time_sec)
+
     def _send_reset(self):
         reset_cmd = ResetRequest()
 
@@ -505,7 +949,7 @@ Are you using the correct UART/COM port (--device-port)?
             self.logger.debug(output_str)
 
         # Forward the position to the NTRIP server every 60 seconds.
-        if (self.ntrip_client is not None and
+        if (self.ntrip_client is not None and self.forward_ntrip_position and
             (response_payload.solution_type != SolutionType.Invalid or self.ntrip_position_override is not None)):
             now = datetime.now(tz=timezone.utc)
             if (self.last_ntrip_position_update is None or
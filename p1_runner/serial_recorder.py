@@ -1,15 +1,35 @@
-from datetime import datetime, timezone
+from datetime import datetime, timedelta, timezone
 import logging
 import threading
+import time
 import traceback
 
 import serial
 
+from .corrections_writer import CorrectionsWriter
+from . import trace
+
+
 class SerialRecorder(threading.Thread):
+    """!
+    @brief Record data from an external serial device, and optionally send it corrections data, on separate threads.
+
+    Incoming data is read on this thread and written to the output file in batches, either once `flush_size_bytes`
+    have been received or `flush_interval_sec` after the first pending byte, whichever comes first.
+
+    Data passed to @ref write() is queued and sent to the device by a separate @ref CorrectionsWriter thread, so
+    @ref write() never blocks the caller. If the queue exceeds `max_write_queue_bytes` (e.g., the device is not
+    accepting data), the oldest queued data is discarded.
+    """
     logger = logging.getLogger('point_one.p1_runner.external_serial_recorder')
 
+    DEFAULT_FLUSH_SIZE_BYTES = 64 * 1024
+    DEFAULT_FLUSH_INTERVAL_SEC = 0.5
+    DEFAULT_MAX_WRITE_QUEUE_BYTES = CorrectionsWriter.DEFAULT_MAX_QUEUE_BYTES
+
     def __init__(self, device_port=None, device_baud_rate=460800,
-                 output_path=None):
+                 output_path=None, flush_size_bytes=DEFAULT_FLUSH_SIZE_BYTES,
+                 flush_interval_sec=DEFAULT_FLUSH_INTERVAL_SEC, max_write_queue_bytes=DEFAULT_MAX_WRITE_QUEUE_BYTES):
 
         super().__init__(name='external_device')
 
@@ -17,10 +37,18 @@ class SerialRecorder(threading.Thread):
         self.device_baud_rate = device_baud_rate
         self.output_path = output_path
 
-        self.device_serial = serial.Serial(baudrate=device_baud_rate, timeout=1.0)
+        # Note: The read timeout also limits how long buffered output data may wait before being written to disk.
+        self.device_serial = serial.Serial(baudrate=device_baud_rate, timeout=min(1.0, flush_interval_sec))
         self.device_serial.port = device_port
 
         self.output_file = None
+        self.flush_size_bytes = flush_size_bytes
+        self.flush_interval_sec = flush_interval_sec
+        self.output_buffer = bytearray()
+        self.output_buffer_start_time = None
+
+        self.max_write_queue_bytes = max_write_queue_bytes
+        self.corrections_writer = None
 
         self.shutdown_pending = threading.Event()
 
@@ -39,38 +67,71 @@ class SerialRecorder(threading.Thread):
 
         self.total_bytes_received = {
             'all': 0,
-            'sent': 0
         }
 
         self.last_data_timeout_warning_time = None
 
+        self.corrections_writer = CorrectionsWriter(self.device_serial.write, name='external_device_tx',
+                                                    max_queue_bytes=self.max_write_queue_bytes)
+        self.corrections_writer.start()
+
         super().start()
 
     def stop(self):
         if self.is_alive():
             self.logger.debug('Shutting down external serial recorder.')
             self.shutdown_pending.set()
-            if self.output_file is not None:
-                self.output_file.close()
+
+    def join(self, timeout=None):
+        super().join(timeout)
+        if self.corrections_writer is not None:
+            self.corrections_writer.join(timeout)
 
     def run(self):
-        # Read all pending data.
-        try:
-            data = self.device_serial.read(self.device_serial.in_waiting or 1)
-        except serial.SerialException as e:
-            self.logger.error('Unexpected error reading from device:\r%s' % traceback.format_exc())
-            return
-
-        if len(data) > 0:
-            self.last_data_timeout_warning_time = None
-            self._on_data(data)
-        else:
-            now = datetime.now()
-            if self.last_data_timeout_warning_time is None:
-                self.last_data_timeout_warning_time = now - timedelta(seconds=self.device_serial.timeout)
-            elif (now - self.last_data_timeout_warning_time).total_seconds() > 5.0:
-                self.logger.warning("Timed out waiting for data on %s." % self.device_serial.port)
-                self.last_data_timeout_warning_time = now
+        while not self.shutdown_pending.is_set():
+            # Read all pending data, or block until at least 1 byte comes in.
+            try:
+                data = self.device_serial.read(self.device_serial.in_waiting or 1)
+            except serial.SerialException as e:
+                self.logger.error('Unexpected error reading from device:\r%s' % traceback.format_exc())
+                break
+
+            if len(data) > 0:
+                self.last_data_timeout_warning_time = None
+                self._on_data(data)
+            else:
+                now = datetime.now()
+                if self.last_data_timeout_warning_time is None:
+                    self.last_data_timeout_warning_time = now - timedelta(seconds=self.device_serial.timeout)
+                elif (now - self.last_data_timeout_warning_time).total_seconds() > 5.0:
+                    self.logger.warning("Timed out waiting for data on %s." % self.device_serial.port)
+                    self.last_data_timeout_warning_time = now
+
+            # Write any buffered data that has been waiting too long, even if no new data arrived.
+            if len(self.output_buffer) > 0 and \
+               time.monotonic() - self.output_buffer_start_time >= self.flush_interval_sec:
+                self._flush()
+
+        self._flush()
+        if self.output_file is not None:
+            self.output_file.close()
+            self.output_file = None
+
+        # Stop the transmit thread, then close the port once it finishes.
+        self.corrections_writer.stop()
+        self.corrections_writer.join()
+        self.device_serial.close()
+
+    def write(self, data):
+        """!
+        @brief Queue data to be sent to the device.
+
+        @param data The data to be sent.
+
+        @return `False` if data was discarded because the queue is full.
+        """
+        self.logger.trace('Queuing %d bytes to send to the device.' % len(data))
+        return self.corrections_writer.write(data)
 
     def _on_data(self, data):
         self.logger.trace('Received %d bytes from device.' % len(data), depth=2)
@@ -80,16 +141,21 @@ class SerialRecorder(threading.Thread):
         now = datetime.now()
         if (now - self.last_status_time).total_seconds() > 5.0:
             self.logger.debug(
-                '%d bytes received. [elapsed=%.1f sec, sent=%d B]' %
+                '%d bytes received. [elapsed=%.1f sec, sent=%d B, send_dropped=%d B]' %
                 (self.total_bytes_received['all'],
-                 self.total_bytes_received['sent'],
-                 (now - self.start_time).total_seconds()))
+                 (now - self.start_time).total_seconds(),
+                 self.corrections_writer.bytes_written,
+                 self.corrections_writer.bytes_dropped))
             self.last_status_time = now
 
         if self.output_file is not None:
-            self.output_file.write(data)
-
-    def write(self, data):
-        self.logger.trace('Sending %d bytes to the device.' % len(data))
-        self.total_bytes_received['sent'] += len(data)
-        self.device_serial.write(data)
+            if len(self.output_buffer) == 0:
+                self.output_buffer_start_time = time.monotonic()
+            self.output_buffer += data
+            if len(self.output_buffer) >= self.flush_size_bytes:
+                self._flush()
+
+    def _flush(self):
+        if self.output_file is not None and len(self.output_buffer) > 0:
+            self.output_file.write(self.output_buffer)
+            self.output_buffer.clear()
@@ -0,0 +1,99 @@
+import math
+import os
+
+import pytest
+
+from p1_runner.log_index import IndexedMessage, IndexRecord, IndexRecordType, LogIndex, LogIndexWriter
+from p1_runner.log_manager import LogManager
+
+
+def _write_index(path):
+    writer = LogIndexWriter(path)
+    start_ns = writer.start_monotonic_ns
+    writer.write(start_ns + 1000, 0, size=100)
+    writer.write(start_ns + 1000, 10, IndexRecordType.FUSION_ENGINE, 10000, 50, gps_time_sec=1000.5)
+    writer.write(start_ns + 2000, 100, size=100)
+    writer.write(start_ns + 2000, 120, IndexRecordType.NMEA, size=30)
+    # Offsets are 64-bit, so logs larger than 4 GB are supported.
+    writer.write(start_ns + 3000, 5 * 1024 ** 3, size=100)
+    writer.write(start_ns + 3000, 5 * 1024 ** 3 + 10, IndexRecordType.FUSION_ENGINE, 10000, 50, gps_time_sec=1001.5)
+    writer.close()
+    return writer
+
+
+def test_round_trip(tmp_path):
+    path = str(tmp_path / 'input.raw.index')
+    writer = _write_index(path)
+
+    index = LogIndex.from_file(path)
+    assert len(index) == 6
+    assert index.start_monotonic_ns == writer.start_monotonic_ns
+    assert index.start_posix_ns == writer.start_posix_ns
+    assert index.records[1] == IndexRecord(writer.start_monotonic_ns + 1000, 10, 1000.5,
+                                           IndexRecordType.FUSION_ENGINE, 10000, 50)
+    assert math.isnan(index.records[0].gps_time_sec)
+    assert index.records[4].offset == 5 * 1024 ** 3
+
+    assert [r.offset for r in index.get_records(IndexRecordType.DATA)] == [0, 100, 5 * 1024 ** 3]
+    assert [r.offset for r in index.get_records(message_id=10000)] == [10, 5 * 1024 ** 3 + 10]
+
+
+def test_partial_record(tmp_path):
+    path = str(tmp_path / 'input.raw.index')
+    _write_index(path)
+    with open(path, 'ab') as f:
+        f.write(b'\x00' * 10)
+    assert len(LogIndex.from_file(path)) == 6
+
+
+def test_invalid_file(tmp_path):
+    path = str(tmp_path / 'input.raw.index')
+    with open(path, 'wb') as f:
+        f.write(b'\x00' * 100)
+    with pytest.raises(IOError):
+        LogIndex.from_file(path)
+
+
+def test_find_by_time(tmp_path):
+    path = str(tmp_path / 'input.raw.index')
+    writer = _write_index(path)
+    index = LogIndex.from_file(path)
+
+    start_posix_sec = writer.start_posix_ns * 1e-9
+    assert index.find_by_host_time(start_posix_sec) is None
+    assert index.find_by_host_time(start_posix_sec + 2500e-9).offset == 100
+    assert index.find_by_host_time(start_posix_sec + 2500e-9, record_type=None).offset == 120
+    assert index.find_by_host_time(start_posix_sec + 1.0).offset == 5 * 1024 ** 3
+
+    assert index.find_by_gps_time(1000.0) is None
+    assert index.find_by_gps_time(1001.0).offset == 10
+    assert index.find_by_gps_time(1001.5).offset == 5 * 1024 ** 3 + 10
+
+
+@pytest.mark.parametrize('index_messages', (True, False))
+def test_log_manager_index(tmp_path, index_messages):
+    manager = LogManager(device_id='test', logs_base_dir=str(tmp_path), files=[], create_symlink=False,
+                         log_timestamps=False, log_index=True, index_messages=index_messages)
+    manager.start()
+    try:
+        manager.write(b'\x00' * 100, host_time_ns=1000,
+                      messages=[IndexedMessage(10, IndexRecordType.NMEA, size=20)])
+        # Messages that started before the beginning of the log are not indexed.
+        manager.write(b'\x00' * 50, host_time_ns=2000,
+                      messages=[IndexedMessage(-150, IndexRecordType.RTCM, 1005, 10),
+                                IndexedMessage(-20, IndexRecordType.FUSION_ENGINE, 10000, 60, 1000.5)])
+    finally:
+        manager.stop()
+        manager.join()
+
+    index = LogIndex.from_file(os.path.join(manager.log_dir, manager.data_filename + LogIndexWriter.FILE_EXTENSION))
+    records = [(r.host_time_ns, r.offset, r.record_type, r.size) for r in index.records]
+    if index_messages:
+        assert records == [(1000, 0, IndexRecordType.DATA, 100),
+                           (1000, 10, IndexRecordType.NMEA, 20),
+                           (2000, 100, IndexRecordType.DATA, 50),
+                           (2000, 80, IndexRecordType.FUSION_ENGINE, 60)]
+        assert index.find_by_gps_time(1000.5).offset == 80
+    else:
+        assert records == [(1000, 0, IndexRecordType.DATA, 100),
+                           (2000, 100, IndexRecordType.DATA, 50)]
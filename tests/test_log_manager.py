@@ -0,0 +1,206 @@
+import os
+import tempfile
+import threading
+import time
+
+from fusion_engine_client.messages import MessageHeader, PoseMessage, Timestamp
+from fusion_engine_client.parsers import FusionEngineEncoder
+import pytest
+
+from p1_runner import log_manager
+from p1_runner.log_index import IndexedMessage, IndexRecordType
+from p1_runner.log_manager import LogManager
+from p1_runner.nmea_framer import NMEAFramer
+from p1_runner.rtcm_framer import build_rtcm_message
+
+
+def _create_log_manager(tmp_path, **kwargs):
+    kwargs.setdefault('flush_size_bytes', 100)
+    kwargs.setdefault('flush_interval_sec', 0.01)
+    return LogManager(device_id='test', logs_base_dir=str(tmp_path), files=[], create_symlink=False,
+                      log_timestamps=False, **kwargs)
+
+
+def _wait_for(predicate, timeout_sec=5.0):
+    end_time = time.monotonic() + timeout_sec
+    while not predicate():
+        if time.monotonic() > end_time:
+            return False
+        time.sleep(0.01)
+    return True
+
+
+def _stall_writer(manager, delay_sec):
+    # Slow down all disk writes so the queue fills up. Returns a function to restore normal behavior.
+    append = manager._append
+
+    def _slow_append(data):
+        time.sleep(delay_sec)
+        append(data)
+
+    manager._append = _slow_append
+    return lambda: setattr(manager, '_append', append)
+
+
+def _read_log(manager):
+    with open(os.path.join(manager.log_dir, manager.data_filename), 'rb') as f:
+        return f.read()
+
+
+def test_spill_recovers(tmp_path, monkeypatch):
+    temp_files = []
+    temporary_file = tempfile.TemporaryFile
+
+    def _temporary_file(*args, **kwargs):
+        temp_files.append(None)
+        return temporary_file(*args, **kwargs)
+
+    monkeypatch.setattr(log_manager.tempfile, 'TemporaryFile', _temporary_file)
+
+    manager = _create_log_manager(tmp_path, max_queue_bytes=1000, queue_full_policy='spill')
+    manager.start()
+    try:
+        # Stall the writer until data is spilled to disk.
+        expected = bytearray()
+        restore = _stall_writer(manager, 0.2)
+        for i in range(50):
+            data = bytes([i]) * 300
+            expected += data
+            manager.write(data)
+            time.sleep(0.005)
+        assert manager.bytes_spilled > 0
+        restore()
+
+        # Once the writer catches up, new data should go back into the in-memory queue.
+        assert _wait_for(lambda: not manager.spilling)
+        spill_count = len(temp_files)
+        for i in range(100):
+            data = bytes([i]) * 10
+            expected += data
+            manager.write(data)
+            time.sleep(0.002)
+
+        assert len(temp_files) == spill_count
+        assert not manager.spilling
+    finally:
+        manager.stop()
+        manager.join()
+
+    assert _read_log(manager) == bytes(expected)
+
+
+def test_drop_oldest(tmp_path):
+    manager = _create_log_manager(tmp_path, max_queue_bytes=1000, queue_full_policy='drop_oldest')
+    manager.start()
+    try:
+        restore = _stall_writer(manager, 0.2)
+        blocks = [bytes([i]) * 300 for i in range(20)]
+        for data in blocks:
+            manager.write(data)
+        restore()
+    finally:
+        manager.stop()
+        manager.join()
+
+    # Whole blocks are dropped, and the remaining blocks are written in order.
+    assert manager.bytes_dropped > 0
+    contents = _read_log(manager)
+    assert len(contents) == sum(len(b) for b in blocks) - manager.bytes_dropped
+    written = [contents[i:i + 300] for i in range(0, len(contents), 300)]
+    assert written == [b for b in blocks if b in written]
+    assert written[-1] == blocks[-1]
+
+
+def test_block(tmp_path):
+    manager = _create_log_manager(tmp_path, max_queue_bytes=1000, queue_full_policy='block')
+    manager.start()
+    try:
+        restore = _stall_writer(manager, 0.05)
+        expected = bytearray()
+        for i in range(20):
+            data = bytes([i]) * 300
+            expected += data
+            manager.write(data)
+        restore()
+    finally:
+        manager.stop()
+        manager.join()
+
+    assert manager.bytes_dropped == 0
+    assert _read_log(manager) == bytes(expected)
+
+
+@pytest.mark.filterwarnings('ignore::pytest.PytestUnhandledThreadExceptionWarning')
+def test_block_writer_exit(tmp_path):
+    manager = _create_log_manager(tmp_path, max_queue_bytes=1000, queue_full_policy='block')
+    manager.start()
+    assert _wait_for(lambda: manager.bin_file is not None)
+
+    # Simulate a disk error after the queue has filled and the producer is blocked. The producer should be released
+    # when the writer thread exits.
+    def _fail(data):
+        time.sleep(0.2)
+        raise OSError(28, 'No space left on device')
+
+    manager.bin_file.write = _fail
+
+    producer = threading.Thread(target=lambda: [manager.write(b'x' * 400) for _ in range(20)], daemon=True)
+    producer.start()
+    producer.join(5.0)
+    assert not producer.is_alive()
+
+    manager.join(5.0)
+    assert not manager.is_alive()
+    assert manager.bytes_dropped > 0
+
+
+def test_segments_start_at_fe_message(tmp_path):
+    # Build a stream of interleaved FusionEngine, NMEA, and RTCM messages. The NMEA and RTCM contents include
+    # FusionEngine sync bytes, which must not be mistaken for the start of a FusionEngine message.
+    encoder = FusionEngineEncoder()
+    stream = bytearray()
+    messages = []
+    for i in range(50):
+        pose = PoseMessage()
+        pose.gps_time = Timestamp(1000.0 + i)
+        fe_bytes = encoder.encode_message(pose)
+        messages.append(IndexedMessage(len(stream), IndexRecordType.FUSION_ENGINE, int(pose.MESSAGE_TYPE),
+                                       len(fe_bytes)))
+        stream += fe_bytes
+
+        body = b'GPGGA,123519,4807.1,N,01131.1,E,1,08,0.9,545.4,M,46.9,M,,'
+        nmea_bytes = b'$%s*%02X\r\n' % (body, NMEAFramer._xor_bytes(body))
+        messages.append(IndexedMessage(len(stream), IndexRecordType.NMEA, size=len(nmea_bytes)))
+        stream += nmea_bytes
+
+        rtcm_bytes = build_rtcm_message(1005, b'.1' * 10)
+        messages.append(IndexedMessage(len(stream), IndexRecordType.RTCM, 1005, len(rtcm_bytes)))
+        stream += rtcm_bytes
+
+    manager = _create_log_manager(tmp_path, segment_size_bytes=500, log_index=True)
+    manager.start()
+    try:
+        # Write the data in blocks that do not line up with the message boundaries.
+        block_size = 37
+        for start in range(0, len(stream), block_size):
+            end = start + block_size
+            block_messages = [m._replace(offset=m.offset - start) for m in messages if start <= m.offset < end]
+            manager.write(bytes(stream[start:end]), messages=block_messages)
+    finally:
+        manager.stop()
+        manager.join()
+
+    segments = []
+    while True:
+        path = os.path.join(manager.log_dir, manager._get_segment_filename(len(segments)))
+        if not os.path.exists(path):
+            break
+        with open(path, 'rb') as f:
+            segments.append(f.read())
+
+    assert len(segments) > 1
+    assert b''.join(segments) == stream
+    for segment in segments:
+        header = MessageHeader()
+        header.unpack(segment, validate_sync=True, validate_crc=True)
+        assert header.message_type == PoseMessage.MESSAGE_TYPE
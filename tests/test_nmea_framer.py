@@ -0,0 +1,79 @@
+from p1_runner.nmea_framer import NMEAFramer
+
+
+def _build_sentence(contents):
+    return b'$%s*%02X\r\n' % (contents, NMEAFramer._xor_bytes(contents))
+
+
+GGA = _build_sentence(b'GPGGA,123519,4807.038,N,01131.000,E,1,08,0.9,545.4,M,46.9,M,,')
+RMC = _build_sentence(b'GPRMC,123519,A,4807.038,N,01131.000,E,022.4,084.4,230394,003.1,W')
+
+
+def test_frame_sentences():
+    framer = NMEAFramer()
+    assert framer.on_data(GGA + RMC) == [GGA.decode(), RMC.decode()]
+
+
+def test_frame_split_data():
+    stream = b'\x01\x02$bogus' + GGA + b'\xD3\x00\x13' + RMC
+    for chunk_size in (1, 3, 16, 1024):
+        framer = NMEAFramer(return_offset=True)
+        results = []
+        for start in range(0, len(stream), chunk_size):
+            results.extend(framer.on_data(stream[start:start + chunk_size]))
+        assert results == [(GGA.decode(), 8), (RMC.decode(), 8 + len(GGA) + 3)]
+
+
+def test_invalid_sentences():
+    bad_checksum = GGA.replace(b'4807', b'4808')
+    binary_contents = _build_sentence(b'GPGGA,\x80\x81')
+    no_checksum = b'$GPGGA,123519\r\n'
+    framer = NMEAFramer()
+    assert framer.on_data(bad_checksum + binary_contents + no_checksum + RMC) == [RMC.decode()]
+
+
+def test_string_input():
+    framer = NMEAFramer()
+    assert framer.on_data(GGA.decode()) == [GGA.decode()]
+
+
+def test_callback():
+    received = []
+    framer = NMEAFramer()
+    framer.set_callback(received.append)
+    framer.on_data(GGA + RMC)
+    assert received == [GGA.decode(), RMC.decode()]
+
+
+def test_buffer_bounded():
+    # A $ followed by a long run of binary data without a \n must not grow the buffer without bound.
+    framer = NMEAFramer(max_line_length=100)
+    assert framer.on_data(b'$GPGGA,') == []
+    for _ in range(100):
+        assert framer.on_data(b'\x00' * 63) == []
+        assert len(framer.buffer) < 100
+
+    # Framing resumes at the next sentence.
+    assert framer.on_data(GGA) == [GGA.decode()]
+
+
+def test_overlong_sentence():
+    long_sentence = _build_sentence(b'PQTMTEST,' + b'0' * 100)
+    framer = NMEAFramer(max_line_length=100)
+    assert framer.on_data(long_sentence + GGA) == [GGA.decode()]
+
+    framer = NMEAFramer(max_line_length=None)
+    assert framer.on_data(long_sentence + GGA) == [long_sentence.decode(), GGA.decode()]
+
+
+def test_bytes_dropped():
+    junk = b'\xD3\x00\x13$bogus\r\n'
+    bad_checksum = GGA.replace(b'4807', b'4808')
+    framer = NMEAFramer()
+    framer.on_data(junk + GGA + bad_checksum + RMC + b'$GPG')
+    assert framer.bytes_dropped == len(junk) + len(bad_checksum)
+
+    # Incomplete data remaining in the buffer is not counted until it is discarded.
+    assert framer.buffer == b'$GPG'
+    framer.on_data(b'\x00' * 10 + b'\n')
+    assert framer.bytes_dropped == len(junk) + len(bad_checksum) + 15
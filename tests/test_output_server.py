@@ -0,0 +1,34 @@
+from p1_runner.output_server import ClientQueue, OutputServer, WebSocketServer
+from p1_runner.output_subscription import OutputSubscription
+
+
+def test_is_subscribed_no_clients():
+    server = OutputServer(tcp_address=('localhost', 0), default_message_class='raw')
+    assert not server.is_subscribed('raw')
+    assert not server.is_subscribed('nmea')
+
+
+def test_is_subscribed_default_client():
+    server = OutputServer(tcp_address=('localhost', 0), default_message_class='raw')
+    server.tcp_clients[0] = ClientQueue()
+    assert server.is_subscribed('raw')
+    assert not server.is_subscribed('nmea')
+
+
+def test_is_subscribed_subscription():
+    server = OutputServer(tcp_address=('localhost', 0), default_message_class='raw')
+    client = ClientQueue()
+    client.subscription = OutputSubscription(message_ids={'nmea': None})
+    server.tcp_clients[0] = client
+    assert not server.is_subscribed('raw')
+    assert server.is_subscribed('nmea')
+
+
+def test_is_subscribed_websocket():
+    server = OutputServer(websocket_address=('localhost', 0), default_message_class='nmea')
+    server.ws_server = WebSocketServer(('localhost', 0), default_message_class='nmea')
+    assert not server.is_subscribed('nmea')
+
+    server.ws_server.clients.append(ClientQueue())
+    assert server.is_subscribed('nmea')
+    assert not server.is_subscribed('raw')
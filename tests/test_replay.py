@@ -0,0 +1,115 @@
+import os
+import struct
+import time
+
+import pytest
+
+from p1_runner.log_manager import LogManager
+from p1_runner.replay import DataReplay, parse_replay_speed
+
+
+def test_parse_replay_speed():
+    assert parse_replay_speed('realtime') == 1.0
+    assert parse_replay_speed('max') is None
+    assert parse_replay_speed('MAX') is None
+    assert parse_replay_speed('4x') == 4.0
+    assert parse_replay_speed('0.5') == 0.5
+    for spec in ('0', '-2x', 'fast', 'x'):
+        with pytest.raises(ValueError):
+            parse_replay_speed(spec)
+
+
+def test_load_timestamps(tmp_path):
+    path = str(tmp_path / 'input.raw.timestamps')
+    with open(path, 'wb') as f:
+        # Each entry contains the time (ms) and the end offset of a write. Repeated offsets (no new data) are skipped.
+        f.write(struct.pack('II', 100, 10))
+        f.write(struct.pack('II', 150, 10))
+        f.write(struct.pack('II', 200, 25))
+        # Both values wrap at 2^32.
+        f.write(struct.pack('II', 2**32 - 1, 40))
+        f.write(struct.pack('II', 10, 50))
+        # Partial trailing entry.
+        f.write(b'\x00' * 3)
+
+    blocks = DataReplay._load_timestamps(path, file_size=60)
+    assert blocks == [(0, 10, 0.1), (10, 15, 0.2), (25, 15, (2**32 - 1) * 1e-3), (40, 10, (2**32 + 10) * 1e-3),
+                      (50, 10, (2**32 + 10) * 1e-3)]
+
+    # Entries past the end of the data file (e.g., a truncated log) are clipped.
+    assert DataReplay._load_timestamps(path, file_size=20) == [(0, 10, 0.1), (10, 10, 0.2)]
+
+
+def _replay(path, speed=None):
+    blocks = []
+    replay = DataReplay(path, data_callback=blocks.append, speed=speed)
+    replay.replay()
+    return blocks, replay
+
+
+def _create_log(tmp_path, blocks, **kwargs):
+    manager = LogManager(device_id='test', logs_base_dir=str(tmp_path), files=[], create_symlink=False,
+                         flush_interval_sec=0.01, **kwargs)
+    manager.start()
+    try:
+        for data, host_time_ns in blocks:
+            manager.write(data, host_time_ns=host_time_ns)
+            time.sleep(0.02)
+    finally:
+        manager.stop()
+        manager.join()
+    return os.path.join(manager.log_dir, manager.data_filename)
+
+
+def test_replay_index(tmp_path):
+    # With an index, data is replayed in the original blocks, paced using the original receive times.
+    blocks = [(bytes([i]) * (100 + i), 1000000000 + i * 50000000) for i in range(5)]
+    path = _create_log(tmp_path, blocks, log_timestamps=False, log_index=True)
+
+    replayed, replay = _replay(path)
+    assert replayed == [b[0] for b in blocks]
+    assert replay.blocks_replayed == 5
+    assert replay.bytes_replayed == sum(len(b[0]) for b in blocks)
+    assert replay.data_duration_sec == pytest.approx(0.2)
+
+    start_time = time.monotonic()
+    replayed, replay = _replay(path, speed=2.0)
+    assert replayed == [b[0] for b in blocks]
+    assert time.monotonic() - start_time >= 0.1
+
+
+def test_replay_timestamps(tmp_path):
+    blocks = [(bytes([i]) * (100 + i), None) for i in range(5)]
+    path = _create_log(tmp_path, blocks, log_timestamps=True, log_index=False)
+
+    # Writes less than 1 ms apart share a timestamp entry, so blocks may be combined.
+    replayed, _ = _replay(path)
+    assert len(replayed) > 1
+    assert b''.join(replayed) == b''.join(b[0] for b in blocks)
+
+
+def test_replay_no_times(tmp_path):
+    path = str(tmp_path / 'input.raw')
+    data = os.urandom(DataReplay.DEFAULT_BLOCK_SIZE_BYTES * 2 + 100)
+    with open(path, 'wb') as f:
+        f.write(data)
+
+    replayed, replay = _replay(path, speed=1.0)
+    assert [len(b) for b in replayed] == [DataReplay.DEFAULT_BLOCK_SIZE_BYTES, DataReplay.DEFAULT_BLOCK_SIZE_BYTES,
+                                          100]
+    assert b''.join(replayed) == data
+    assert replay.get_stats()['speed'] is None
+
+
+def test_replay_stop(tmp_path):
+    blocks = [(b'x' * 100, 1000000000 + i * 1000000000) for i in range(3)]
+    path = _create_log(tmp_path, blocks, log_timestamps=False, log_index=True)
+
+    replay = DataReplay(path, speed=1.0)
+    replay.set_data_callback(lambda data: replay.stop())
+    start_time = time.monotonic()
+    replay.start()
+    replay.join(5.0)
+    assert not replay.is_alive()
+    assert time.monotonic() - start_time < 1.0
+    assert replay.blocks_replayed == 1
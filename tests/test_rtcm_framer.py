@@ -0,0 +1,65 @@
+from p1_runner.rtcm_framer import RTCMFramer, build_rtcm_message
+
+
+def _build_message(message_id, contents):
+    # The message ID is the first 12 bits of the payload.
+    return build_rtcm_message(message_id, bytes((message_id >> 4, (message_id & 0xF) << 4)) + contents)
+
+
+def _build_stream():
+    # Interleave RTCM messages with non-RTCM data, including stray preamble bytes.
+    messages = [_build_message(1005, bytes(range(17))),
+                _build_message(1077, b'\xD3' * 40),
+                build_rtcm_message(1230, b'')]
+    stream = bytearray()
+    offsets = []
+    for i, message in enumerate(messages):
+        stream += b'$GPGGA,junk\xD3\x00\x01*%d\r\n' % i
+        offsets.append(len(stream))
+        stream += message
+    stream += b'\xD3\x00'
+    return bytes(stream), messages, offsets
+
+
+def test_frame_messages():
+    stream, messages, offsets = _build_stream()
+    framer = RTCMFramer()
+    results = framer.on_data(stream, return_size=True, return_bytes=True, return_offset=True)
+    assert [r['bytes'] for r in results] == messages
+    assert [r['offset'] for r in results] == offsets
+    assert [r['size'] for r in results] == [len(m) for m in messages]
+    assert [r['message'].message_id for r in results] == [1005, 1077, None]
+
+
+def test_frame_split_data():
+    stream, messages, offsets = _build_stream()
+    for chunk_size in (1, 2, 7, 64):
+        framer = RTCMFramer()
+        results = []
+        for start in range(0, len(stream), chunk_size):
+            results.extend(framer.on_data(stream[start:start + chunk_size], return_offset=True))
+        assert [r['message'].data for r in results] == messages
+        assert [r['offset'] for r in results] == offsets
+
+        # The trailing preamble is held until more data arrives.
+        assert framer.buffer == b'\xD3\x00'
+
+
+def test_bad_crc():
+    good = _build_message(1005, bytes(range(17)))
+    bad = bytearray(_build_message(1077, b'\x00\xD3\x00\x02\x00\x00' + bytes(20)))
+    bad[-1] ^= 0xFF
+
+    framer = RTCMFramer()
+    results = framer.on_data(bytes(bad) + good, return_offset=True)
+    assert [r['message'].data for r in results] == [good]
+    assert results[0]['offset'] == len(bad)
+
+
+def test_callback():
+    stream, messages, _ = _build_stream()
+    received = []
+    framer = RTCMFramer()
+    framer.set_callback(received.append)
+    framer.on_data(stream)
+    assert [m.data for m in received] == messages